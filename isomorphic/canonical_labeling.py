@@ -0,0 +1,139 @@
+from functools import cache
+
+from utils.sub_graphs import get_edges_from_id, get_id_bit_table
+
+
+def _refine_colors(k: int, out_adj: list[set], in_adj: list[set], self_loops: list[bool]) -> list[int]:
+    """
+    degree based color refinement: starts with (self loop, out degree, in degree, mutual degree) per node
+    and refines by the multiset of the neighbours colors until the partition is stable.
+    the colors are ranks of sorted signatures, thus they are invariant under isomorphism.
+    """
+    signatures = [(self_loops[v], len(out_adj[v]), len(in_adj[v]), len(out_adj[v] & in_adj[v])) for v in range(k)]
+    ranks = {sig: i for i, sig in enumerate(sorted(set(signatures)))}
+    colors = [ranks[sig] for sig in signatures]
+
+    while True:
+        signatures = [(colors[v],
+                       tuple(sorted(colors[u] for u in out_adj[v] if u != v)),
+                       tuple(sorted(colors[u] for u in in_adj[v] if u != v)))
+                      for v in range(k)]
+        ranks = {sig: i for i, sig in enumerate(sorted(set(signatures)))}
+        new_colors = [ranks[sig] for sig in signatures]
+        if len(ranks) == len(set(colors)):
+            return new_colors
+        colors = new_colors
+
+
+def get_canonical_form(sub_id: int, k: int) -> tuple[int, tuple[int, ...]]:
+    """
+    canonical labeling of a k nodes directed graph (self loops are allowed):
+    the nodes are partitioned by a degree based color refinement, and the canonical form is the minimum
+    (bit by bit, position by position) over the orderings that respect the partition.
+    branches are pruned as soon as their prefix is larger than the best one found.
+    :param sub_id: the sub graph id
+    :param k: motif / sub graph size
+    :return: the canonical id, and the order: order[i] is the position in sub_id of the node placed at position i
+    """
+    out_adj = [set() for _ in range(k)]
+    in_adj = [set() for _ in range(k)]
+    for s, t in get_edges_from_id(sub_id, k):
+        out_adj[s].add(t)
+        in_adj[t].add(s)
+    self_loops = [v in out_adj[v] for v in range(k)]
+
+    colors = _refine_colors(k, out_adj, in_adj, self_loops)
+    # the color of each canonical position
+    position_colors = sorted(colors)
+
+    best_key: list[tuple] = []
+    best_order: list[int] = []
+    order: list[int] = []
+    key: list[tuple] = []
+    used = [False] * k
+
+    def position_key(v: int) -> tuple:
+        # the bits added when placing v: its self loop, and the edges to / from the already placed nodes
+        return (self_loops[v],
+                tuple(u in out_adj[v] for u in order),
+                tuple(v in out_adj[u] for u in order))
+
+    def search(p: int):
+        nonlocal best_key, best_order
+        if p == k:
+            if not best_key or key < best_key:
+                best_key = list(key)
+                best_order = list(order)
+            return
+
+        for v in range(k):
+            if used[v] or colors[v] != position_colors[p]:
+                continue
+            key.append(position_key(v))
+            if best_key and key > best_key[:p + 1]:
+                key.pop()
+                continue
+
+            used[v] = True
+            order.append(v)
+            search(p + 1)
+            order.pop()
+            used[v] = False
+            key.pop()
+
+    search(0)
+
+    table = get_id_bit_table(k)
+    position = {v: i for i, v in enumerate(best_order)}
+    canonical_id = 0
+    for s, t in get_edges_from_id(sub_id, k):
+        canonical_id |= table[position[s]][position[t]]
+    return canonical_id, tuple(best_order)
+
+
+class CanonicalLabeling:
+    """
+    maps sub graph ids to a canonical id (an id of the same isomorphic class).
+    each id is canonicalized once - the results are memoized for the entire run.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.canonical_forms: dict[int, tuple[int, tuple[int, ...]]] = {}
+        self.role_orders: dict[tuple[int, int], tuple[int, ...]] = {}
+
+    def __get_canonical_form(self, sub_id: int) -> tuple[int, tuple[int, ...]]:
+        canonical_form = self.canonical_forms.get(sub_id)
+        if canonical_form is None:
+            canonical_form = get_canonical_form(sub_id, self.k)
+            self.canonical_forms[sub_id] = canonical_form
+        return canonical_form
+
+    def get_canonical_id(self, sub_id: int) -> int:
+        return self.__get_canonical_form(sub_id)[0]
+
+    def get_role_order(self, sub_id: int, representative: int) -> tuple[int, ...]:
+        """
+        :param sub_id: a sub graph id
+        :param representative: an isomorphic sub graph id, e.g.: the motif id
+        :return: the isomorphism between them: role_order[i] is the position in sub_id of the node that plays
+        position (role) i of the representative
+        """
+        role_order = self.role_orders.get((sub_id, representative))
+        if role_order is None:
+            _, sub_order = self.__get_canonical_form(sub_id)
+            _, representative_order = self.__get_canonical_form(representative)
+            order = [0] * self.k
+            for sub_position, representative_position in zip(sub_order, representative_order):
+                order[representative_position] = sub_position
+            role_order = tuple(order)
+            self.role_orders[(sub_id, representative)] = role_order
+        return role_order
+
+
+@cache
+def get_canonical_labeling(k: int) -> CanonicalLabeling:
+    """
+    :return: a shared (per k) canonical labeling, so the memo is reused between the networks of a run
+    """
+    return CanonicalLabeling(k)
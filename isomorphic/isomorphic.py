@@ -2,14 +2,17 @@ import collections
 import os
 import pickle
 from collections import defaultdict
+from functools import cache
 from itertools import product
-from typing import Union, TypedDict
+from typing import Union, TypedDict, Optional
 
 import networkx as nx
+import numpy as np
 from networkx.algorithms import isomorphism
 from tqdm import tqdm
 
 from large_subgraphs.single_input_moudle import get_sim_adj_mat
+from utils.occurrences import Occurrences
 from utils.sub_graphs import get_sub_graph_from_id, create_base_motif, create_sim_motif
 from utils.types import PolarityFrequencies, Motif
 
@@ -49,6 +52,19 @@ def match_two_fsl_id_lists(src_fsl_ids: list[int], tar_fsl_ids: list[int], k: in
     return ids_iso_mappings
 
 
+def get_isomorphic_lookup(isomorphic_mapping: dict, k: int) -> np.ndarray:
+    """
+    :param isomorphic_mapping: a dict where each key is a sub graph id and the value is its isomorphic representative
+    :param k: motif / sub graph size. (the id space is 2^(k^2), use for k <= 4 only)
+    :return: a dense lookup table of the mapping, indexed by the sub graph id.
+    -1 for ids that are not in the mapping (disconnected sub graphs, or excluded - e.g.: self loops)
+    """
+    lookup = np.full(1 << (k * k), -1, dtype=np.int32)
+    if isomorphic_mapping:
+        lookup[np.fromiter(isomorphic_mapping.keys(), dtype=np.int64)] = list(isomorphic_mapping.values())
+    return lookup
+
+
 def _get_polarity_sub_graph(role_pattern: list[tuple], polarity: list[str]) -> nx.DiGraph:
     graph = nx.DiGraph(role_pattern)
     for role, pol in zip(role_pattern, polarity):
@@ -82,6 +98,25 @@ def get_sub_graph_mapping_to_motif(sub_graph: tuple[tuple],
     return dict(matcher.mapping)
 
 
+@cache
+def get_polarity_role_order(role_pattern: tuple[tuple[int, int], ...],
+                            polarity: tuple[str, ...],
+                            iso_polarity: tuple[str, ...]) -> tuple[int, ...]:
+    """
+    :param role_pattern: the motif edges in role positions: ((0, 1), (0, 2), ...)
+    :param polarity: the polarity of a polarity motif
+    :param iso_polarity: the polarity of an isomorphic polarity motif
+    :return: the role order (an automorphism of the role pattern) that maps the polarity motif to the isomorphic one:
+    role i of the iso polarity motif is played by role role_order[i] of the polarity motif
+    """
+    iso_graph = _get_polarity_sub_graph(list(role_pattern), list(iso_polarity))
+    graph = _get_polarity_sub_graph(list(role_pattern), list(polarity))
+    matcher = isomorphism.DiGraphMatcher(iso_graph, graph, edge_match=lambda e1, e2: e1['polarity'] == e2['polarity'])
+    if not matcher.is_isomorphic():
+        raise Exception('The polarity motifs are not isomorphic')
+    return tuple(matcher.mapping[role] for role in range(len(iso_graph)))
+
+
 def _is_polarity_sim_isomorphic(g1, g2):
     """
     check if two graphs of a SIM polarity motif are isomorphic. FASTER than the standard checking
@@ -103,6 +138,11 @@ class IsomorphicMotifMatch:
 
         self.base_path = 'isomorphic/mapping'
 
+        self.isomorphic_mapping = {}
+        self.isomorphic_graphs = {}
+        # the isomorphic mapping as a dense int32 array indexed by sub graph id
+        self.isomorphic_lookup: Optional[np.ndarray] = None
+
         # Load iso mapping
         file_path = self.__get_isomorphic_k_file_name()
         if not os.path.isfile(file_path):
@@ -112,6 +152,7 @@ class IsomorphicMotifMatch:
         bin_file: IsomorphicMappingBinFile = self.__import_iso_mapping(file_path)
         self.isomorphic_mapping = bin_file['isomorphic_mapping']
         self.isomorphic_graphs = bin_file['isomorphic_graphs']
+        self.isomorphic_lookup = get_isomorphic_lookup(self.isomorphic_mapping, k)
 
         # Load polarity iso mapping
         if not polarity_options:
@@ -158,7 +199,15 @@ class IsomorphicMotifMatch:
 
             merge_to_pol_obj = next(obj for obj in polarity_frequencies if obj.polarity == iso_polarity)
             merge_to_pol_obj.frequency += pol_obj.frequency
-            merge_to_pol_obj.sub_graphs.extend(pol_obj.sub_graphs)
+            if not isinstance(pol_obj.sub_graphs, Occurrences):
+                merge_to_pol_obj.sub_graphs.extend(pol_obj.sub_graphs)
+            elif len(pol_obj.sub_graphs):
+                # align the roles (columns) of the merged occurrences to the polarity of the merged to motif
+                sub_graphs = pol_obj.sub_graphs
+                role_order = get_polarity_role_order(sub_graphs.role_pattern, tuple(pol_obj.polarity),
+                                                     tuple(iso_polarity))
+                merge_to_pol_obj.sub_graphs = Occurrences.concatenate([merge_to_pol_obj.sub_graphs,
+                                                                       sub_graphs.with_roles(role_order)])
             del_idx_list.append(curr_idx)
 
         polarity_frequencies = [polarity_frequencies[i] for i in range(len(polarity_frequencies)) if
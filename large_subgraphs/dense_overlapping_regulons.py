@@ -0,0 +1,166 @@
+from collections import defaultdict
+from typing import Optional, Union
+
+import numpy as np
+from networkx import DiGraph
+
+from networks.compact_graph import CompactGraph
+from utils.occurrences import EdgePolarity, Occurrences
+from utils.types import LargeSubGraphSearchResult
+
+
+def get_dor_adj_mat(inputs: int, targets: int) -> np.ndarray:
+    adj_mat = np.zeros((inputs + targets, inputs + targets))
+    adj_mat[:inputs, inputs:] = 1
+    return adj_mat
+
+
+def get_dor_key(inputs: int, targets: int) -> str:
+    return f'DOR_{inputs}_{targets}'
+
+
+def is_dor_key(sub_id: Union[int, str]) -> bool:
+    return isinstance(sub_id, str) and sub_id.startswith('DOR_')
+
+
+class DenseOverlappingRegulons:
+    """
+    DOR - Dense Overlapping Regulons. a set of input nodes that all regulate the same set of targets.
+    paper:    Shai S. Shen-Orr1, Ron Milo2, Shmoolik Mangan1 & Uri Alon1
+              "Network motifs in the transcriptional regulation  network of Escherichia coli"
+    the DORs are the maximal bicliques (inputs x targets) of the input -> target projection of the network (self loops
+    are ignored), found by the MBEA algorithm:
+    Y. Zhang, C. A. Phillips, G. L. Rogers, E. J. Baker, E. J. Chesler, and M. A. Langston, "On finding bicliques in
+    bipartite graphs: a novel algorithm and its application to the integration of diverse biological data types",
+    BMC Bioinformatics, vol. 15, no. 110, 2014.
+    the search is pruned by the minimal number of inputs and targets, and the DORs are filtered by their density:
+    the fraction of the inputs' out edges that are inside the DOR.
+    the DORs are not split to polarity motifs: a DOR has 2^(inputs * targets) polarity options.
+    """
+
+    def __init__(self, network: DiGraph, compact_graph: Optional[CompactGraph] = None):
+        self.network = network
+        s, t = next(iter(network.edges))
+        self.use_polarity = 'polarity' in network[s][t] and network[s][t]['polarity'] is not None
+        self.graph = compact_graph if compact_graph is not None else CompactGraph(network)
+        self.edge_polarity = EdgePolarity.from_network(self.graph, network) if self.use_polarity else None
+
+        self.fsl = {}  # frequent sub graph list - value is the frequency
+        self.fsl_fully_mapped = {}  # same fsl, the value is the list of sub graphs
+        self.adj_mats = {}
+
+    def __get_projection(self, min_inputs: int, min_targets: int) -> dict[int, int]:
+        """
+        :return: input node -> the bitset of its targets, after removing (iteratively) the inputs with less than
+        min_targets targets and the targets with less than min_inputs inputs: they can't be a part of a DOR
+        """
+        graph = self.graph
+        not_loop = graph.src != graph.dst
+        src, dst = graph.src[not_loop], graph.dst[not_loop]
+        while True:
+            out_degree = np.bincount(src, minlength=graph.n)
+            in_degree = np.bincount(dst, minlength=graph.n)
+            keep = (out_degree[src] >= min_targets) & (in_degree[dst] >= min_inputs)
+            if keep.all():
+                break
+            src, dst = src[keep], dst[keep]
+
+        projection = defaultdict(int)
+        for s, t in zip(src.tolist(), dst.tolist()):
+            projection[s] |= 1 << t
+        return dict(sorted(projection.items()))
+
+    @staticmethod
+    def __get_bicliques(projection: dict[int, int], min_inputs: int,
+                        min_targets: int) -> list[tuple[list[int], int]]:
+        """
+        MBEA: all the maximal bicliques with at least min_inputs inputs and min_targets targets
+        :return: list of (inputs, targets bitset)
+        """
+        bicliques = []
+
+        def find(targets: int, inputs: list[int], candidates: list[int], excluded: list[int]):
+            candidates, excluded = list(candidates), list(excluded)
+            while candidates:
+                x = candidates.pop(0)
+                new_targets = targets & projection[x]
+                size = new_targets.bit_count()
+                if size < min_targets:
+                    excluded.append(x)
+                    continue
+
+                new_excluded = []
+                is_maximal = True
+                for v in excluded:
+                    common = (projection[v] & new_targets).bit_count()
+                    if common == size:
+                        is_maximal = False
+                        break
+                    if common:
+                        new_excluded.append(v)
+
+                if is_maximal:
+                    new_inputs = inputs + [x]
+                    new_candidates = []
+                    for v in candidates:
+                        common = (projection[v] & new_targets).bit_count()
+                        if common == size:
+                            new_inputs.append(v)
+                        elif common:
+                            new_candidates.append(v)
+                    if len(new_inputs) >= min_inputs:
+                        bicliques.append((sorted(new_inputs), new_targets))
+                    if new_candidates and len(new_inputs) + len(new_candidates) >= min_inputs:
+                        find(new_targets, new_inputs, new_candidates, new_excluded)
+                excluded.append(x)
+
+        all_targets = 0
+        for targets in projection.values():
+            all_targets |= targets
+        find(all_targets, [], list(projection), [])
+        return bicliques
+
+    def search_sub_graphs(self, min_inputs: int = 2, min_targets: int = 2, min_density: float = 0.0,
+                          counts_only: bool = False) -> LargeSubGraphSearchResult:
+        """
+        :param min_inputs: minimal number of input nodes
+        :param min_targets: minimal number of targets
+        :param min_density: minimal fraction of the out edges of the inputs that are inside the DOR
+        :param counts_only: count the DORs only (fsl), without building their occurrences (fsl_fully_mapped)
+        """
+        projection = self.__get_projection(min_inputs, min_targets)
+        bicliques = self.__get_bicliques(projection, min_inputs, min_targets)
+
+        not_loop = self.graph.src != self.graph.dst
+        out_degree = np.bincount(self.graph.src[not_loop], minlength=self.graph.n)
+        # DOR key -> the node indices of each DOR, in the role order: the inputs and then the targets
+        dor_nodes = defaultdict(list)
+        for inputs, targets_bitset in bicliques:
+            targets = [t for t in range(targets_bitset.bit_length()) if targets_bitset >> t & 1]
+            if len(inputs) * len(targets) < min_density * out_degree[inputs].sum():
+                continue
+            dor_nodes[(len(inputs), len(targets))].append(inputs + targets)
+
+        # we don't want the keys to mix with regular motif ids
+        shapes = sorted(dor_nodes)
+        self.fsl = {get_dor_key(*shape): len(dor_nodes[shape]) for shape in shapes}
+        self.fsl_fully_mapped = {get_dor_key(*shape): [] for shape in shapes}
+        self.adj_mats = {get_dor_key(*shape): get_dor_adj_mat(*shape) for shape in shapes}
+        if not counts_only:
+            for shape in shapes:
+                self.fsl_fully_mapped[get_dor_key(*shape)] = self.__get_occurrences(dor_nodes[shape], *shape)
+
+        return LargeSubGraphSearchResult(fsl=self.fsl,
+                                         fsl_fully_mapped=self.fsl_fully_mapped,
+                                         adj_mat=self.adj_mats)
+
+    def __get_occurrences(self, dor_nodes: list[list[int]], inputs: int, targets: int) -> Occurrences:
+        nodes = np.array(dor_nodes, dtype=np.int32).reshape(-1, inputs + targets)
+        role_pattern = [(i, inputs + j) for i in range(inputs) for j in range(targets)]
+        if self.edge_polarity is None:
+            return Occurrences(nodes, role_pattern, self.graph.nodes)
+
+        src = np.repeat(nodes[:, :inputs], targets, axis=1)
+        dst = np.tile(nodes[:, inputs:], (1, inputs))
+        polarity = self.edge_polarity.get_codes(src, dst)
+        return Occurrences(nodes, role_pattern, self.graph.nodes, polarity, self.edge_polarity.values)
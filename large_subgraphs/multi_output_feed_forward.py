@@ -0,0 +1,110 @@
+from collections import defaultdict
+from typing import Optional, Union
+
+import numpy as np
+from networkx import DiGraph
+
+from networks.compact_graph import CompactGraph, get_neighbours
+from utils.occurrences import EdgePolarity, Occurrences
+from utils.types import LargeSubGraphSearchResult
+
+
+def get_multi_output_ffl_adj_mat(outputs: int) -> np.ndarray:
+    adj_mat = np.zeros((outputs + 2, outputs + 2))
+    adj_mat[0][1:] = 1
+    adj_mat[1][2:] = 1
+    return adj_mat
+
+
+def get_multi_output_ffl_key(outputs: int) -> str:
+    return f'MFFL_{outputs}'
+
+
+def is_multi_output_ffl_key(sub_id: Union[int, str]) -> bool:
+    return isinstance(sub_id, str) and sub_id.startswith('MFFL_')
+
+
+class MultiOutputFeedForward:
+    """
+    Multi-output FFL: a pair of regulators x -> y that both regulate the outputs z1, z2, ..., zn.
+    paper:    Shai S. Shen-Orr1, Ron Milo2, Shmoolik Mangan1 & Uri Alon1
+              "Network motifs in the transcriptional regulation  network of Escherichia coli"
+    the induced feed forward loops (id 38: x -> y, x -> z, y -> z, self loops are ignored) are found in a single
+    vectorized pass, and grouped by their regulators pair: a pair with n outputs is a (maximal) multi-output FFL of
+    size n. the multi-output FFLs are not split to polarity motifs: they have 2^(2n + 1) polarity options.
+    """
+
+    def __init__(self, network: DiGraph, compact_graph: Optional[CompactGraph] = None):
+        self.network = network
+        s, t = next(iter(network.edges))
+        self.use_polarity = 'polarity' in network[s][t] and network[s][t]['polarity'] is not None
+        self.graph = compact_graph if compact_graph is not None else CompactGraph(network)
+        self.edge_polarity = EdgePolarity.from_network(self.graph, network) if self.use_polarity else None
+
+        self.fsl = {}  # frequent sub graph list - value is the frequency
+        self.fsl_fully_mapped = {}  # same fsl, the value is the list of sub graphs
+        self.adj_mats = {}
+
+    def get_feed_forward_loops(self) -> np.ndarray:
+        """
+        :return: (n, 3) array of the induced feed forward loops (x, y, z): x -> y, x -> z, y -> z
+        """
+        graph = self.graph
+        not_loop = graph.src != graph.dst
+        x, y = graph.src[not_loop], graph.dst[not_loop]
+        # the regulators pair is not mutual
+        one_way = ~graph.has_edges(y, x)
+        x, y = x[one_way], y[one_way]
+
+        owners, z = get_neighbours(graph.out_indptr, graph.out_indices, y)
+        x, y = x[owners], y[owners]
+        ffl = (z != x) & (z != y) & graph.has_edges(x, z) & ~graph.has_edges(z, x) & ~graph.has_edges(z, y)
+        return np.stack([x[ffl], y[ffl], z[ffl]], axis=1).astype(np.int32)
+
+    def search_sub_graphs(self, min_outputs: int = 2, max_outputs: Optional[int] = None,
+                          counts_only: bool = False) -> LargeSubGraphSearchResult:
+        """
+        :param min_outputs: minimal number of outputs
+        :param max_outputs: maximal number of outputs, None for no limit
+        :param counts_only: count the multi-output FFLs only (fsl), without building their occurrences
+        """
+        ffl = self.get_feed_forward_loops()
+
+        # group the FFLs by their regulators pair
+        pair_keys = ffl[:, 0].astype(np.int64) * self.graph.n + ffl[:, 1]
+        order = np.argsort(pair_keys, kind='stable')
+        _, starts, outputs = np.unique(pair_keys[order], return_index=True, return_counts=True)
+        in_range = outputs >= min_outputs
+        if max_outputs is not None:
+            in_range &= outputs <= max_outputs
+
+        # we don't want the keys to mix with regular motif ids
+        sizes = np.unique(outputs[in_range]).tolist()
+        self.fsl = {get_multi_output_ffl_key(size): int((outputs[in_range] == size).sum()) for size in sizes}
+        self.fsl_fully_mapped = {get_multi_output_ffl_key(size): [] for size in sizes}
+        self.adj_mats = {get_multi_output_ffl_key(size): get_multi_output_ffl_adj_mat(size) for size in sizes}
+
+        if not counts_only:
+            # size -> the node indices of each multi-output FFL, in the role order: x, y and then the outputs
+            mffl_nodes = defaultdict(list)
+            for start, size in zip(starts[in_range].tolist(), outputs[in_range].tolist()):
+                rows = ffl[order[start:start + size]]
+                mffl_nodes[size].append(np.concatenate([rows[0, :2], rows[:, 2]]))
+            for size in sizes:
+                self.fsl_fully_mapped[get_multi_output_ffl_key(size)] = self.__get_occurrences(mffl_nodes[size],
+                                                                                               size)
+
+        return LargeSubGraphSearchResult(fsl=self.fsl,
+                                         fsl_fully_mapped=self.fsl_fully_mapped,
+                                         adj_mat=self.adj_mats)
+
+    def __get_occurrences(self, mffl_nodes: list[np.ndarray], outputs: int) -> Occurrences:
+        nodes = np.array(mffl_nodes, dtype=np.int32).reshape(-1, outputs + 2)
+        role_pattern = [(0, 1)] + [(0, i) for i in range(2, outputs + 2)] + [(1, i) for i in range(2, outputs + 2)]
+        if self.edge_polarity is None:
+            return Occurrences(nodes, role_pattern, self.graph.nodes)
+
+        src = np.concatenate([nodes[:, :1], np.repeat(nodes[:, :2], outputs, axis=1)], axis=1)
+        dst = np.concatenate([nodes[:, 1:2], np.tile(nodes[:, 2:], (1, 2))], axis=1)
+        polarity = self.edge_polarity.get_codes(src, dst)
+        return Occurrences(nodes, role_pattern, self.graph.nodes, polarity, self.edge_polarity.values)
@@ -1,7 +1,12 @@
+from collections import defaultdict
+from math import comb
+from typing import Optional
+
 import numpy as np
 from networkx import DiGraph
-import networkx as nx
-from itertools import combinations
+
+from networks.compact_graph import CompactGraph, get_row_pairs
+from utils.occurrences import EdgePolarity, Occurrences
 from utils.types import LargeSubGraphSearchResult
 
 
@@ -11,55 +16,177 @@ def get_sim_adj_mat(control_size: int) -> np.ndarray:
     return adj_mat
 
 
+def multiply_polynomials(p: list[int], q: list[int], max_degree: int) -> list[int]:
+    """
+    :return: the product of the polynomials (coefficients lists), truncated at max_degree
+    """
+    product = [0] * min(len(p) + len(q) - 1, max_degree + 1)
+    for i, a in enumerate(p[:max_degree + 1]):
+        if not a:
+            continue
+        for j, b in enumerate(q[:max_degree + 1 - i]):
+            product[i + j] += a * b
+    return product
+
+
+def get_independence_polynomial(conflicts: dict[int, set[int]], max_degree: int) -> list[int]:
+    """
+    the number of independent sets of each size (up to max_degree) of a graph.
+    the nodes without conflicts contribute (1 + x) ^ free. the independent sets of the rest are extended in increasing
+    node order (neighbours / candidates as bitmasks) up to max_degree - 1 nodes, the sets of the last size are counted
+    (popcount of the candidates) and not visited: O(n ^ (max_degree - 1)) at most
+    :param conflicts: node -> its neighbours (undirected)
+    """
+    nodes = [u for u in conflicts if conflicts[u]]
+    free = len(conflicts) - len(nodes)
+    index = {u: i for i, u in enumerate(nodes)}
+    # the neighbours of each node, and the nodes after it, as bitmasks
+    neighbours = [sum(1 << index[v] for v in conflicts[u]) for u in nodes]
+    after = [~((2 << i) - 1) & ((1 << len(nodes)) - 1) for i in range(len(nodes))]
+
+    counts = [1] + [0] * min(len(nodes), max_degree)
+
+    def extend(candidates: int, size: int):
+        if size + 1 == max_degree:
+            counts[size + 1] += candidates.bit_count()
+            return
+        while candidates:
+            v = (candidates & -candidates).bit_length() - 1
+            candidates &= candidates - 1
+            counts[size + 1] += 1
+            extend(candidates & ~neighbours[v] & after[v], size + 1)
+
+    if max_degree > 0 and nodes:
+        extend((1 << len(nodes)) - 1, 0)
+    while len(counts) > 1 and not counts[-1]:
+        counts.pop()
+    return multiply_polynomials(counts, [comb(free, i) for i in range(min(free, max_degree) + 1)], max_degree)
+
+
 class SingleInputModule:
     """
     SIM - Single Input Module. my variation of induced SIM detector.
     paper:    Shai S. Shen-Orr1, Ron Milo2, Shmoolik Mangan1 & Uri Alon1
               "Network motifs in the transcriptional regulation  network of Escherichia coli"
+    an induced SIM is an input node (without a self loop) and a set of its targets with no other edges between them.
+    per input node, the clean targets (without a self loop or an edge back to the input) and the conflicts (edges)
+    between them are found, the SIMs are the independent sets of the conflicts graph: they are counted (of all the
+    control sizes) by its independence polynomial, and enumerated only when requested.
     """
-    # TODO: faster impl: try to fix the order: first check connections then the options...
 
-    def __init__(self, network: DiGraph):
+    def __init__(self, network: DiGraph, compact_graph: Optional[CompactGraph] = None):
         self.network = network
-        s, t = list(network.edges)[0]
+        s, t = next(iter(network.edges))
         self.use_polarity = 'polarity' in network[s][t] and network[s][t]['polarity'] is not None
+        self.graph = compact_graph if compact_graph is not None else CompactGraph(network)
+        self.edge_polarity = EdgePolarity.from_network(self.graph, network) if self.use_polarity else None
 
         self.fsl = {}  # frequent sub graph list - value is the frequency
         self.fsl_fully_mapped = {}  # same fsl, the value is the list of sub graphs
         self.adj_mats = {}
 
-    def search_sub_graphs(self, min_control_size: int, max_control_size: int) -> LargeSubGraphSearchResult:
-        _, max_out_degree = max(self.network.out_degree, key=lambda x: x[1])
+    def __get_clean_targets(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: CSR (indptr, indices) of the clean targets of each input node
+        """
+        graph = self.graph
+        inputs = np.repeat(np.arange(graph.n), graph.out_degree())
+        targets = graph.out_indices
+        clean = ~graph.self_loops[inputs] & ~graph.self_loops[targets] & ~graph.has_edges(targets, inputs)
+        indptr = np.zeros(graph.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(inputs[clean], minlength=graph.n), out=indptr[1:])
+        return indptr, targets[clean]
+
+    def __get_conflicts(self, indptr: np.ndarray, indices: np.ndarray) -> dict[int, list[tuple[int, int]]]:
+        """
+        :return: input node -> the conflicts (pairs of its clean targets with an edge between them)
+        """
+        inputs, u, v = get_row_pairs(indptr, indices)
+        conflict = self.graph.has_edges(u, v) | self.graph.has_edges(v, u)
+        conflicts = defaultdict(list)
+        for x, a, b in zip(inputs[conflict].tolist(), u[conflict].tolist(), v[conflict].tolist()):
+            conflicts[x].append((a, b))
+        return conflicts
 
+    def search_sub_graphs(self, min_control_size: int, max_control_size: int,
+                          counts_only: bool = False) -> LargeSubGraphSearchResult:
+        """
+        :param min_control_size: minimal number of controlled nodes
+        :param max_control_size: maximal number of controlled nodes
+        :param counts_only: count the SIMs only (fsl), without building their occurrences (fsl_fully_mapped)
+        """
         if max_control_size is None:
-            max_control_size = min(max_out_degree, max_out_degree)
+            max_control_size = int(self.graph.out_degree().max())
 
         # we don't want the keys to mix with regular motif ids
-        self.fsl = {f'SIM_{i}': 0 for i in range(min_control_size, max_control_size + 1)}
-        self.fsl_fully_mapped = {f'SIM_{i}': [] for i in range(min_control_size, max_control_size + 1)}
-        self.adj_mats = {f'SIM_{i}': get_sim_adj_mat(i) for i in range(min_control_size, max_control_size + 1)}
-
-        for control_size in range(min_control_size, max_control_size + 1):
-            sim_key = f'SIM_{control_size}'
-            for input_node in list(self.network.nodes):
-                neighbors = list(self.network.neighbors(input_node))
-                if input_node in neighbors:
-                    neighbors.remove(input_node)
-                for controlled in list(combinations(neighbors, control_size)):
-                    sub_graph = list(controlled) + [input_node]
-                    induced_sim = nx.induced_subgraph(self.network, sub_graph)
-                    if len(induced_sim.edges) != control_size:
-                        continue
-
-                    self.fsl[sim_key] += 1
-
-                    if not self.use_polarity:
-                        self.fsl_fully_mapped[sim_key].append(tuple(list(induced_sim.edges)))
-                    else:
-                        polarities = nx.get_edge_attributes(induced_sim, 'polarity')
-                        pol_edges = tuple([(*e, {'polarity': polarities[e]}) for e in list(induced_sim.edges)])
-                        self.fsl_fully_mapped[sim_key].append(pol_edges)
+        control_sizes = range(min_control_size, max_control_size + 1)
+        self.fsl = {f'SIM_{i}': 0 for i in control_sizes}
+        self.fsl_fully_mapped = {f'SIM_{i}': [] for i in control_sizes}
+        self.adj_mats = {f'SIM_{i}': get_sim_adj_mat(i) for i in control_sizes}
+
+        indptr, indices = self.__get_clean_targets()
+        conflicts = self.__get_conflicts(indptr, indices)
+        # control size -> the node indices of each SIM, in the role order: the input node and then the controlled
+        sim_nodes = defaultdict(list)
+
+        for input_node in range(self.graph.n):
+            targets = indices[indptr[input_node]:indptr[input_node + 1]].tolist()
+            if len(targets) < min_control_size:
+                continue
+
+            if input_node in conflicts:
+                target_conflicts = {t: set() for t in targets}
+                for a, b in conflicts[input_node]:
+                    target_conflicts[a].add(b)
+                    target_conflicts[b].add(a)
+                counts = get_independence_polynomial(target_conflicts, max_control_size)
+            else:
+                target_conflicts = None
+                counts = [comb(len(targets), i) for i in range(min(len(targets), max_control_size) + 1)]
+
+            for control_size in control_sizes:
+                if control_size < len(counts):
+                    self.fsl[f'SIM_{control_size}'] += counts[control_size]
+
+            if not counts_only:
+                self.__enumerate(input_node, targets, target_conflicts, min_control_size, max_control_size,
+                                 sim_nodes)
+
+        if not counts_only:
+            for control_size in control_sizes:
+                self.fsl_fully_mapped[f'SIM_{control_size}'] = self.__get_occurrences(sim_nodes[control_size],
+                                                                                       control_size)
 
         return LargeSubGraphSearchResult(fsl=self.fsl,
                                          fsl_fully_mapped=self.fsl_fully_mapped,
                                          adj_mat=self.adj_mats)
+
+    @staticmethod
+    def __enumerate(input_node: int, targets: list[int], conflicts: dict[int, set[int]], min_control_size: int,
+                    max_control_size: int, sim_nodes: dict[int, list]):
+        """
+        append the SIMs of the input node (the independent sets of its clean targets) to sim_nodes
+        """
+        def extend(controlled: list[int], start: int):
+            if len(controlled) >= min_control_size:
+                sim_nodes[len(controlled)].append([input_node] + controlled)
+            if len(controlled) == max_control_size:
+                return
+            for i in range(start, len(targets)):
+                t = targets[i]
+                if conflicts is not None and any(c in conflicts[t] for c in controlled):
+                    continue
+                controlled.append(t)
+                extend(controlled, i + 1)
+                controlled.pop()
+
+        extend([], 0)
+
+    def __get_occurrences(self, sim_nodes: list[list[int]], control_size: int) -> Occurrences:
+        nodes = np.array(sim_nodes, dtype=np.int32).reshape(-1, control_size + 1)
+        role_pattern = [(0, i) for i in range(1, control_size + 1)]
+        if self.edge_polarity is None:
+            return Occurrences(nodes, role_pattern, self.graph.nodes)
+
+        polarity = self.edge_polarity.get_codes(np.repeat(nodes[:, :1], control_size, axis=1), nodes[:, 1:])
+        return Occurrences(nodes, role_pattern, self.graph.nodes, polarity, self.edge_polarity.values)
@@ -1,11 +1,14 @@
 import random
-from typing import Union
+from functools import partial
+from typing import Callable, Optional, Union
 
 import networkx as nx
+import pandas as pd
 from networkx import DiGraph
 from tqdm import tqdm
 
 from motif_criteria import MotifCriteria
+from networks.compact_graph import CompactGraph
 from networks.loaders.network_loader import NetworkLoader
 from networks.network import Network
 from random_networks.nerve_ring_markov_chain_switching import NerveRingMarkovChainSwitching
@@ -15,34 +18,59 @@ from utils.polarity_counter import get_polarity_frequencies
 from random_networks.barabasi_albert_forced_edges import BarabasiAlbertForcedEdges
 from random_networks.erdos_renyi_forced_edges import ErdosRenyiForcedEdges
 from random_networks.markov_chain_switching import MarkovChainSwitching
+from random_networks.batched_markov_chain_switching import BatchedMarkovChainSwitching
+from random_networks.ensemble_pipeline import EnsemblePipeline
+from subgraphs.esu import ESU
+from subgraphs.parallel_esu import ParallelESU
+from subgraphs.rand_esu import RandESU
 from subgraphs.fanmod_esu import FanmodESU
+from subgraphs.incremental_triadic_census import IncrementalTriadicCensus
 from subgraphs.mfinder_enum_induced import MFinderInduced
 from subgraphs.mfinder_enum_none_induced import MFinderNoneInduced
 from large_subgraphs.single_input_moudle import SingleInputModule
+from large_subgraphs.dense_overlapping_regulons import DenseOverlappingRegulons, is_dor_key
+from large_subgraphs.multi_output_feed_forward import MultiOutputFeedForward, is_multi_output_ffl_key
 from subgraphs.specific_subgraphs import SpecificSubGraphs
 from subgraphs.sub_graphs_abc import SubGraphsABC
 from isomorphic.isomorphic import match_two_fsl_id_lists, IsomorphicMotifMatch
+from utils.occurrence_sink import DiskOccurrenceSink
 from utils.sub_graphs import create_base_motif, create_sim_motif
 from subgraphs.triadic_census import TriadicCensus
+from subgraphs.tetrad_census import TetradCensus
 from utils.export_import import export_results
-from utils.logs import log_motif_results, log_sub_graph_args, log_randomizer_args, log_motifs_table
+from utils.logs import log_motif_results, log_sub_graph_args, log_randomizer_args, log_motifs_table, \
+    log_random_network_results, log_incremental_census
 from utils.simple_logger import Logger
 import time
 import argparse
 from argparse import Namespace
 
 from utils.types import SubGraphAlgoName, RandomGeneratorAlgoName, NetworkInputType, NetworkLoaderArgs, \
-    MotifCriteriaArgs, Motif, SubGraphSearchResult, SearchResultBinaryFile, MotifType
+    MotifCriteriaArgs, Motif, SubGraphSearchResult, SearchResultBinaryFile, MotifType, SampledSubGraphSearchResult, \
+    LargeSubGraphSearchResult, RandomNetworkSearchResult
 
 sub_graph_algorithms = {
     SubGraphAlgoName.specific: SpecificSubGraphs,
     SubGraphAlgoName.mfinder_induced: MFinderInduced,
     SubGraphAlgoName.mfinder_none_induced: MFinderNoneInduced,
     SubGraphAlgoName.fanmod_esu: FanmodESU,
+    SubGraphAlgoName.esu: ESU,
+    SubGraphAlgoName.parallel_esu: ParallelESU,
+    SubGraphAlgoName.rand_esu: RandESU,
     SubGraphAlgoName.triadic_census: TriadicCensus,
+    SubGraphAlgoName.tetrad_census: TetradCensus,
     SubGraphAlgoName.netsci_wrapper: NetsciWrapper
 }
 
+# the (exact, induced) k=3 algorithms whose census of the random networks is kept by the markov chain instead
+incremental_census_algorithms = [
+    SubGraphAlgoName.mfinder_induced,
+    SubGraphAlgoName.fanmod_esu,
+    SubGraphAlgoName.esu,
+    SubGraphAlgoName.parallel_esu,
+    SubGraphAlgoName.triadic_census
+]
+
 random_generator_algorithms = {
     RandomGeneratorAlgoName.markov_chain_switching: MarkovChainSwitching,
     RandomGeneratorAlgoName.erdos_renyi: ErdosRenyiForcedEdges,
@@ -76,6 +104,9 @@ def parse_args():
     parser.add_argument("-bf", "--bin_file",
                         help="file path to save binary results",
                         default="results/example.bin")
+    parser.add_argument("-od", "--occurrences_dir",
+                        help="directory to stream the sub-graphs occurrences of the real network to (instead of memory)",
+                        default=None)
 
     # [Input file]
     parser.add_argument("-it", "--input_type",
@@ -104,15 +135,57 @@ def parse_args():
     parser.add_argument("-sa", "--sub_graph_algorithm",
                         help="sub-graph enumeration algorithm",
                         default='netsci_wrapper',
-                        choices=['mfinder_i', 'mfinder_ni', 'fanmod', 'triadic_census', 'netsci_wrapper', 'specific'])
+                        choices=['mfinder_i', 'mfinder_ni', 'fanmod', 'esu', 'parallel_esu', 'rand_esu',
+                                 'triadic_census', 'tetrad_census', 'netsci_wrapper', 'specific'])
     parser.add_argument("-k", "--k",
                         help="the size of sub-graph / motif to search in the enumeration algorithm",
                         type=int,
                         default=3)
+    parser.add_argument("-w", "--workers",
+                        help="number of worker processes in the parallel_esu algorithm, of the real network search "
+                             "(default: all cpus)",
+                        type=int,
+                        default=None)
+    parser.add_argument("-rsf", "--rand_esu_sampling_fraction",
+                        help="the expected fraction of sampled sub-graphs in the rand_esu algorithm",
+                        type=float,
+                        default=0.1)
+    parser.add_argument("-rta", "--rand_esu_target_accuracy",
+                        help="rand_esu: stop when the relative standard error of the frequent sub-graphs is below it",
+                        type=float,
+                        default=None)
+    parser.add_argument("-rtb", "--rand_esu_time_budget",
+                        help="rand_esu: time budget [Sec] of the sampling rounds",
+                        type=float,
+                        default=None)
     parser.add_argument("-sim", "--sim",
                         help="the maximum size of control size in the SIM search algorithm",
                         type=int,
                         default=1)
+    parser.add_argument("-dor", "--dor",
+                        help="run the DOR (dense overlapping regulons) search algorithm",
+                        action='store_true',
+                        default=False)
+    parser.add_argument("-dmi", "--dor_min_inputs",
+                        help="the minimum number of input nodes in the DOR search algorithm",
+                        type=int,
+                        default=2)
+    parser.add_argument("-dmt", "--dor_min_targets",
+                        help="the minimum number of targets in the DOR search algorithm",
+                        type=int,
+                        default=2)
+    parser.add_argument("-dmd", "--dor_min_density",
+                        help="the minimum fraction of the inputs' out edges that are inside a DOR",
+                        type=float,
+                        default=0.5)
+    parser.add_argument("-mffl", "--multi_output_ffl",
+                        help="run the multi-output FFL search algorithm",
+                        action='store_true',
+                        default=False)
+    parser.add_argument("-mfo", "--mffl_min_outputs",
+                        help="the minimum number of outputs in the multi-output FFL search algorithm",
+                        type=int,
+                        default=2)
 
     parser.add_argument("-uim", "--use_isomorphic_mapping",
                         help="use the (predefined) isomorphic mappings in the enumeration algorithm",
@@ -164,7 +237,7 @@ def parse_args():
     parser.add_argument("-r", "--randomizer",
                         help="main randomizer algorithm in a full motif search",
                         default='markov_chain',
-                        choices=['markov_chain', 'nerve_ring_markov_chain', 'erdos_renyi', 'barabasi'])
+                        choices=['markov_chain', 'nerve_ring_markov_chain', 'batched_markov_chain', 'erdos_renyi', 'barabasi'])
     parser.add_argument("-na", "--network_amount",
                         help="amount of random networks to generate in a full motif search",
                         type=int,
@@ -173,6 +246,33 @@ def parse_args():
                         help="number of switch factors done by the markov chain randomizer",
                         type=int,
                         default=10)
+    parser.add_argument("-ic", "--incremental_census",
+                        help="keep the k=3 census of the random networks up to date along the markov chain, "
+                             "instead of a sub graph search per random network (counts only runs)",
+                        action='store_true',
+                        default=False)
+    parser.add_argument("-mw", "--mixing_window",
+                        help="adaptive switch factor: stop each markov chain once its mixing statistics were stable "
+                             "for this number of switch factors (the switch factor is the maximum)",
+                        type=int,
+                        default=None)
+    parser.add_argument("-mt", "--mixing_tolerance",
+                        help="adaptive switch factor: the largest change of a mixing statistic (a fraction) "
+                             "between two windows that is considered stable",
+                        type=float,
+                        default=0.01)
+    parser.add_argument("-dm", "--distance_matrix",
+                        help="nerve_ring_markov_chain: a csv distance matrix (the first row and column are the "
+                             "neuron names) instead of the nerve ring distances",
+                        default=None)
+    parser.add_argument("-dth", "--distance_threshold",
+                        help="nerve_ring_markov_chain: a switch may connect only neurons closer than the threshold",
+                        type=float,
+                        default=0.1)
+    parser.add_argument("-ew", "--ensemble_workers",
+                        help="number of worker processes that generate and search the random networks",
+                        type=int,
+                        default=1)
 
     # [Motif criteria]
     parser.add_argument("-a", "--alpha",
@@ -197,32 +297,23 @@ def parse_args():
 
 def polarity_motif_search(
         motif_candidates: dict[int, Motif],
-        random_network_sub_graph_results: list[SubGraphSearchResult]):
+        random_network_search_results: list[RandomNetworkSearchResult]):
     if not network.use_polarity:
         return
 
     print('starting pol motif search:')
     for sub_id in tqdm(motif_candidates):
+        if not has_polarity_motifs(sub_id):
+            continue
         motif = motif_candidates[sub_id]
 
-        # count polarity frequencies for the random networks
-        random_network_polarity_frequencies = []
-        for rand_network_res in random_network_sub_graph_results:
-            random_network_polarity_frequencies.append(
-                get_polarity_frequencies(appearances=rand_network_res.fsl_fully_mapped.get(sub_id, []),
-                                         roles=motif.role_pattern,
-                                         polarity_options=network.polarity_options,
-                                         motif_id=sub_id,
-                                         iso_matcher=iso_matcher
-                                         ))
-
+        # the polarity frequencies of the random networks were counted by the ensemble pipeline
         for polarity_motif in motif.polarity_motifs:
             random_network_samples: list[int] = []
-            for rand_network_pol_freq in random_network_polarity_frequencies:
-                for rand_pol_freq in rand_network_pol_freq:
-                    if rand_pol_freq.polarity == polarity_motif.polarity:
-                        random_network_samples.append(rand_pol_freq.frequency)
-                        break
+            for rand_network_res in random_network_search_results:
+                rand_polarity_fsl = rand_network_res.polarity_fsl.get(sub_id, {})
+                if tuple(polarity_motif.polarity) in rand_polarity_fsl:
+                    random_network_samples.append(rand_polarity_fsl[tuple(polarity_motif.polarity)])
 
             polarity_motif.random_network_samples = random_network_samples
             polarity_motif.motif_criteria = motif_criteria.is_motif(polarity_motif)
@@ -242,20 +333,104 @@ def _populate_motif(motif: Motif, sub_graphs: list):
                                                                 neuron_names=network.neuron_names)
 
 
+def large_sub_graph_search(graph: DiGraph, args: Namespace, counts_only: bool = False,
+                           compact_graph: Optional[CompactGraph] = None) -> LargeSubGraphSearchResult:
+    """
+    the SIM and (optional) DOR and multi-output FFL searches, their results are keyed by strings: they don't mix
+    with the motif ids
+    :param compact_graph: the CompactGraph of the graph, shared by the searches (built if not given)
+    """
+    compact_graph = compact_graph if compact_graph is not None else CompactGraph(graph)
+    sim = SingleInputModule(graph, compact_graph)
+    search_results = [sim.search_sub_graphs(min_control_size=args.k, max_control_size=args.sim,
+                                            counts_only=counts_only)]
+    if args.dor:
+        dor = DenseOverlappingRegulons(graph, compact_graph)
+        search_results.append(dor.search_sub_graphs(min_inputs=args.dor_min_inputs, min_targets=args.dor_min_targets,
+                                                    min_density=args.dor_min_density, counts_only=counts_only))
+    if args.multi_output_ffl:
+        multi_output_ffl = MultiOutputFeedForward(graph, compact_graph)
+        search_results.append(multi_output_ffl.search_sub_graphs(min_outputs=args.mffl_min_outputs,
+                                                                 counts_only=counts_only))
+
+    return LargeSubGraphSearchResult(fsl={k: v for res in search_results for k, v in res.fsl.items()},
+                                     fsl_fully_mapped={k: v for res in search_results
+                                                       for k, v in res.fsl_fully_mapped.items()},
+                                     adj_mat={k: v for res in search_results for k, v in res.adj_mat.items()})
+
+
+def search_random_network(rand_network: DiGraph, census_fsl: Optional[dict[int, int]], args: Namespace,
+                          sub_graph_algo: Callable[..., SubGraphsABC], isomorphic_mapping: dict,
+                          iso_matcher: IsomorphicMotifMatch, n_real_ids: Optional[list[int]],
+                          polarity_roles: dict[Union[str, int], list[tuple]],
+                          polarity_options: list[str]) -> RandomNetworkSearchResult:
+    """
+    the search of a single random network (a task of the ensemble pipeline), reduced to its counts
+    :param census_fsl: the k=3 fsl kept by the randomizer, used instead of a sub graph search
+    :param n_real_ids: the motif ids of the real network to map the random network ids to (no isomorphic mapping)
+    :param polarity_roles: the role pattern of each motif whose polarity frequencies are counted
+    """
+    # the occurrences of the random networks are used only by the polarity frequencies
+    counts_only = not polarity_roles
+    compact_graph = CompactGraph(rand_network)
+    if census_fsl is not None:
+        sub_graph_search_result = SubGraphSearchResult(fsl=census_fsl, fsl_fully_mapped={})
+    else:
+        sub_graph_search_result = sub_graph_algo(rand_network, isomorphic_mapping, compact_graph=compact_graph) \
+            .search_sub_graphs(k=args.k, allow_self_loops=args.allow_self_loops, counts_only=counts_only)
+
+    large_search_result = large_sub_graph_search(rand_network, args, counts_only=counts_only,
+                                                 compact_graph=compact_graph)
+    fsl = {**sub_graph_search_result.fsl, **large_search_result.fsl}
+    fsl_fully_mapped = {**sub_graph_search_result.fsl_fully_mapped, **large_search_result.fsl_fully_mapped}
+
+    # handle mapping in case no isomorphic_graphs (i.e., large K)
+    if n_real_ids is not None:
+        iso_map = match_two_fsl_id_lists(n_real_ids, [k for k in list(fsl.keys()) if isinstance(k, int)], k=args.k)
+        for src_ in iso_map:
+            tar_ = iso_map[src_]
+            if src_ == tar_:
+                continue
+            fsl[src_] = fsl.pop(tar_, 0)
+            fsl_fully_mapped[src_] = fsl_fully_mapped.pop(tar_, [])
+
+    polarity_fsl = {}
+    for sub_id, roles in polarity_roles.items():
+        polarity_frequencies = get_polarity_frequencies(appearances=fsl_fully_mapped.get(sub_id, []),
+                                                        roles=roles,
+                                                        polarity_options=polarity_options,
+                                                        motif_id=sub_id,
+                                                        iso_matcher=iso_matcher)
+        polarity_fsl[sub_id] = {tuple(pol_freq.polarity): pol_freq.frequency for pol_freq in polarity_frequencies}
+
+    return RandomNetworkSearchResult(fsl=fsl, polarity_fsl=polarity_fsl)
+
+
+def has_polarity_motifs(sub_id: Union[int, str]) -> bool:
+    """
+    the DORs and the multi-output FFLs are not split to polarity motifs (too many polarity options)
+    """
+    return not is_dor_key(sub_id) and not is_multi_output_ffl_key(sub_id)
+
+
 def sub_graph_search(args: Namespace) -> dict[Union[str, int], Motif]:
     log_sub_graph_args(args)
 
     sub_graph_algo: SubGraphsABC = sub_graph_algorithms[sub_graph_algo_choice](network.graph, isomorphic_mapping)
+    if args.occurrences_dir:
+        sub_graph_algo.occurrence_sink = DiskOccurrenceSink(args.occurrences_dir)
     start_time = time.time()
     search_result = sub_graph_algo.search_sub_graphs(k=args.k, allow_self_loops=args.allow_self_loops)
     end_time = time.time()
     logger.info(f'Sub Graph search timer [Sec]: {round(end_time - start_time, 2)}')
+    if isinstance(search_result, SampledSubGraphSearchResult):
+        logger.info(f'Sampled sub graph search: {search_result.rounds} rounds, '
+                    f'explored fraction: {search_result.explored_fraction}')
 
-    sim = SingleInputModule(network.graph)
     start_time = time.time()
-    sim_search_result = sim.search_sub_graphs(min_control_size=args.k, max_control_size=args.sim)
+    large_search_result = large_sub_graph_search(network.graph, args, compact_graph=sub_graph_algo.graph)
     end_time = time.time()
-    logger.info(f'SIM search timer [Sec]: {round(end_time - start_time, 2)}')
+    logger.info(f'SIM / DOR / multi-output FFL search timer [Sec]: {round(end_time - start_time, 2)}')
 
     motifs = {}
     loop_over = isomorphic_graphs if isomorphic_graphs else search_result.fsl
@@ -266,16 +441,18 @@ def sub_graph_search(args: Namespace) -> dict[Union[str, int], Motif]:
         _populate_motif(motif=motif, sub_graphs=motif.sub_graphs)
         motifs[sub_id] = motif
 
-    for sim_id in sim_search_result.fsl:
-        motif = create_sim_motif(sim_id=sim_id, adj_mat=sim_search_result.adj_mat[sim_id])
-        motif.n_real = sim_search_result.fsl[sim_id]
-        motif.sub_graphs = sim_search_result.fsl_fully_mapped[sim_id]
+    for sim_id in large_search_result.fsl:
+        motif = create_sim_motif(sim_id=sim_id, adj_mat=large_search_result.adj_mat[sim_id])
+        motif.n_real = large_search_result.fsl[sim_id]
+        motif.sub_graphs = large_search_result.fsl_fully_mapped[sim_id]
         _populate_motif(motif=motif, sub_graphs=motif.sub_graphs)
         motifs[sim_id] = motif
 
     start_time = time.time()
     if network.use_polarity:
         for sub_id in motifs:
+            if not has_polarity_motifs(sub_id):
+                continue
             motif = motifs[sub_id]
             polarity_frequencies = get_polarity_frequencies(appearances=motif.sub_graphs,
                                                             roles=motif.role_pattern,
@@ -285,7 +462,7 @@ def sub_graph_search(args: Namespace) -> dict[Union[str, int], Motif]:
             for motif_pol_freq in polarity_frequencies:
                 # TODO: compare to 'sim', 'dor' etc: replace 'isinstance' with a super class property
                 if isinstance(sub_id, str):
-                    polarity_motif = create_sim_motif(sim_id=sub_id, adj_mat=sim_search_result.adj_mat[sub_id])
+                    polarity_motif = create_sim_motif(sim_id=sub_id, adj_mat=large_search_result.adj_mat[sub_id])
                 else:
                     polarity_motif = create_base_motif(sub_id=sub_id, k=args.k)
 
@@ -301,6 +478,27 @@ def sub_graph_search(args: Namespace) -> dict[Union[str, int], Motif]:
     return motifs
 
 
+def get_incremental_census_disabled_reason(args: Namespace, counts_only: bool,
+                                           random_generator_algo_choice: RandomGeneratorAlgoName) -> Optional[str]:
+    """
+    :return: why the incremental census can't replace the census of the random networks, None if it can
+    """
+    markov_chain_algorithms = [RandomGeneratorAlgoName.markov_chain_switching,
+                               RandomGeneratorAlgoName.nerve_ring_markov_chain_switching,
+                               RandomGeneratorAlgoName.batched_markov_chain_switching]
+    if not counts_only:
+        return 'the polarity motif search needs the occurrences of the random networks'
+    if args.k != 3:
+        return f'k is {args.k} (k=3 only)'
+    if sub_graph_algo_choice not in incremental_census_algorithms:
+        return f'{sub_graph_algo_choice.value} is not an exact induced k=3 algorithm'
+    if random_generator_algo_choice not in markov_chain_algorithms:
+        return f'{random_generator_algo_choice.value} is not a markov chain randomizer'
+    if not args.allow_self_loops and nx.number_of_selfloops(network.graph):
+        return 'the network has self loops (allow them with -asl)'
+    return None
+
+
 def motif_search(args: Namespace):
     motif_candidates = sub_graph_search(args)
 
@@ -311,49 +509,58 @@ def motif_search(args: Namespace):
         return
 
     log_randomizer_args(args)
+    # the occurrences of the random networks are used only by the polarity motif search
+    counts_only = not network.use_polarity
+    polarity_roles = {} if counts_only else {sub_id: motif.role_pattern for sub_id, motif in motif_candidates.items()
+                                             if has_polarity_motifs(sub_id)}
+
     random_generator_algo_choice = RandomGeneratorAlgoName(args.randomizer)
+    incremental_census = None
+    if args.incremental_census:
+        disabled_reason = get_incremental_census_disabled_reason(args, counts_only, random_generator_algo_choice)
+        if disabled_reason is None:
+            incremental_census = IncrementalTriadicCensus(network.graph, isomorphic_mapping, args.allow_self_loops)
+        log_incremental_census(disabled_reason)
+
     if random_generator_algo_choice == RandomGeneratorAlgoName.markov_chain_switching:
-        randomizer = MarkovChainSwitching(network, switch_factor=args.switch_factor)
+        randomizer = MarkovChainSwitching(network, switch_factor=args.switch_factor,
+                                          incremental_census=incremental_census, mixing_window=args.mixing_window,
+                                          mixing_tolerance=args.mixing_tolerance)
     elif random_generator_algo_choice == RandomGeneratorAlgoName.nerve_ring_markov_chain_switching:
-        randomizer = NerveRingMarkovChainSwitching(network, switch_factor=args.switch_factor)
+        distances = pd.read_csv(args.distance_matrix, index_col=0) if args.distance_matrix else None
+        randomizer = NerveRingMarkovChainSwitching(network, switch_factor=args.switch_factor,
+                                                   incremental_census=incremental_census,
+                                                   mixing_window=args.mixing_window,
+                                                   mixing_tolerance=args.mixing_tolerance,
+                                                   distances=distances,
+                                                   distance_threshold=args.distance_threshold)
+    elif random_generator_algo_choice == RandomGeneratorAlgoName.batched_markov_chain_switching:
+        randomizer = BatchedMarkovChainSwitching(network, switch_factor=args.switch_factor,
+                                                 seed=int(args.random_seed), incremental_census=incremental_census,
+                                                 mixing_window=args.mixing_window,
+                                                 mixing_tolerance=args.mixing_tolerance)
     else:
         randomizer = random_generator_algorithms[random_generator_algo_choice](network)
 
-    random_network_amount = args.network_amount
-    random_networks = randomizer.generate(amount=random_network_amount)
-
-    random_network_sub_graph_results = []
-    for rand_network in tqdm(random_networks):
-        sub_graph_algo: SubGraphsABC = sub_graph_algorithms[sub_graph_algo_choice](rand_network, isomorphic_mapping)
-        sub_graph_search_result = sub_graph_algo.search_sub_graphs(k=args.k, allow_self_loops=args.allow_self_loops)
+    sub_graph_algo = sub_graph_algorithms[sub_graph_algo_choice]
+    if sub_graph_algo_choice == SubGraphAlgoName.parallel_esu:
+        # only the real network census runs on a pool: a pool per random network costs more than its search, and the
+        # ensemble workers can't have a pool of their own (the random networks are the parallel part, -ew)
+        sub_graph_algo = partial(ParallelESU, workers=1)
+    n_real_ids = None if isomorphic_graphs else [m.id for m in motif_candidates.values() if isinstance(m.id, int)]
+    search = partial(search_random_network, args=args, sub_graph_algo=sub_graph_algo,
+                     isomorphic_mapping=isomorphic_mapping, iso_matcher=iso_matcher, n_real_ids=n_real_ids,
+                     polarity_roles=polarity_roles,
+                     polarity_options=network.polarity_options if network.use_polarity else [])
 
-        sim = SingleInputModule(rand_network)
-        sim_search_result = sim.search_sub_graphs(min_control_size=args.k, max_control_size=args.sim)
-
-        combined_res = SubGraphSearchResult(fsl={**sub_graph_search_result.fsl, **sim_search_result.fsl},
-                                            fsl_fully_mapped={**sub_graph_search_result.fsl_fully_mapped,
-                                                              **sim_search_result.fsl_fully_mapped})
-
-        random_network_sub_graph_results.append(combined_res)
-
-    # handle mapping in case no isomorphic_graphs (i.e., large K)
-    if not isomorphic_graphs:
-        n_real_ids = [m.id for m in motif_candidates.values() if isinstance(m.id, int)]
-        rand_network_ids = []
-        for rand_network in random_network_sub_graph_results:
-            rand_network_ids.append([k for k in list(rand_network.fsl.keys()) if isinstance(k, int)])
-
-        iso_mappings = [match_two_fsl_id_lists(n_real_ids, rand_ids, k=args.k) for rand_ids in rand_network_ids]
-        for iso_map, rand_network in zip(iso_mappings, random_network_sub_graph_results):
-            for src_ in iso_map:
-                tar_ = iso_map[src_]
-                if src_ == tar_:
-                    continue
-                rand_network.fsl[src_] = rand_network.fsl.pop(tar_, 0)
-                rand_network.fsl_fully_mapped[src_] = rand_network.fsl_fully_mapped.pop(tar_, [])
+    random_network_amount = args.network_amount
+    pipeline = EnsemblePipeline(randomizer, search, seed=args.random_seed, workers=args.ensemble_workers)
+    random_network_search_results = list(tqdm(pipeline.iter_results(random_network_amount),
+                                              total=random_network_amount))
+    log_random_network_results(random_network_search_results)
 
     for sub_id in motif_candidates:
-        random_network_samples = [rand_network.fsl.get(sub_id, 0) for rand_network in random_network_sub_graph_results]
+        random_network_samples = [rand_network.fsl.get(sub_id, 0) for rand_network in random_network_search_results]
         motif_candidate: Motif = motif_candidates[sub_id]
         motif_candidate.random_network_samples = random_network_samples
         motif_candidate.motif_criteria = motif_criteria.is_motif(motif_candidate)
@@ -364,7 +571,7 @@ def motif_search(args: Namespace):
     if args.bin_file and not network.use_polarity:
         export_results(SearchResultBinaryFile(args=args, motifs=motif_candidates))
 
-    polarity_motif_search(motif_candidates, random_network_sub_graph_results)
+    polarity_motif_search(motif_candidates, random_network_search_results)
 
 
 def load_network_from_args(args: Namespace) -> Network:
@@ -389,6 +596,12 @@ if __name__ == "__main__":
 
     random.seed(args.random_seed)
     sub_graph_algo_choice = SubGraphAlgoName(args.sub_graph_algorithm)
+    if args.workers:
+        sub_graph_algorithms[SubGraphAlgoName.parallel_esu] = partial(ParallelESU, workers=args.workers)
+    sub_graph_algorithms[SubGraphAlgoName.rand_esu] = partial(RandESU,
+                                                              sampling_fraction=args.rand_esu_sampling_fraction,
+                                                              target_accuracy=args.rand_esu_target_accuracy,
+                                                              time_budget=args.rand_esu_time_budget)
 
     network = load_network_from_args(args)
 
@@ -0,0 +1,138 @@
+from typing import Iterator
+
+import numpy as np
+from networkx import DiGraph
+
+
+def _to_csr(rows: np.ndarray, cols: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((cols, rows))
+    indices = cols[order].astype(np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return indptr, indices
+
+
+def get_row_pairs(indptr: np.ndarray, indices: np.ndarray, start: int = 0, end: int = -1) -> tuple[np.ndarray, ...]:
+    """
+    all the pairs of positions p < q within the same row of a CSR structure, for the rows [start, end)
+    :return: (rows, first, second) arrays: the row of each pair and the values at its two positions
+    """
+    end = len(indptr) - 1 if end < 0 else end
+    positions = np.arange(indptr[start], indptr[end])
+    rows = np.repeat(np.arange(start, end), np.diff(indptr[start:end + 1]))
+    followers = indptr[rows + 1] - positions - 1
+    first = np.repeat(positions, followers)
+    offsets = np.arange(len(first)) - np.repeat(np.cumsum(followers) - followers, followers)
+    return np.repeat(rows, followers), indices[first], indices[first + 1 + offsets]
+
+
+def get_row_triples(indptr: np.ndarray, indices: np.ndarray, start: int = 0, end: int = -1) -> tuple[np.ndarray, ...]:
+    """
+    all the triples of positions p < q < r within the same row of a CSR structure, for the rows [start, end)
+    :return: (rows, first, second, third) arrays: the row of each triple and the values at its three positions
+    """
+    rows, p, q = get_row_pairs(indptr, np.arange(len(indices)), start, end)
+    followers = indptr[rows + 1] - q - 1
+    r = np.repeat(q, followers) + 1 + np.arange(followers.sum()) - np.repeat(np.cumsum(followers) - followers, followers)
+    p, q = np.repeat(p, followers), np.repeat(q, followers)
+    return np.repeat(rows, followers), indices[p], indices[q], indices[r]
+
+
+def get_neighbours(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    the CSR rows of the given nodes, flattened
+    :return: (owners, neighbours) arrays: the position (in nodes) of each neighbour's node, and the neighbour
+    """
+    degree = indptr[nodes + 1] - indptr[nodes]
+    owners = np.repeat(np.arange(len(nodes)), degree)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(degree) - degree, degree)
+    return owners, indices[np.repeat(indptr[nodes], degree) + offsets]
+
+
+def get_row_chunks(work: np.ndarray, chunk_size: int) -> Iterator[tuple[int, int]]:
+    """
+    split the rows to consecutive chunks [start, end) of about chunk_size work each (at least one row)
+    :param work: the work (e.g.: the number of enumerated candidates) of each row
+    """
+    cumulative = np.cumsum(work)
+    start, n = 0, len(work)
+    while start < n:
+        end = int(np.searchsorted(cumulative, cumulative[start] - work[start] + chunk_size, side='right'))
+        end = min(max(end, start + 1), n)
+        yield start, end
+        start = end
+
+
+class CompactGraph:
+    """
+    An integer indexed, read only view of a DiGraph, built once per network and shared by the enumerators.
+    node i is the i-th node of the sorted node list, so comparing / sorting indices is the same as comparing /
+    sorting the original node names (which is the order used by the sub graph ids).
+    - out / in neighbours are kept in CSR format (indptr, indices), the undirected neighbours are sorted and
+      do not include the node itself (i.e.: self loops).
+    - edge membership is tested on an integer key: u * n + v.
+    """
+
+    def __init__(self, graph: DiGraph):
+        self.nodes: list = sorted(graph.nodes)
+        self.n = len(self.nodes)
+        self.node_index: dict = {node: i for i, node in enumerate(self.nodes)}
+
+        edges = list(graph.edges)
+        self.src = np.array([self.node_index[s] for s, _ in edges], dtype=np.int64)
+        self.dst = np.array([self.node_index[t] for _, t in edges], dtype=np.int64)
+        self.m = len(edges)
+
+        self.out_indptr, self.out_indices = _to_csr(self.src, self.dst, self.n)
+        self.in_indptr, self.in_indices = _to_csr(self.dst, self.src, self.n)
+
+        not_loop = self.src != self.dst
+        und_rows = np.concatenate([self.src[not_loop], self.dst[not_loop]])
+        und_cols = np.concatenate([self.dst[not_loop], self.src[not_loop]])
+        und_keys = np.unique(und_rows * self.n + und_cols)
+        self.und_indptr, self.und_indices = _to_csr(und_keys // max(self.n, 1), und_keys % max(self.n, 1), self.n)
+
+        self.self_loops = np.zeros(self.n, dtype=bool)
+        self.self_loops[self.src[~not_loop]] = True
+
+        self.edge_key_array = np.sort(self.src * self.n + self.dst)
+        self.edge_keys: set[int] = set(self.edge_key_array.tolist())
+
+        # python lists of the neighbours, for the recursive (pure python) enumerators
+        self.out_adj: list[list[int]] = self.__split(self.out_indptr, self.out_indices)
+        self.in_adj: list[list[int]] = self.__split(self.in_indptr, self.in_indices)
+        self.und_adj: list[list[int]] = self.__split(self.und_indptr, self.und_indices)
+
+    @staticmethod
+    def __split(indptr: np.ndarray, indices: np.ndarray) -> list[list[int]]:
+        ptr = indptr.tolist()
+        values = indices.tolist()
+        return [values[ptr[i]:ptr[i + 1]] for i in range(len(ptr) - 1)]
+
+    def has_edge(self, u: int, v: int) -> bool:
+        return u * self.n + v in self.edge_keys
+
+    def has_edges(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """
+        vectorized edge membership test
+        :param u: array of source indices
+        :param v: array of target indices (same shape as u)
+        :return: boolean array
+        """
+        keys = np.asarray(u, dtype=np.int64) * self.n + np.asarray(v, dtype=np.int64)
+        if not self.m:
+            return np.zeros(keys.shape, dtype=bool)
+        pos = np.minimum(np.searchsorted(self.edge_key_array, keys), self.m - 1)
+        return self.edge_key_array[pos] == keys
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.out_indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.diff(self.in_indptr)
+
+    def und_degree(self) -> np.ndarray:
+        return np.diff(self.und_indptr)
+
+    def labels(self, nodes) -> list:
+        return [self.nodes[i] for i in nodes]
@@ -38,11 +38,14 @@ class BarabasiAlbertForcedEdges(NetworkRandomizer):
     def generate(self, amount: int) -> list[DiGraph]:
         self.logger.info(f'm (# of edges to attach): {self.m}')
 
-        random_networks = [self.generate_foo() for _ in tqdm(range(amount))]
+        random_networks = [self.generate_network(i) for i in tqdm(range(amount))]
         self._log_avg_num_of_generated_edges(random_networks, amount)
 
         return random_networks
 
+    def generate_network(self, index: int) -> DiGraph:
+        return self.generate_foo()
+
     def __generate(self) -> DiGraph:
         undirected_graph = nx.barabasi_albert_graph(n=self.n, m=self.m)
         remove_edges_amount = len(undirected_graph.edges) - self.e
@@ -0,0 +1,137 @@
+from typing import Optional
+
+import numpy as np
+from networkx import DiGraph
+
+from networks.network import Network
+from random_networks.markov_chain_switching import MarkovChainSwitching
+from subgraphs.incremental_triadic_census import IncrementalTriadicCensus
+
+
+def get_first_owners(values: np.ndarray, owners: np.ndarray, queries: np.ndarray, default: int) -> np.ndarray:
+    """
+    :return: for each query, the smallest owner of a value that is equal to it (default if there is none)
+    """
+    if not len(values):
+        return np.full(len(queries), default)
+    order = np.lexsort((owners, values))
+    values, owners = values[order], owners[order]
+    unique_values, first = np.unique(values, return_index=True)
+    positions = np.searchsorted(unique_values, queries).clip(max=len(unique_values) - 1)
+    return np.where(unique_values[positions] == queries, owners[first][positions], default)
+
+
+class BatchedMarkovChainSwitching(MarkovChainSwitching):
+    """
+    The markov chain switching, where the switches are proposed and checked in vectorized batches. it keeps the
+    degree and polarity guarantees of the one by one switching, and the switches it applies commute with the one by
+    one order of the proposals - up to the deferred proposals still pending when the chain ends, which are dropped.
+    - a proposal (i, j) is a pair of edge positions: x1 -> y1, x2 -> y2 are replaced by x1 -> y2, x2 -> y1.
+    - the proposals of a batch are checked against the edges at the start of the batch. a proposal that does not
+      interact with any earlier proposal in the batch (they share no edge position, neither removes / adds the
+      other's new edges, and no source with an earlier proposal whose targets are not known yet) commutes with
+      them: the valid ones are applied at once. the proposals that interact are deferred (in their order) to the
+      next batch.
+    - random network i draws from its own numpy Generator, derived from the seed and i (SeedSequence spawn key),
+      so it is the same network regardless of the order / process in which the ensemble is generated.
+    - adaptive switch factor: the batches end at the switch factors, the mixing statistics are checked after every
+      len(edges) resolved proposals.
+    """
+
+    def __init__(self, network: Network, switch_factor: int, seed: int,
+                 incremental_census: Optional[IncrementalTriadicCensus] = None, batch_size: Optional[int] = None,
+                 mixing_window: Optional[int] = None, mixing_tolerance: float = 0.01):
+        super().__init__(network, switch_factor, incremental_census, mixing_window, mixing_tolerance)
+        self.seed = seed
+        # a proposal shares an edge position with an earlier one in about 4 * batch_size / edges of the batches
+        self.batch_size = batch_size if batch_size is not None else max(64, len(self.src) // 16)
+
+    def generate_network(self, index: int) -> DiGraph:
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(index,)))
+        return self._markov_chain(rng)
+
+    def _markov_chain(self, rng: np.random.Generator) -> DiGraph:
+        src, dst = self.src.copy(), self.dst.copy()
+        edge_keys = set((src * self.n + dst).tolist())
+        census = self.incremental_census.copy() if self.incremental_census is not None else None
+        mixing = self._get_mixing_diagnostics(edge_keys, census)
+        chain_start = (self.success_switch, self.iterations)
+        m = len(src)
+
+        pending_i, pending_j = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        remaining = self.markov_chain_num_iterations
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            if mixing is not None:
+                # a batch does not cross the end of a switch factor
+                size = min(size, remaining % m or m)
+            if len(pending_i) < size:
+                i = rng.integers(m, size=size - len(pending_i))
+                j = rng.integers(m - 1, size=size - len(pending_i))
+                j += j >= i
+                pending_i, pending_j = np.concatenate([pending_i, i]), np.concatenate([pending_j, j])
+
+            i, j = pending_i[:size], pending_j[:size]
+            valid, deferred = self.__check_proposals(src, dst, edge_keys, i, j)
+            pending_i = np.concatenate([i[deferred], pending_i[size:]])
+            pending_j = np.concatenate([j[deferred], pending_j[size:]])
+            remaining -= size - deferred.sum()
+            self.iterations += int(size - deferred.sum())
+            i, j = i[valid & ~deferred], j[valid & ~deferred]
+
+            self.success_switch += len(i)
+            x1, y1, x2, y2 = src[i].tolist(), dst[i].tolist(), src[j].tolist(), dst[j].tolist()
+            if census is not None:
+                for switch in zip(x1, y1, x2, y2):
+                    census.switch(*switch)
+            n = self.n
+            if mixing is not None:
+                # the mutual edges statistic depends on the order of the switches
+                for switch in zip(x1, y1, x2, y2):
+                    mixing.switch(edge_keys, *switch)
+                    edge_keys.difference_update([switch[0] * n + switch[1], switch[2] * n + switch[3]])
+                    edge_keys.update([switch[0] * n + switch[3], switch[2] * n + switch[1]])
+            else:
+                edge_keys.difference_update([s * n + t for s, t in zip(x1 + x2, y1 + y2)])
+                edge_keys.update([s * n + t for s, t in zip(x1 + x2, y2 + y1)])
+            dst[i], dst[j] = dst[j], dst[i]
+
+            if mixing is not None and remaining % m == 0 and mixing.checkpoint():
+                break
+
+        self._end_chain(census, mixing, chain_start)
+        return self._to_graph(src.tolist(), dst.tolist())
+
+    def __check_proposals(self, src: np.ndarray, dst: np.ndarray, edge_keys: set[int], i: np.ndarray,
+                          j: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the valid proposals mask (w.r.t the edges at the start of the batch), and the deferred proposals
+        mask: the ones that interact with an earlier proposal in the batch
+        """
+        n, size = self.n, len(i)
+        x1, y1, x2, y2 = src[i], dst[i], src[j], dst[j]
+        new_keys = np.concatenate([x1 * n + y2, x2 * n + y1])
+        old_keys = np.concatenate([x1 * n + y1, x2 * n + y2])
+        has_new_edge = np.fromiter((key in edge_keys for key in new_keys.tolist()), dtype=bool, count=2 * size)
+
+        valid = (x1 != x2) & (y1 != y2) & (x1 != y2) & (x2 != y1) & ~has_new_edge.reshape(2, -1).any(axis=0)
+        valid &= self._allow_switches(x1, y1, x2, y2)
+        proposals = np.arange(size)
+
+        # the earliest proposal that uses each edge position / removes or adds each edge key / adds each edge key
+        first_position_owners = get_first_owners(np.concatenate([i, j]), np.tile(proposals, 2),
+                                                 np.concatenate([i, j]), size)
+        first_key_owners = get_first_owners(np.concatenate([old_keys, new_keys]), np.tile(proposals, 4), new_keys,
+                                            size)
+        first_new_key_owners = get_first_owners(new_keys, np.tile(proposals, 2), old_keys, size)
+        owners = np.tile(proposals, 2)
+        shares_position = (first_position_owners < owners).reshape(2, -1).any(axis=0)
+        interacts = (first_key_owners < owners) | (first_new_key_owners < owners)
+
+        # the targets of a proposal that shares a position with an earlier one are not known before it is applied:
+        # it may add / remove any edge of its sources
+        sources = np.concatenate([x1, x2])
+        uncertain = np.tile(shares_position, 2)
+        first_source_owners = get_first_owners(sources[uncertain], owners[uncertain], sources, size)
+        interacts |= first_source_owners < owners
+        return valid, shares_position | interacts.reshape(2, -1).any(axis=0)
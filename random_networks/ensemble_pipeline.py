@@ -0,0 +1,76 @@
+import random
+from collections import deque
+from multiprocessing import Pool
+from typing import Callable, Iterator, Optional, Union
+
+from networkx import DiGraph
+
+from random_networks.network_randomizer_abc import NetworkRandomizer
+from utils.types import RandomNetworkSearchResult
+
+# search(random network, its k=3 fsl kept by the randomizer or None) -> its reduced result
+RandomNetworkSearch = Callable[[DiGraph, Optional[dict[int, int]]], RandomNetworkSearchResult]
+
+# the randomizer and the search of a worker process, set once by the pool initializer
+_worker_randomizer: Optional[NetworkRandomizer] = None
+_worker_search: Optional[RandomNetworkSearch] = None
+
+
+def _init_worker(randomizer: NetworkRandomizer, search: RandomNetworkSearch):
+    global _worker_randomizer, _worker_search
+    _worker_randomizer, _worker_search = randomizer, search
+
+
+def _worker_task(index: int, seed: Union[int, str]) -> RandomNetworkSearchResult:
+    return search_random_network(_worker_randomizer, _worker_search, index, seed)
+
+
+def search_random_network(randomizer: NetworkRandomizer, search: RandomNetworkSearch, index: int,
+                          seed: Union[int, str]) -> RandomNetworkSearchResult:
+    """
+    generate the random network of the given index and search it. the random module is seeded by the seed and the
+    index: the network does not depend on the process / order in which the ensemble is generated
+    """
+    random.seed(f'{seed}:{index}')
+    random_network = randomizer.generate_network(index)
+    census_fsl = randomizer.random_network_fsls.pop() if randomizer.random_network_fsls else None
+    result = search(random_network, census_fsl)
+    result.edges = random_network.number_of_edges()
+    if randomizer.random_network_switch_factors:
+        result.switch_factor = randomizer.random_network_switch_factors.pop()
+    if randomizer.random_network_switches:
+        result.success_switches, result.iterations = randomizer.random_network_switches.pop()
+    return result
+
+
+class EnsemblePipeline:
+    """
+    the random networks ensemble stage: each task generates a single random network and searches it, only its reduced
+    result (counts) is kept - the memory does not grow with the amount of random networks.
+    with workers > 1 the tasks run on a process pool (each worker holds its own copy of the randomizer), at most
+    max_pending tasks are in flight, and the results are yielded in the order of the networks.
+    """
+
+    def __init__(self, randomizer: NetworkRandomizer, search: RandomNetworkSearch, seed: Union[int, str],
+                 workers: int = 1):
+        self.randomizer = randomizer
+        self.search = search
+        self.seed = seed
+        self.workers = workers
+        self.max_pending = 2 * workers
+
+    def iter_results(self, amount: int) -> Iterator[RandomNetworkSearchResult]:
+        if self.workers <= 1:
+            for index in range(amount):
+                yield search_random_network(self.randomizer, self.search, index, self.seed)
+            return
+
+        with Pool(processes=self.workers, initializer=_init_worker,
+                  initargs=(self.randomizer, self.search)) as pool:
+            pending = deque()
+            for index in range(amount):
+                if len(pending) == self.max_pending:
+                    yield pending.popleft().get()
+                pending.append(pool.apply_async(_worker_task, (index, self.seed)))
+            while pending:
+                yield pending.popleft().get()
@@ -37,11 +37,14 @@ class ErdosRenyiForcedEdges(NetworkRandomizer):
     def generate(self, amount: int) -> list[DiGraph]:
         self.logger.info(f'probability for edge creation: {round(self.p, 4)}')
 
-        random_networks = [self.generate_foo() for _ in tqdm(range(amount))]
+        random_networks = [self.generate_network(i) for i in tqdm(range(amount))]
         self._log_avg_num_of_generated_edges(random_networks, amount)
 
         return random_networks
 
+    def generate_network(self, index: int) -> DiGraph:
+        return self.generate_foo()
+
     def __generate(self) -> DiGraph:
         return nx.erdos_renyi_graph(n=self.n, p=self.p, directed=True)
 
@@ -1,10 +1,14 @@
 import random
+from typing import Optional
 
+import numpy as np
 from networkx import DiGraph
 from tqdm import tqdm
 
 from networks.network import Network
+from random_networks.mixing_diagnostics import MixingDiagnostics
 from random_networks.network_randomizer_abc import NetworkRandomizer
+from subgraphs.incremental_triadic_census import IncrementalTriadicCensus
 
 
 class MarkovChainSwitching(NetworkRandomizer):
@@ -15,45 +19,63 @@ class MarkovChainSwitching(NetworkRandomizer):
         * Degree constrain is saved
         * Mutual / Double edges (number) is NOT saved
         * polarity ratio is saved
+    the edges are kept in int arrays (src, dst: node indices of the sorted nodes) with a set of their keys
+    (src * n + dst) for the membership tests, so a step is O(1). a switch swaps the dst of two edges in place, the
+    polarity (int8 codes) stays with the src. the DiGraph is built at the end of each chain.
+    the k=3 census of the random networks can be kept up to date along the chains (incremental_census), instead of
+    a census per random network: see random_network_fsls.
+    adaptive switch factor (mixing_window): each chain stops once its mixing statistics were stable for the window
+    (see MixingDiagnostics), the switch factor is the maximum. see random_network_switch_factors.
     """
 
-    def __init__(self, network: Network, switch_factor: int):
+    def __init__(self, network: Network, switch_factor: int,
+                 incremental_census: Optional[IncrementalTriadicCensus] = None, mixing_window: Optional[int] = None,
+                 mixing_tolerance: float = 0.01):
         super().__init__(network)
 
         self.switch_factor = switch_factor
         self.markov_chain_num_iterations = network.graph.number_of_edges() * switch_factor
         self.success_switch = 0
-
-        self.switch_foo = self.__switch_with_polarity if network.use_polarity else self.__switch
+        self.iterations = 0
+        self.mixing_window = mixing_window
+        self.mixing_tolerance = mixing_tolerance
+
+        self.nodes: list = sorted(network.graph.nodes)
+        self.n = len(self.nodes)
+        node_index = {node: i for i, node in enumerate(self.nodes)}
+        edges = list(network.graph.edges(data='polarity'))
+        self.src = np.array([node_index[s] for s, _, _ in edges], dtype=np.int64)
+        self.dst = np.array([node_index[t] for _, t, _ in edges], dtype=np.int64)
+        self.polarity_values: list = []
+        self.polarity: Optional[np.ndarray] = None
+        if network.use_polarity:
+            self.polarity_values = sorted({polarity for _, _, polarity in edges})
+            polarity_codes = {polarity: code for code, polarity in enumerate(self.polarity_values)}
+            self.polarity = np.array([polarity_codes[polarity] for _, _, polarity in edges], dtype=np.int8)
+
+        # the census of the real network, copied at the start of each chain
+        self.incremental_census = incremental_census
 
     def generate(self, amount: int) -> list[DiGraph]:
         self.logger.info(f'Markov chain iterations: {self.markov_chain_num_iterations}')
-        random_networks = [self._markov_chain() for _ in tqdm(range(amount))]
+        random_networks = [self.generate_network(i) for i in tqdm(range(amount))]
 
-        self.logger.info(f'Markov chain success ratio: '
-                         f'{round(self.success_switch / (self.markov_chain_num_iterations * amount), 5)}')
+        self.logger.info(f'Markov chain success ratio: {round(self.success_switch / self.iterations, 5)}')
+        if self.random_network_switch_factors:
+            self.logger.info(f'Markov chain effective switch factor: '
+                             f'{round(float(np.mean(self.random_network_switch_factors)), 2)}')
         self._log_avg_num_of_generated_edges(random_networks, amount)
 
         return random_networks
 
-    @staticmethod
-    def __switch(network: DiGraph, x1: int, y1: int, x2: int, y2: int):
-        network.remove_edge(x1, y1)
-        network.remove_edge(x2, y2)
-        network.add_edge(x1, y2)
-        network.add_edge(x2, y1)
-
-    @staticmethod
-    def __switch_with_polarity(network: DiGraph, x1: int, y1: int, x2: int, y2: int):
-        e1_polarity = network.edges[x1, y1]['polarity']
-        e2_polarity = network.edges[x2, y2]['polarity']
-        network.remove_edge(x1, y1)
-        network.remove_edge(x2, y2)
-        network.add_edge(x1, y2, polarity=e1_polarity)
-        network.add_edge(x2, y1, polarity=e2_polarity)
-
-    @staticmethod
-    def switching_constrain(graph: DiGraph, x1: int, y1: int, x2: int, y2: int) -> bool:
+    def generate_network(self, index: int) -> DiGraph:
+        return self._markov_chain()
+
+    def _allow_switch(self, edge_keys: set[int], x1: int, y1: int, x2: int, y2: int) -> bool:
+        """
+        :param edge_keys: the keys (src * n + dst) of the current edges
+        :param x1, y1, x2, y2: node indices of the switch: x1 -> y1, x2 -> y2 are replaced by x1 -> y2, x2 -> y1
+        """
         # These are the unnecessary
         if x1 == x2 or y1 == y2:
             return False
@@ -63,23 +85,81 @@ class MarkovChainSwitching(NetworkRandomizer):
             return False
 
         # This saves the degree
-        if graph.has_edge(x1, y2) or graph.has_edge(x2, y1):
+        if x1 * self.n + y2 in edge_keys or x2 * self.n + y1 in edge_keys:
             return False
 
         return True
 
-    def _markov_chain(self) -> DiGraph:
-        graph: DiGraph = self.network.graph.copy()
-
-        for _ in range(self.markov_chain_num_iterations):
-            e1, e2 = random.sample(list(graph.edges), 2)
-            x1, y1 = e1
-            x2, y2 = e2
-
-            if not self.switching_constrain(graph, x1, y1, x2, y2):
-                continue
-
-            self.success_switch += 1
-            self.switch_foo(graph, x1, y1, x2, y2)
+    def _allow_switches(self, x1: np.ndarray, y1: np.ndarray, x2: np.ndarray, y2: np.ndarray) -> np.ndarray:
+        """
+        the constraints of _allow_switch (on top of the validity of the switches), vectorized for batched proposals
+        """
+        return np.ones(len(x1), dtype=bool)
 
+    def _markov_chain(self) -> DiGraph:
+        # python lists: O(1) item access without numpy scalars overhead
+        src, dst = self.src.tolist(), self.dst.tolist()
+        edge_keys = set((self.src * self.n + self.dst).tolist())
+        census = self.incremental_census.copy() if self.incremental_census is not None else None
+        mixing = self._get_mixing_diagnostics(edge_keys, census)
+        chain_start = (self.success_switch, self.iterations)
+        edge_positions = range(len(src))
+        n = self.n
+
+        # a switch factor (len(src) iterations) at a time: the mixing statistics are checked between them
+        for switch_factor in range(1, self.switch_factor + 1):
+            for _ in edge_positions:
+                i, j = random.sample(edge_positions, 2)
+                x1, y1, x2, y2 = src[i], dst[i], src[j], dst[j]
+
+                if not self._allow_switch(edge_keys, x1, y1, x2, y2):
+                    continue
+
+                self.success_switch += 1
+                if census is not None:
+                    census.switch(x1, y1, x2, y2)
+                if mixing is not None:
+                    mixing.switch(edge_keys, x1, y1, x2, y2)
+                edge_keys.remove(x1 * n + y1)
+                edge_keys.remove(x2 * n + y2)
+                edge_keys.add(x1 * n + y2)
+                edge_keys.add(x2 * n + y1)
+                dst[i], dst[j] = y2, y1
+
+            self.iterations += len(src)
+            if mixing is not None and mixing.checkpoint():
+                break
+
+        self._end_chain(census, mixing, chain_start)
+        return self._to_graph(src, dst)
+
+    def _get_mixing_diagnostics(self, edge_keys: set[int],
+                                census: Optional[IncrementalTriadicCensus]) -> Optional[MixingDiagnostics]:
+        if self.mixing_window is None:
+            return None
+        return MixingDiagnostics(edge_keys, self.n, self.mixing_window, self.mixing_tolerance, census)
+
+    def _end_chain(self, census: Optional[IncrementalTriadicCensus], mixing: Optional[MixingDiagnostics],
+                   chain_start: tuple[int, int]):
+        """
+        :param chain_start: the (success_switch, iterations) counters at the start of the chain
+        """
+        self.random_network_switches.append((self.success_switch - chain_start[0],
+                                             self.iterations - chain_start[1]))
+        if census is not None:
+            self.random_network_fsls.append(census.get_fsl())
+        if mixing is not None:
+            self.random_network_switch_factors.append(len(mixing.history))
+            self.logger.debug(f'Markov chain effective switch factor: {len(mixing.history)}')
+
+    def _to_graph(self, src: list[int], dst: list[int]) -> DiGraph:
+        graph = DiGraph(self.network.graph.graph)
+        graph.add_nodes_from(self.network.graph.nodes(data=True))
+        nodes = self.nodes
+        if self.polarity is None:
+            graph.add_edges_from((nodes[s], nodes[t]) for s, t in zip(src, dst))
+        else:
+            polarity_values = self.polarity_values
+            graph.add_edges_from((nodes[s], nodes[t], {'polarity': polarity_values[p]})
+                                 for s, t, p in zip(src, dst, self.polarity.tolist()))
         return graph
@@ -0,0 +1,76 @@
+from typing import Optional
+
+import numpy as np
+
+from subgraphs.incremental_triadic_census import IncrementalTriadicCensus
+
+
+class MixingDiagnostics:
+    """
+    cheap running statistics of a markov chain, to tell when it has mixed (instead of a fixed switch factor):
+    - the fraction of the original edges that are still present
+    - the fraction of mutual edges (u -> v and v -> u, without self loops)
+    - the fraction of each triad class, if the chain keeps an incremental census
+    the statistics are kept up to date per switch in O(1), and recorded at checkpoints (one per switch factor).
+    the chain has mixed when the mean of each statistic over the last window checkpoints is within the tolerance of
+    its mean over the window before them.
+    """
+
+    def __init__(self, edge_keys: set[int], n: int, window: int, tolerance: float,
+                 census: Optional[IncrementalTriadicCensus] = None):
+        self.original_edge_keys = frozenset(edge_keys)
+        self.n = n
+        self.window = window
+        self.tolerance = tolerance
+        self.census = census
+        self.edges = len(edge_keys)
+
+        self.original_edges = self.edges
+        self.mutual_edges = sum(1 for key in edge_keys if self.__reverse(key) in edge_keys and self.__reverse(key) != key)
+        self.triad_classes: list[int] = sorted(census.fsl) if census is not None else []
+        self.history: list[np.ndarray] = []
+
+    def __reverse(self, key: int) -> int:
+        s, t = divmod(key, self.n)
+        return t * self.n + s
+
+    def switch(self, edge_keys: set[int], x1: int, y1: int, x2: int, y2: int):
+        """
+        update the statistics for the switch x1 -> y1, x2 -> y2 replaced by x1 -> y2, x2 -> y1
+        :param edge_keys: the keys of the edges before the switch
+        """
+        n = self.n
+        removed, added = [x1 * n + y1, x2 * n + y2], [x1 * n + y2, x2 * n + y1]
+        self.original_edges += sum(key in self.original_edge_keys for key in added) - \
+            sum(key in self.original_edge_keys for key in removed)
+
+        # the edges are removed, then added one by one: a mutual pair counts its two edges
+        present = set()
+        for key in removed:
+            reverse = self.__reverse(key)
+            if reverse != key and reverse in edge_keys and reverse not in present:
+                self.mutual_edges -= 2
+            present.add(key)
+        present = set()
+        for key in added:
+            reverse = self.__reverse(key)
+            if reverse != key and ((reverse in edge_keys and reverse not in removed) or reverse in present):
+                self.mutual_edges += 2
+            present.add(key)
+
+    def checkpoint(self) -> bool:
+        """
+        record the statistics
+        :return: whether the chain has mixed
+        """
+        statistics = [self.original_edges / self.edges, self.mutual_edges / self.edges]
+        if self.census is not None:
+            triads = sum(self.census.fsl.values()) or 1
+            statistics.extend(self.census.fsl.get(sub_id, 0) / triads for sub_id in self.triad_classes)
+        self.history.append(np.array(statistics))
+
+        if len(self.history) < 2 * self.window:
+            return False
+        last = np.mean(self.history[-self.window:], axis=0)
+        previous = np.mean(self.history[-2 * self.window:-self.window], axis=0)
+        return bool(np.all(np.abs(last - previous) <= self.tolerance))
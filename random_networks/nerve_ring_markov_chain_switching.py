@@ -1,14 +1,32 @@
-import random
+import os
+from typing import Optional
 
+import numpy as np
 import pandas as pd
-from networkx import DiGraph
 
 from networks.network import Network
 from random_networks.markov_chain_switching import MarkovChainSwitching
-from collections import defaultdict
+from subgraphs.incremental_triadic_census import IncrementalTriadicCensus
 
 from utils.neurons import nerve_ring_neurons
 
+NERVE_RING_DISTANCES_FILE = 'random_networks/nerve_ring_distances.xlsx'
+
+
+def load_nerve_ring_distances(file_path: str = NERVE_RING_DISTANCES_FILE) -> pd.DataFrame:
+    """
+    the nerve ring distances (rows and columns in the order of nerve_ring_neurons). the xlsx is parsed once and cached
+    as a .npy next to it, the cache is rebuilt when the xlsx is newer
+    """
+    cache_path = os.path.splitext(file_path)[0] + '.npy'
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        distances = np.load(cache_path)
+    else:
+        xls = pd.ExcelFile(file_path)
+        distances = xls.parse('distance', header=None).to_numpy(dtype=np.float64)
+        np.save(cache_path, distances)
+    return pd.DataFrame(distances, index=nerve_ring_neurons, columns=nerve_ring_neurons)
+
 
 class NerveRingMarkovChainSwitching(MarkovChainSwitching):
     """
@@ -17,54 +35,52 @@ class NerveRingMarkovChainSwitching(MarkovChainSwitching):
     "The synaptic organization in the Caenorhabditis elegans
     neural network suggests significant local compartmentalized
     computations"
+    a switch is allowed only if its new edges connect neurons closer than the distance threshold. any distance
+    matrix can be given (labeled by the neuron names), a neuron that is not in it is not constrained.
+    the constraint is compiled to a boolean matrix by node index (of the edge index): a check is an array lookup.
     """
 
-    def init_nerve_ring_allow_list(self):
-        xls = pd.ExcelFile('random_networks/nerve_ring_distances.xlsx')
-        df = xls.parse('distance', header=None)
-
-        for i, neuron in enumerate(nerve_ring_neurons):
-            for j in range(len(nerve_ring_neurons)):
-                if i == j:
-                    continue
-                dist = df.iloc[i][j]
-                if dist < self.DISTANCE_TH:
-                    self.nerve_ring_allow[neuron].add(nerve_ring_neurons[j])
+    def __init__(self, network: Network, switch_factor: int,
+                 incremental_census: Optional[IncrementalTriadicCensus] = None, mixing_window: Optional[int] = None,
+                 mixing_tolerance: float = 0.01, distances: Optional[pd.DataFrame] = None,
+                 distance_threshold: float = 0.1):
+        super().__init__(network, switch_factor, incremental_census, mixing_window, mixing_tolerance)
 
-    def __init__(self, network: Network, switch_factor: int):
-        super().__init__(network, switch_factor)
-
-        self.DISTANCE_TH = 0.1
+        self.DISTANCE_TH = distance_threshold
         self.neuron_names = self.network.neuron_names
-        self.nerve_ring_allow = defaultdict(set)
-        self.init_nerve_ring_allow_list()
-
-    def nerve_ring_constrain(self, x1: str, y1: str, x2: str, y2: str) -> bool:
-        # in case x is not in the nerve ring (not in the dict), we allow the switch.
-        if y2 not in self.nerve_ring_allow.get(x1, {y2}):
+        self.distances = distances if distances is not None else load_nerve_ring_distances()
+        # allow[s, t]: the edge s -> t may be created (node indices)
+        self.allow = self.__get_allow_matrix()
+
+    def __get_allow_matrix(self) -> np.ndarray:
+        # the nodes of a network without neuron names are looked up by their ids
+        node_names = [self.neuron_names[node] for node in self.nodes] if self.neuron_names else self.nodes
+        positions = pd.Index(self.distances.index).get_indexer(node_names)
+        in_matrix = positions >= 0
+
+        allow = np.ones((self.n, self.n), dtype=bool)
+        distances = self.distances.to_numpy(dtype=np.float64)
+        close = distances < self.DISTANCE_TH
+        np.fill_diagonal(close, False)
+        allow[in_matrix] = False
+        allow[np.ix_(in_matrix, in_matrix)] = close[np.ix_(positions[in_matrix], positions[in_matrix])]
+        return allow
+
+    @property
+    def nerve_ring_allow(self) -> dict[str, set[str]]:
+        """
+        neuron name -> the names of the neurons it may connect to (of the distance matrix)
+        """
+        names = list(self.distances.index)
+        close = self.distances.to_numpy(dtype=np.float64) < self.DISTANCE_TH
+        np.fill_diagonal(close, False)
+        return {names[i]: {names[j] for j in np.flatnonzero(row)} for i, row in enumerate(close) if row.any()}
+
+    def _allow_switch(self, edge_keys: set[int], x1: int, y1: int, x2: int, y2: int) -> bool:
+        if not super()._allow_switch(edge_keys, x1, y1, x2, y2):
             return False
 
-        if y1 not in self.nerve_ring_allow.get(x2, {y1}):
-            return False
-
-        return True
-
-    def _markov_chain(self) -> DiGraph:
-        graph: DiGraph = self.network.graph.copy()
-
-        for _ in range(self.markov_chain_num_iterations):
-            e1, e2 = random.sample(list(graph.edges), 2)
-            x1, y1 = e1
-            x2, y2 = e2
-
-            if not self.switching_constrain(graph, x1, y1, x2, y2):
-                continue
-
-            if not self.nerve_ring_constrain(self.neuron_names[x1], self.neuron_names[y1],
-                                             self.neuron_names[x2], self.neuron_names[y2]):
-                continue
-
-            self.success_switch += 1
-            self.switch_foo(graph, x1, y1, x2, y2)
+        return self.allow[x1, y2] and self.allow[x2, y1]
 
-        return graph
+    def _allow_switches(self, x1: np.ndarray, y1: np.ndarray, x2: np.ndarray, y2: np.ndarray) -> np.ndarray:
+        return self.allow[x1, y2] & self.allow[x2, y1]
@@ -12,11 +12,25 @@ class NetworkRandomizer(metaclass=ABCMeta):
     def __init__(self, network: Network):
         self.network = network
         self.logger = Logger()
+        # the k=3 fsl of each generated random network, by the randomizers that keep the census along the generation
+        self.random_network_fsls: list[dict[int, int]] = []
+        # the effective switch factor of each generated random network, by the adaptive markov chain randomizers
+        self.random_network_switch_factors: list[int] = []
+        # (successful switches, iterations) of the chain of each generated random network, by the markov chain
+        # randomizers
+        self.random_network_switches: list[tuple[int, int]] = []
 
     @abstractmethod
     def generate(self, amount: int) -> list[DiGraph]:
         pass
 
+    @abstractmethod
+    def generate_network(self, index: int) -> DiGraph:
+        """
+        :param index: the index of the random network in the ensemble (used by the seeded randomizers)
+        """
+        pass
+
     def _log_avg_num_of_generated_edges(self, random_networks: list[DiGraph], amount: int):
         avg_edges = sum([len(rand_network.edges) for rand_network in random_networks]) / amount
         self.logger.info(f'average # edges of all random networks: {round(avg_edges, 3)}')
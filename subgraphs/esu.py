@@ -0,0 +1,106 @@
+import random
+from typing import Iterable, Iterator, Optional
+
+from networkx import DiGraph
+
+from networks.compact_graph import CompactGraph
+from subgraphs.sub_graphs_abc import SubGraphsABC
+
+from utils.types import SubGraphSearchResult
+
+
+class ESU(SubGraphsABC):
+    """
+    ESU (Enumerate SUbgraphs)
+    S. Wernicke, “Efficient detection of network motifs,” 2006
+    an iterative version: an explicit stack of extension arrays (one per depth) and exclusive neighbourhood marking.
+    each connected k nodes set is visited exactly once, thus no dedup set is needed, and the sets are
+    generated in a deterministic order (root by root).
+    memory: O(k * max degree) for the stack and O(n) for the marks.
+    """
+
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, compact_graph: Optional[CompactGraph] = None):
+        super().__init__(network, isomorphic_mapping, compact_graph)
+
+    def iter_sub_graphs(self, k: int, roots: Optional[Iterable[int]] = None,
+                        probabilities: Optional[list[float]] = None) -> Iterator[tuple[int, ...]]:
+        """
+        :param k: motif size
+        :param roots: the root nodes (compact graph indices) to enumerate from, default: all the nodes
+        :param probabilities: (RAND-ESU) probabilities[d] is the probability to continue into a tree node of depth d
+        (a sub graph of d+1 nodes), default: a full enumeration
+        :return: generator of the sorted node indices of each connected k nodes set, which its minimal node is a root
+        """
+        und_adj = self.graph.und_adj
+        if roots is None:
+            roots = range(self.graph.n)
+        sample = probabilities is not None
+        if k == 1:
+            for v in roots:
+                if not sample or random.random() < probabilities[0]:
+                    yield (v,)
+            return
+
+        max_degree = max((len(neighbors) for neighbors in und_adj), default=0)
+        # extension[d] holds the extension of the sub graph at depth d (sub graph of d+1 nodes)
+        extension = [[0] * (k * max_degree + 1) for _ in range(k)]
+        extension_len = [0] * k
+        sub_graph = [0] * k
+        # mark[u] is the depth in which u first joined the sub graph or its neighbourhood, -1 otherwise
+        mark = [-1] * self.graph.n
+        marked = [[] for _ in range(k)]
+
+        for v in roots:
+            if sample and random.random() >= probabilities[0]:
+                continue
+            sub_graph[0] = v
+            mark[v] = 0
+            marked[0].append(v)
+            size = 0
+            ext = extension[0]
+            for u in und_adj[v]:
+                mark[u] = 0
+                marked[0].append(u)
+                if u > v:
+                    ext[size] = u
+                    size += 1
+            extension_len[0] = size
+
+            d = 0
+            while d >= 0:
+                size = extension_len[d]
+                if size == 0:
+                    for u in marked[d]:
+                        mark[u] = -1
+                    marked[d].clear()
+                    d -= 1
+                    continue
+
+                size -= 1
+                extension_len[d] = size
+                w = extension[d][size]
+                if sample and random.random() >= probabilities[d + 1]:
+                    continue
+
+                if d + 2 == k:
+                    yield tuple(sorted(sub_graph[:d + 1] + [w]))
+                    continue
+
+                d += 1
+                sub_graph[d] = w
+                ext = extension[d]
+                ext[:size] = extension[d - 1][:size]
+                for u in und_adj[w]:
+                    if mark[u] == -1:
+                        mark[u] = d
+                        marked[d].append(u)
+                        if u > v:
+                            ext[size] = u
+                            size += 1
+                extension_len[d] = size
+
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
+        self._start_search(k, allow_self_loops, counts_only)
+        for nodes in self.iter_sub_graphs(k):
+            self._inc_count_w_canonical_label_induced(nodes)
+        return self._search_result()
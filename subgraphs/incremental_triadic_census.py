@@ -0,0 +1,219 @@
+import copy
+from collections import defaultdict
+
+import numpy as np
+from networkx import DiGraph
+
+from isomorphic.canonical_labeling import get_canonical_labeling
+from isomorphic.isomorphic import get_isomorphic_lookup
+from subgraphs.triadic_census import TriadicCensus
+from utils.sub_graphs import get_id_bit_table, get_self_loops_mask
+
+
+class IncrementalTriadicCensus:
+    """
+    the k=3 census of a network, kept up to date under the edge switches of the markov chain randomizer: the census
+    of a random network is ready when its chain ends, instead of a new census (enumeration) per random network.
+    a switch changes only the triads that contain both nodes (u, v) of a removed / added edge: the third nodes are
+    grouped by their 4 edges to u and v (a pattern), and each pattern moves its count from its class before the
+    switch to its class after it. only the neighbours of the lower degree node are visited one by one, the rest are
+    counted by set operations. the triads with two changed pairs or a self loop node are recounted one by one.
+    the triads are classified as in the (induced) enumeration algorithms: by the isomorphic mapping, or the canonical
+    labeling if not given. triads with self loops are not counted unless allow_self_loops is set.
+    """
+
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, allow_self_loops: bool):
+        self.nodes: list = sorted(network.nodes)
+        self.node_index: dict = {node: i for i, node in enumerate(self.nodes)}
+        self.successors: list[set[int]] = [set() for _ in self.nodes]
+        self.predecessors: list[set[int]] = [set() for _ in self.nodes]
+        for s, t in network.edges:
+            self.__add_edge(self.node_index[s], self.node_index[t])
+        self.self_loops: set[int] = {u for u in range(len(self.nodes)) if u in self.successors[u]}
+
+        # triad id -> its isomorphic representative, -1 for the triads that are not counted
+        self.lookup = self.__get_lookup(isomorphic_mapping, allow_self_loops)
+        self.lookup_values: list[int] = self.lookup.tolist()
+        self.table = get_id_bit_table(3)
+        self.pair_table = self.__get_pair_table()
+
+        self.fsl = defaultdict(int)
+        for nodes, sub_ids in TriadicCensus(network, isomorphic_mapping).iter_triads():
+            representatives = self.lookup[sub_ids]
+            unique_representatives, counts = np.unique(representatives[representatives >= 0], return_counts=True)
+            for representative, count in zip(unique_representatives.tolist(), counts.tolist()):
+                self.fsl[representative] += count
+
+    @staticmethod
+    def __get_lookup(isomorphic_mapping: dict, allow_self_loops: bool) -> np.ndarray:
+        if isomorphic_mapping:
+            lookup = get_isomorphic_lookup(isomorphic_mapping, 3).astype(np.int64)
+        else:
+            canonical_labeling = get_canonical_labeling(3)
+            lookup = np.array([canonical_labeling.get_canonical_id(sub_id) for sub_id in range(1 << 9)],
+                              dtype=np.int64)
+        if not allow_self_loops:
+            lookup[np.arange(1 << 9) & get_self_loops_mask(3) != 0] = -1
+        return lookup
+
+    def __get_pair_table(self) -> list[list[list[int]]]:
+        """
+        the class of a triad (u, v, w) by its parts: table[loops][uv][pattern] is its representative (-1 if it is
+        disconnected or not counted). loops: u -> u, v -> v bits. uv: u -> v, v -> u bits.
+        pattern: u -> w, w -> u, v -> w, w -> v bits (w has no self loop)
+        """
+        table = self.table
+        loop_bits = [table[0][0], table[1][1]]
+        uv_bits = [table[0][1], table[1][0]]
+        pattern_bits = [table[0][2], table[2][0], table[1][2], table[2][1]]
+
+        def get_id(bits: list[int], value: int) -> int:
+            return sum(bit for i, bit in enumerate(bits) if value >> i & 1)
+
+        pair_table = []
+        for loops in range(4):
+            pair_table.append([])
+            for uv in range(4):
+                classes = []
+                for pattern in range(16):
+                    # connected: u - v and at least one of u - w, v - w, or both u - w and v - w
+                    if (uv and pattern) or (pattern & 0b0011 and pattern & 0b1100):
+                        sub_id = get_id(loop_bits, loops) | get_id(uv_bits, uv) | get_id(pattern_bits, pattern)
+                        classes.append(self.lookup_values[sub_id])
+                    else:
+                        classes.append(-1)
+                pair_table[-1].append(classes)
+        return pair_table
+
+    def copy(self) -> 'IncrementalTriadicCensus':
+        """
+        :return: an independent census (e.g.: for a new markov chain), the lookup tables are shared
+        """
+        census = copy.copy(self)
+        census.successors = [set(successors) for successors in self.successors]
+        census.predecessors = [set(predecessors) for predecessors in self.predecessors]
+        census.self_loops = set(self.self_loops)
+        census.fsl = defaultdict(int, self.fsl)
+        return census
+
+    def get_fsl(self) -> dict[int, int]:
+        return {sub_id: count for sub_id, count in sorted(self.fsl.items()) if count}
+
+    def switch(self, x1: int, y1: int, x2: int, y2: int):
+        """
+        update the census for the switch: x1 -> y1, x2 -> y2 are replaced by x1 -> y2, x2 -> y1
+        (node indices of the sorted nodes, the switch is assumed to be valid)
+        """
+        endpoints = {x1, y1, x2, y2}
+        # (s, t, added): the changed edges
+        changes = [(x1, y1, False), (x2, y2, False), (x1, y2, True), (x2, y1, True)]
+
+        if x1 == y1 or x2 == y2:
+            # a self loop is switched: all the triads of its node are recounted
+            triads = self.__get_affected_triads([(s, t) for s, t, _ in changes], endpoints)
+        else:
+            special = endpoints | self.self_loops
+            triads = set()
+            for s, t, added in changes:
+                self.__move_pair_triads(s, t, added, special)
+                third_nodes = endpoints
+                if self.self_loops:
+                    third_nodes = third_nodes | ((self.__get_neighbours(s) | self.__get_neighbours(t)) & self.self_loops)
+                for w in third_nodes:
+                    if w != s and w != t:
+                        triads.add(tuple(sorted((s, t, w))))
+
+        self.__count(triads, -1)
+        self.__remove_edge(x1, y1)
+        self.__remove_edge(x2, y2)
+        self.__add_edge(x1, y2)
+        self.__add_edge(x2, y1)
+        self.__count(triads, 1)
+        for u in endpoints:
+            if u in self.successors[u]:
+                self.self_loops.add(u)
+            else:
+                self.self_loops.discard(u)
+
+    def __move_pair_triads(self, s: int, t: int, added: bool, special: set[int]):
+        """
+        move the triads (s, t, w) for w not in special from their class before the edge s -> t is added / removed,
+        to their class after it
+        """
+        successors, predecessors = self.successors, self.predecessors
+        u, v = (s, t) if len(successors[s]) + len(predecessors[s]) <= len(successors[t]) + len(predecessors[t]) \
+            else (t, s)
+        uv_before = (v in successors[u]) | (u in successors[v]) << 1
+        s_to_t = 1 if u == s else 2
+        uv_after = uv_before | s_to_t if added else uv_before & ~s_to_t
+        loops = (u in self.self_loops) | (v in self.self_loops) << 1
+        before, after = self.pair_table[loops][uv_before], self.pair_table[loops][uv_after]
+
+        # pattern -> the number of third nodes: the neighbours of u one by one, the rest of v's by set operations
+        counts = [0] * 16
+        u_out, u_in, v_out, v_in = successors[u], predecessors[u], successors[v], predecessors[v]
+        u_neighbours = u_out | u_in
+        for w in u_neighbours - special:
+            counts[(w in u_out) | (w in u_in) << 1 | (w in v_out) << 2 | (w in v_in) << 3] += 1
+        excluded = u_neighbours | special
+        v_out, v_in = v_out - excluded, v_in - excluded
+        mutual = len(v_out & v_in)
+        counts[0b0100] += len(v_out) - mutual
+        counts[0b1000] += len(v_in) - mutual
+        counts[0b1100] += mutual
+
+        for pattern, count in enumerate(counts):
+            if count and before[pattern] != after[pattern]:
+                if before[pattern] >= 0:
+                    self.fsl[before[pattern]] -= count
+                if after[pattern] >= 0:
+                    self.fsl[after[pattern]] += count
+
+    def __add_edge(self, s: int, t: int):
+        self.successors[s].add(t)
+        self.predecessors[t].add(s)
+
+    def __remove_edge(self, s: int, t: int):
+        self.successors[s].discard(t)
+        self.predecessors[t].discard(s)
+
+    def __get_neighbours(self, u: int) -> set[int]:
+        return (self.successors[u] | self.predecessors[u]) - {u}
+
+    def __get_affected_triads(self, pairs: list[tuple[int, int]], endpoints: set[int]) -> set[tuple[int, ...]]:
+        """
+        the triads that contain both nodes of a changed pair and are connected before or after the switch.
+        only the endpoints' adjacency is changed: their new neighbours are endpoints
+        """
+        triads = set()
+        for u, v in pairs:
+            if u != v:
+                for w in self.__get_neighbours(u) | self.__get_neighbours(v) | endpoints:
+                    if w != u and w != v:
+                        triads.add(tuple(sorted((u, v, w))))
+                continue
+
+            # a self loop: all the triads of u
+            for a in self.__get_neighbours(u) | endpoints:
+                if a == u:
+                    continue
+                for b in self.__get_neighbours(u) | self.__get_neighbours(a) | endpoints:
+                    if b != u and b != a:
+                        triads.add(tuple(sorted((u, a, b))))
+        return triads
+
+    def __count(self, triads: set[tuple[int, ...]], sign: int):
+        successors, table, lookup = self.successors, self.table, self.lookup_values
+        for triad in triads:
+            sub_id = 0
+            for i, u in enumerate(triad):
+                for j, v in enumerate(triad):
+                    if v in successors[u]:
+                        sub_id |= table[i][j]
+            # connected: at least two of the three pairs are adjacent
+            pairs = (sub_id & 0b000001010 != 0) + (sub_id & 0b001000100 != 0) + (sub_id & 0b010100000 != 0)
+            if pairs < 2:
+                continue
+            representative = lookup[sub_id]
+            if representative >= 0:
+                self.fsl[representative] += sign
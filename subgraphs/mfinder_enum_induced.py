@@ -1,12 +1,9 @@
-from functools import cache
+from typing import Optional
 
 from networkx import DiGraph
 
+from networks.compact_graph import CompactGraph
 from subgraphs.sub_graphs_abc import SubGraphsABC
-import networkx as nx
-
-from utils.sub_graphs import graph_to_hashed_graph
-from collections import defaultdict
 
 from utils.types import SubGraphSearchResult
 
@@ -17,55 +14,52 @@ class MFinderInduced(SubGraphsABC):
     paper:  R. Milo, S. Shen-Orr, S. Itzkovitz, N. Kashtan,D. Chklovskii, and U. Alon, “Network motifs: simple
             building blocks of complex networks.” Science, vol. 298, no. 5594, pp. 824–827, October 2002.
     pseudocode: Ribeiro, Pedro and Silva, Fernando and Kaiser, Marcus: "Strategies for Network Motifs Discovery"
+    the visited states are keyed by their sorted node indices tuple, and are kept for a single search only.
     """
 
-    def __init__(self, network: DiGraph, isomorphic_mapping: dict):
-        super().__init__(network, isomorphic_mapping)
-        self.unique = set()  # unique sub graphs visited
-        self.hash_ = set()  # hash for trimming during the backtracking
-
-    def __is_unique(self, sub_graph: DiGraph) -> bool:
-        return graph_to_hashed_graph(sub_graph) not in self.unique
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, memo_size: Optional[int] = None,
+                 compact_graph: Optional[CompactGraph] = None):
+        """
+        :param memo_size: optional bound on the number of partial sub graphs memoized for trimming during
+        the backtracking. once reached, new partial sub graphs are not memoized (slower, same result)
+        """
+        super().__init__(network, isomorphic_mapping, compact_graph)
+        self.memo_size = memo_size
+        self.unique: set[tuple] = set()  # unique sub graphs (of k nodes) visited
+        self.hash_: set[tuple] = set()  # partial sub graphs visited, for trimming during the backtracking
 
-    def __find_sub_graphs_new_edge(self, sub_graph: frozenset, k: int):
-        if k in sub_graph:
+    def __find_sub_graphs(self, sub_graph: tuple):
+        """
+        :param sub_graph: sorted node indices
+        """
+        if len(sub_graph) > self.k:
             return
-        new_sub_graph = sub_graph.union({k})
-        if new_sub_graph in self.hash_:
+        if len(sub_graph) == self.k:
+            if sub_graph not in self.unique:
+                self.unique.add(sub_graph)
+                self._inc_count_w_canonical_label_induced(sub_graph)
             return
-        self.__find_sub_graphs(new_sub_graph)
 
-    @cache
-    def __find_sub_graphs(self, sub_graph: frozenset):
-        graph = nx.induced_subgraph(self.network, list(sub_graph))
-        if len(graph) > self.k:
+        if sub_graph in self.hash_:
             return
-        if len(graph) == self.k and self.__is_unique(graph):
-            self.unique.add(graph_to_hashed_graph(graph))
-            self._inc_count_w_canonical_label(graph)
-            if self.k > 2:
-                return
-
-        self.hash_.add(sub_graph)
-        for i in list(graph.nodes):
-            for k in list(self.network.adj[i]):
-                self.__find_sub_graphs_new_edge(sub_graph, k)
+        if self.memo_size is None or len(self.hash_) < self.memo_size:
+            self.hash_.add(sub_graph)
 
-            in_edges = [u for u, v in self.network.in_edges(nbunch=i)]
-            for k in in_edges:
-                self.__find_sub_graphs_new_edge(sub_graph, k)
+        for i in sub_graph:
+            for k in self.graph.und_adj[i]:
+                if k not in sub_graph:
+                    self.__find_sub_graphs(tuple(sorted((*sub_graph, k))))
 
-    def search_sub_graphs(self, k: int, allow_self_loops: bool) -> SubGraphSearchResult:
-        self.fsl = defaultdict(int)
-        self.fsl_fully_mapped = defaultdict(list)
-        self.k = k
-        self.allow_self_loops = allow_self_loops
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
+        self._start_search(k, allow_self_loops, counts_only)
         self.unique = set()
         self.hash_ = set()
 
-        for i, j in list(self.network.edges):
-            self.logger.debug(f'Edge: ({i}, {j}):')
-            self.__find_sub_graphs(frozenset({i, j}))
+        for i, j in zip(self.graph.src.tolist(), self.graph.dst.tolist()):
+            self.logger.debug(f'Edge: ({self.graph.nodes[i]}, {self.graph.nodes[j]}):')
+            self.__find_sub_graphs(tuple(sorted({i, j})))
 
-        self.fsl = dict(sorted(self.fsl.items()))
-        return SubGraphSearchResult(fsl=self.fsl, fsl_fully_mapped=self.fsl_fully_mapped)
+        # the memo is scoped to a single search
+        self.unique = set()
+        self.hash_ = set()
+        return self._search_result()
@@ -1,12 +1,11 @@
-from functools import cache
+from typing import Optional
 
 from networkx import DiGraph
 
+from networks.compact_graph import CompactGraph
 from subgraphs.sub_graphs_abc import SubGraphsABC
-import networkx as nx
 
-from utils.sub_graphs import HashedGraph
-from collections import defaultdict
+from utils.sub_graphs import get_id_from_edges
 
 from utils.types import SubGraphSearchResult
 
@@ -17,55 +16,65 @@ class MFinderNoneInduced(SubGraphsABC):
     paper:  R. Milo, S. Shen-Orr, S. Itzkovitz, N. Kashtan,D. Chklovskii, and U. Alon, “Network motifs: simple
             building blocks of complex networks.” Science, vol. 298, no. 5594, pp. 824–827, October 2002.
     pseudocode: Ribeiro, Pedro and Silva, Fernando and Kaiser, Marcus: "Strategies for Network Motifs Discovery"
+    the visited states are keyed by their sorted edge indices tuple, and are kept for a single search only.
     """
 
-    def __init__(self, network: DiGraph, isomorphic_mapping: dict):
-        super().__init__(network, isomorphic_mapping)
-        self.unique = set()  # unique sub graphs visited
-        self.hash_ = set()  # hash for trimming during the backtracking
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, memo_size: Optional[int] = None,
+                 compact_graph: Optional[CompactGraph] = None):
+        """
+        :param memo_size: optional bound on the number of partial sub graphs memoized for trimming during
+        the backtracking. once reached, new partial sub graphs are not memoized (slower, same result)
+        """
+        super().__init__(network, isomorphic_mapping, compact_graph)
+        self.memo_size = memo_size
+        self.unique: set[tuple] = set()  # unique sub graphs (of k nodes) visited
+        self.hash_: set[tuple] = set()  # partial sub graphs visited, for trimming during the backtracking
 
-    def __is_unique(self, sub_graph: tuple) -> bool:
-        return HashedGraph(sub_graph) not in self.unique
+        # an edge index is its position in the (sorted) edge keys, i.e.: in the out CSR
+        graph = self.graph
+        self.edges: list[tuple[int, int]] = [(key // graph.n, key % graph.n) for key in graph.edge_key_array.tolist()]
+        edge_index = {edge: i for i, edge in enumerate(self.edges)}
+        # node -> [(neighbour, edge index)] of its out / in edges
+        self.out_edges = [[(t, edge_index[(s, t)]) for t in graph.out_adj[s]] for s in range(graph.n)]
+        self.in_edges = [[(s, edge_index[(s, t)]) for s in graph.in_adj[t]] for t in range(graph.n)]
 
-    def __find_sub_graphs_new_edge(self, sub_graph: tuple, edge: tuple):
-        if edge in sub_graph:
-            return
-        new_sub_graph = (*sub_graph, edge)
-        if HashedGraph(new_sub_graph) in self.hash_:
-            return
-        self.__find_sub_graphs(new_sub_graph)
-
-    @cache
     def __find_sub_graphs(self, sub_graph: tuple):
-        graph = nx.DiGraph(list(sub_graph))
-        if len(graph) > self.k:
+        """
+        :param sub_graph: sorted edge indices
+        """
+        graph_nodes = {n for edge in sub_graph for n in self.edges[edge]}
+        if len(graph_nodes) > self.k:
             return
-        if len(graph) == self.k and self.__is_unique(sub_graph):
-            self.unique.add(HashedGraph(sub_graph))
-            self._inc_count_w_canonical_label(nx.DiGraph(list(sub_graph)))
-            if self.k > 2:
+        if len(graph_nodes) == self.k:
+            # a sub graph of k nodes is still extended by the edges between its nodes
+            if sub_graph in self.unique:
                 return
+            self.unique.add(sub_graph)
+            nodes = sorted(graph_nodes)
+            self._inc_count_w_canonical_label(nodes, get_id_from_edges([self.edges[e] for e in sub_graph], nodes))
+        else:
+            if sub_graph in self.hash_:
+                return
+            if self.memo_size is None or len(self.hash_) < self.memo_size:
+                self.hash_.add(sub_graph)
 
-        self.hash_.add(HashedGraph(sub_graph))
-        for i in list(graph.nodes):
-            for k in list(self.network.adj[i]):
-                self.__find_sub_graphs_new_edge(sub_graph, (i, k))
-
-            in_edges = [u for u, v in self.network.in_edges(nbunch=i)]
-            for k in in_edges:
-                self.__find_sub_graphs_new_edge(sub_graph, (k, i))
+        is_full = len(graph_nodes) == self.k
+        for i in graph_nodes:
+            for k, edge in (*self.out_edges[i], *self.in_edges[i]):
+                if edge in sub_graph or (is_full and k not in graph_nodes):
+                    continue
+                self.__find_sub_graphs(tuple(sorted((*sub_graph, edge))))
 
-    def search_sub_graphs(self, k: int, allow_self_loops: bool) -> SubGraphSearchResult:
-        self.fsl = defaultdict(int)
-        self.k = k
-        self.allow_self_loops = allow_self_loops
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
+        self._start_search(k, allow_self_loops, counts_only)
         self.unique = set()
         self.hash_ = set()
-        self.fsl_fully_mapped = defaultdict(list)
 
-        for i, j in list(self.network.edges):
-            self.logger.debug(f'Edge: ({i}, {j}):')
-            self.__find_sub_graphs(((i, j),))
+        for edge, (i, j) in enumerate(self.edges):
+            self.logger.debug(f'Edge: ({self.graph.nodes[i]}, {self.graph.nodes[j]}):')
+            self.__find_sub_graphs((edge,))
 
-        self.fsl = dict(sorted(self.fsl.items()))
-        return SubGraphSearchResult(fsl=self.fsl, fsl_fully_mapped=self.fsl_fully_mapped)
+        # the memo is scoped to a single search
+        self.unique = set()
+        self.hash_ = set()
+        return self._search_result()
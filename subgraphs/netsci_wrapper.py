@@ -1,19 +1,28 @@
+import itertools
+from typing import Optional
+
+import numpy as np
 from networkx import DiGraph
 
+from networks.compact_graph import CompactGraph
 from subgraphs.sub_graphs_abc import SubGraphsABC
-import networkx as nx
+from subgraphs.triadic_census import TriadicCensus
 
-from utils.sub_graphs import create_base_motif
+from utils.common import get_edges_from_id
+from utils.sub_graphs import get_id_bit_table, get_ids_from_nodes, get_self_loops_mask
 from utils.types import SubGraphSearchResult
 import netsci.metrics.motifs as nsm
-import itertools
 
 
 # https://github.com/gialdetti/netsci
 class NetsciWrapper(SubGraphsABC):
     """
     This class wrap Netsci package and uses the louzoun algorithm which support accessing the actual sub graphs.
-    This class support k=3 only without self loops!
+    This class support k=3 only! louzoun runs on a dense adjacency matrix, without self loops (the self loops
+    of the network are ignored). Large networks (more than max_dense_nodes nodes) and the self loops variant use
+    the native k=3 path instead: the edge based triads enumeration of the TriadicCensus over the CSR arrays.
+    The roles of the participating nodes are resolved by a lookup of their sub graph id in the precomputed role
+    permutations of each motif (ordered), instead of matching each sub graph against the motif.
 
     netsci package:
     * Gal, E., Perin, R., Markram, H., London, M., and Segev, I. (2019). Neuron Geometry Underlies a Universal Local Architecture in Neuronal Networks. BioRxiv 656058.
@@ -23,68 +32,80 @@ class NetsciWrapper(SubGraphsABC):
       Phys. A Stat. Mech. Its Appl. 381, 482-490.
     """
 
-    def __init__(self, network: DiGraph, isomorphic_mapping: dict):
-        super().__init__(network, isomorphic_mapping)
-        # self.network.remove_edges_from(nx.selfloop_edges(network))
-        # TODO: a bug when input graph has a self loop...
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, compact_graph: Optional[CompactGraph] = None):
+        super().__init__(network, isomorphic_mapping, compact_graph)
 
         self.motif_keys = [12, 36, 6, 38, 14, 74, 98, 78, 102, 46, 108, 110, 238]
-        self.unique_roles = {'a', 'b', 'c'}
-
-    def _get_actual_edges(self, roles: list[tuple], nodes: list[int]):
-        # Generate all possible mappings of roles to nodes
+        # motif id -> [(role permutation, sub graph id)]: the nodes in the order of the permutation play the roles
+        # of the motif, for the sub graphs with the id (of the given node order)
+        self.role_permutations = {motif_id: self.__get_role_permutations(motif_id) for motif_id in self.motif_keys}
+
+        # the dense adjacency matrix takes O(n^2) memory
+        self.max_dense_nodes = 5000
+        self.triadic_census: Optional[TriadicCensus] = None
+
+    @staticmethod
+    def __get_role_permutations(motif_id: int, k: int = 3) -> list[tuple[tuple[int, ...], int]]:
+        table = get_id_bit_table(k)
+        role_pattern = get_edges_from_id(motif_id, k)
         role_permutations = []
-        for perm in itertools.permutations(nodes, len(self.unique_roles)):
-            role_map = {role: node for role, node in zip(sorted(self.unique_roles), perm)}
-            role_permutations.append(role_map)
-
-        # For each mapping, check if it produces edges that exist in the graph
-        for role_map in role_permutations:
-            candidate_edges = []
-            valid_mapping = True
-
-            for src_role, dst_role in roles:
-                src_node = role_map[src_role]
-                dst_node = role_map[dst_role]
-
-                # Check if this edge exists in the graph
-                if not self.network.has_edge(src_node, dst_node):
-                    valid_mapping = False
-                    break
-
-                candidate_edges.append((src_node, dst_node))
-
-            if valid_mapping:
-                return candidate_edges
-
-        # If no valid mapping is found
-        return []
-
-    def search_sub_graphs(self, k: int, allow_self_loops: bool) -> SubGraphSearchResult:
+        for perm in itertools.permutations(range(k)):
+            sub_id = sum(table[perm[s]][perm[t]] for s, t in role_pattern)
+            role_permutations.append((perm, sub_id))
+        return role_permutations
+
+    def _get_role_nodes(self, motif_id: int, nodes: np.ndarray) -> np.ndarray:
+        """
+        :param nodes: (n, 3) array of the node indices of the sub graphs of motif_id
+        :return: the nodes, in the role order of motif_id (the first valid role permutation)
+        """
+        sub_ids = get_ids_from_nodes(self.graph, nodes) & ~get_self_loops_mask(3)
+        role_nodes = np.empty_like(nodes)
+        resolved = np.zeros(len(nodes), dtype=bool)
+        for perm, sub_id in self.role_permutations[motif_id]:
+            rows = ~resolved & (sub_ids == sub_id)
+            role_nodes[rows] = nodes[rows][:, perm]
+            resolved |= rows
+        if not resolved.all():
+            raise Exception(f'Netsci Wrapper: sub graphs that are not isomorphic to motif {motif_id}')
+        return role_nodes
+
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
         if k != 3:
             raise Exception('Netsci Wrapper support k=3 only')
-        if allow_self_loops:
-            raise Exception('Netsci Wrapper does not support self loops')
+        if allow_self_loops or self.graph.n > self.max_dense_nodes:
+            return self.__search_native(k, allow_self_loops, counts_only)
 
-        sorted_nodes = list(self.network.nodes)
-        sorted_nodes.sort()
-        A = nx.adjacency_matrix(self.network, nodelist=sorted_nodes).todense()
+        # the compact graph nodes are sorted. the self loops are ignored (louzoun requires a zero diagonal)
+        A = np.zeros((self.graph.n, self.graph.n), dtype=np.int64)
+        A[self.graph.src, self.graph.dst] = 1
+        np.fill_diagonal(A, 0)
+
+        if counts_only:
+            n_reals = nsm.motifs(A, algorithm='louzoun')[3:]
+            fsl = {self.motif_keys[i]: amount for (i, amount) in enumerate(n_reals)}
+            return SubGraphSearchResult(fsl=fsl, fsl_fully_mapped={})
 
         n_reals, participating_nodes = nsm.motifs(A, algorithm='louzoun', participation=True)
         n_reals = n_reals[3:]
         participating_nodes = participating_nodes[3:]
 
-        fsl_fully_mapped = {}
+        self._start_search(k, allow_self_loops, counts_only)
         for i, sub_graphs in enumerate(participating_nodes):
             motif_id = self.motif_keys[i]
-            motif = create_base_motif(sub_id=motif_id, k=3)
-            role_pattern = motif.role_pattern
-
-            fsl_fully_mapped[motif_id] = []
-            for nodes in sub_graphs:
-                graph_nodes = [sorted_nodes[n] for n in nodes]
-                sub_graph_edges = self._get_actual_edges(role_pattern, graph_nodes)
-                fsl_fully_mapped[motif_id].append(sub_graph_edges)
-
-        fsl = {self.motif_keys[i]: amount for (i, amount) in enumerate(n_reals)}
-        return SubGraphSearchResult(fsl=fsl, fsl_fully_mapped=fsl_fully_mapped)
+            nodes = np.asarray(sub_graphs, dtype=np.int32).reshape(-1, k)
+            self.occurrence_sink.add_records(motif_id, self._get_role_nodes(motif_id, nodes))
+        result = self._search_result()
+
+        result.fsl = {self.motif_keys[i]: amount for (i, amount) in enumerate(n_reals)}
+        return result
+
+    def __search_native(self, k: int, allow_self_loops: bool, counts_only: bool) -> SubGraphSearchResult:
+        if self.triadic_census is None:
+            self.triadic_census = TriadicCensus(self.network, self.isomorphic_mapping, self.graph)
+        self.triadic_census.occurrence_sink = self.occurrence_sink
+        result = self.triadic_census.search_sub_graphs(k, allow_self_loops, counts_only)
+
+        if not allow_self_loops:
+            result.fsl = {motif_id: result.fsl[motif_id] for motif_id in self.motif_keys}
+        return result
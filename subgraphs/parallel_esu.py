@@ -0,0 +1,96 @@
+import heapq
+import os
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Optional
+
+import numpy as np
+from networkx import DiGraph
+
+from networks.compact_graph import CompactGraph
+from subgraphs.esu import ESU
+from utils.types import SubGraphSearchResult
+
+# the ESU instance of a worker process, built once by the pool initializer
+_worker_esu: Optional[ESU] = None
+
+
+def _init_worker(network: DiGraph, isomorphic_mapping: dict, compact_graph: CompactGraph):
+    global _worker_esu
+    _worker_esu = ESU(network, isomorphic_mapping, compact_graph)
+
+
+def _search_shard(roots: list[int], k: int, allow_self_loops: bool, counts_only: bool) -> tuple[dict, dict]:
+    _worker_esu._start_search(k, allow_self_loops, counts_only)
+    for nodes in _worker_esu.iter_sub_graphs(k, roots):
+        _worker_esu._inc_count_w_canonical_label_induced(nodes)
+    result = _worker_esu._search_result()
+    if counts_only:
+        return result.fsl, {}
+
+    # the raw records are returned (rather than the views, which reference the worker's sink)
+    sink = _worker_esu.occurrence_sink
+    records = {sub_id: np.concatenate(list(sink.iter_records(sub_id))) for sub_id in sink.sub_ids()}
+    return result.fsl, records
+
+
+class ParallelESU(ESU):
+    """
+    ESU census on a process pool: the enumeration trees are independent per root vertex, so the roots are split
+    into shards, each worker enumerates its shards (over its own read only copy of the graph) and returns the counts
+    (and optionally the occurrences) per isomorphic class, which are merged into a single result.
+    the shards are balanced by a degree based estimation of the roots' sub trees sizes.
+    """
+
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, workers: Optional[int] = None,
+                 compact_graph: Optional[CompactGraph] = None):
+        super().__init__(network, isomorphic_mapping, compact_graph)
+        self.workers = workers or os.cpu_count() or 1
+        self.shards_per_worker = 4
+
+    def estimate_sub_tree_sizes(self, k: int) -> np.ndarray:
+        """
+        a rough estimation of the ESU sub tree size of each root v:
+        (1 + #neighbors larger than v) * (1 + sum of the neighbors degrees) ^ (k - 2)
+        """
+        graph = self.graph
+        degree = graph.und_degree().astype(np.float64)
+        rows = np.repeat(np.arange(graph.n), np.diff(graph.und_indptr))
+        cols = graph.und_indices
+        larger = np.bincount(rows[cols > rows], minlength=graph.n)
+        neighbors_degree = np.bincount(rows, weights=degree[cols], minlength=graph.n)
+        return (1 + larger) * (1 + neighbors_degree) ** max(k - 2, 0)
+
+    def get_shards(self, k: int, shards_amount: int) -> list[list[int]]:
+        """
+        greedy (longest processing time first) partition of the roots into balanced shards
+        """
+        estimation = self.estimate_sub_tree_sizes(k)
+        shards = [[] for _ in range(shards_amount)]
+        loads = [(0.0, i) for i in range(shards_amount)]
+        for v in np.argsort(-estimation, kind='stable').tolist():
+            load, i = heapq.heappop(loads)
+            shards[i].append(v)
+            heapq.heappush(loads, (load + estimation[v], i))
+        return [sorted(shard) for shard in shards if shard]
+
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
+        if self.workers <= 1:
+            return super().search_sub_graphs(k, allow_self_loops, counts_only)
+
+        self._start_search(k, allow_self_loops, counts_only)
+        shards = self.get_shards(k, self.workers * self.shards_per_worker)
+        self.logger.debug(f'Parallel ESU: {len(shards)} shards on {self.workers} workers')
+
+        fsl = defaultdict(int)
+        with Pool(processes=self.workers, initializer=_init_worker,
+                  initargs=(self.network, self.isomorphic_mapping, self.graph)) as pool:
+            tasks = [(shard, k, allow_self_loops, counts_only) for shard in shards]
+            for shard_fsl, shard_records in pool.starmap(_search_shard, tasks):
+                for sub_id, count in shard_fsl.items():
+                    fsl[sub_id] += count
+                for sub_id, nodes in shard_records.items():
+                    self.occurrence_sink.add_records(sub_id, nodes)
+
+        self.fsl = fsl
+        return self._search_result()
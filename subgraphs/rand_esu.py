@@ -0,0 +1,130 @@
+import math
+import time
+from typing import Optional
+
+import numpy as np
+from networkx import DiGraph
+
+from networks.compact_graph import CompactGraph
+from subgraphs.esu import ESU
+from utils.types import SampledSubGraphSearchResult
+
+
+class RandESU(ESU):
+    """
+    RAND-ESU: an unbiased sampling of the ESU enumeration tree
+    S. Wernicke, “Efficient detection of network motifs,” 2006
+    each tree node of depth d is explored with probability p_d, thus every k nodes sub graph is sampled with
+    probability P = p_1 * ... * p_k, and count / P is an unbiased estimation of its frequency.
+    the sampling is repeated in independent rounds, the estimation is the mean of the rounds and the standard error
+    is derived from their variance. the rounds stop when the target accuracy is reached or the time budget is over,
+    without a stopping criterion after min_rounds rounds.
+    """
+
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict,
+                 sampling_fraction: float = 0.1,
+                 probabilities: Optional[list[float]] = None,
+                 target_accuracy: Optional[float] = None,
+                 time_budget: Optional[float] = None,
+                 min_rounds: int = 2,
+                 max_rounds: int = 10,
+                 min_concentration: float = 0.01,
+                 compact_graph: Optional[CompactGraph] = None):
+        """
+        :param sampling_fraction: the expected fraction of sampled sub graphs (leaves), used when no probabilities
+        are given: it is split evenly between the two deepest levels (Wernicke recommends sampling near the leaves)
+        :param probabilities: explicit per depth probabilities (length k)
+        :param target_accuracy: stop when the relative standard error of every motif id with a concentration of at
+        least min_concentration is below this value
+        :param time_budget: stop after this many seconds (checked between rounds)
+        :param min_rounds: minimum number of rounds (at least 2 are needed for an error estimation), the number of
+        rounds when there is no stopping criterion (target_accuracy, time_budget)
+        :param max_rounds: maximum number of rounds
+        """
+        super().__init__(network, isomorphic_mapping, compact_graph)
+        self.sampling_fraction = sampling_fraction
+        self.probabilities = probabilities
+        self.target_accuracy = target_accuracy
+        self.time_budget = time_budget
+        self.min_rounds = min_rounds
+        self.max_rounds = max(max_rounds, min_rounds)
+        self.min_concentration = min_concentration
+
+    def get_probabilities(self, k: int) -> list[float]:
+        if self.probabilities is not None:
+            if len(self.probabilities) != k:
+                raise Exception(f'RAND-ESU expects {k} probabilities, got: {len(self.probabilities)}')
+            return list(self.probabilities)
+
+        levels = min(k, 2)
+        return [1.0] * (k - levels) + [self.sampling_fraction ** (1 / levels)] * levels
+
+    def __is_accurate(self, mean: dict, standard_error: dict) -> bool:
+        total = sum(mean.values())
+        if not total:
+            return False
+        for sub_id, estimation in mean.items():
+            if estimation / total < self.min_concentration:
+                continue
+            if standard_error[sub_id] / estimation > self.target_accuracy:
+                return False
+        return True
+
+    @staticmethod
+    def __estimate(rounds: list[dict]) -> tuple[dict, dict]:
+        sub_ids = sorted({sub_id for round_fsl in rounds for sub_id in round_fsl})
+        estimations = np.array([[round_fsl.get(sub_id, 0) for sub_id in sub_ids] for round_fsl in rounds],
+                               dtype=np.float64).reshape(len(rounds), len(sub_ids))
+        mean = estimations.mean(axis=0)
+        if len(rounds) > 1:
+            standard_error = estimations.std(axis=0, ddof=1) / math.sqrt(len(rounds))
+        else:
+            standard_error = np.full(len(sub_ids), np.inf)
+        return dict(zip(sub_ids, mean.tolist())), dict(zip(sub_ids, standard_error.tolist()))
+
+    def search_sub_graphs(self, k: int, allow_self_loops: bool,
+                          counts_only: bool = False) -> SampledSubGraphSearchResult:
+        probabilities = self.get_probabilities(k)
+        explored_fraction = math.prod(probabilities)
+        if not explored_fraction:
+            raise Exception('RAND-ESU probabilities must be positive')
+
+        start_time = time.time()
+        rounds: list[dict] = []
+        fsl_fully_mapped = {}
+        mean, standard_error = {}, {}
+        while len(rounds) < self.max_rounds:
+            # the occurrences are kept for the first round only
+            self._start_search(k, allow_self_loops, counts_only or len(rounds) > 0)
+            for nodes in self.iter_sub_graphs(k, probabilities=probabilities):
+                self._inc_count_w_canonical_label_induced(nodes)
+            result = self._search_result()
+
+            rounds.append({sub_id: count / explored_fraction for sub_id, count in result.fsl.items()})
+            if len(rounds) == 1:
+                fsl_fully_mapped = result.fsl_fully_mapped
+            mean, standard_error = self.__estimate(rounds)
+
+            if len(rounds) < self.min_rounds:
+                continue
+            if self.target_accuracy is None and self.time_budget is None:
+                break
+            if self.target_accuracy is not None and self.__is_accurate(mean, standard_error):
+                break
+            if self.time_budget is not None and time.time() - start_time >= self.time_budget:
+                break
+
+        self.logger.debug(f'RAND-ESU: {len(rounds)} rounds, explored fraction: {explored_fraction}')
+        if len(rounds) * explored_fraction >= 1:
+            self.logger.info(f'RAND-ESU: {len(rounds)} rounds of explored fraction {round(explored_fraction, 4)} '
+                             f'sampled at least as many sub graphs as the exact (esu) census')
+        total = sum(mean.values())
+        return SampledSubGraphSearchResult(
+            fsl={sub_id: round(estimation) for sub_id, estimation in mean.items()},
+            fsl_fully_mapped=fsl_fully_mapped,
+            estimated_fsl=mean,
+            standard_error=standard_error,
+            concentrations={sub_id: estimation / total for sub_id, estimation in mean.items()} if total else {},
+            explored_fraction=explored_fraction,
+            rounds=len(rounds)
+        )
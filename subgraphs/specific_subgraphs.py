@@ -1,10 +1,11 @@
-from collections import defaultdict
+from typing import Optional
 
+import numpy as np
+import scipy.sparse as sp
 from networkx import DiGraph
 
+from networks.compact_graph import CompactGraph, get_neighbours, get_row_pairs
 from subgraphs.sub_graphs_abc import SubGraphsABC
-from utils.sub_graphs import HashedGraph
-from itertools import combinations
 
 from utils.types import SubGraphSearchResult
 
@@ -12,12 +13,14 @@ from utils.types import SubGraphSearchResult
 class SpecificSubGraphs(SubGraphsABC):
     """
     None induced
+    the counts are closed formulas over the sparse adjacency matrix A (without self loops), e.g.:
+    mutual regulation = nnz(A * A.T) / 2, feed forward = sum((A @ A) * A), bi fan = sum(C(A @ A.T, 2)) / 2.
+    the occurrences are enumerated (vectorized) only when requested, i.e.: not counts_only.
     """
 
-    def __init__(self, network: DiGraph, isomorphic_mapping: dict):
-        super().__init__(network, isomorphic_mapping)
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, compact_graph: Optional[CompactGraph] = None):
+        super().__init__(network, isomorphic_mapping, compact_graph)
         self.fsl = {}
-        self.fsl_fully_mapped = defaultdict(list)
 
         self.two_sub_graphs_search = {
             6: self.__count_mutual_regulation
@@ -39,16 +42,27 @@ class SpecificSubGraphs(SubGraphsABC):
             4: self.four_sub_graph_search
         }
 
-    def search_sub_graphs(self, k: int, allow_self_loops: bool) -> SubGraphSearchResult:
-        self.fsl = {}
-        self.fsl_fully_mapped = defaultdict(list)
+        graph = self.graph
+        not_loop = graph.src != graph.dst
+        self.adj = sp.csr_matrix((np.ones(not_loop.sum(), dtype=np.int64), (graph.src[not_loop], graph.dst[not_loop])),
+                                 shape=(graph.n, graph.n))
 
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
         sub_graph_searches = self.sub_graphs_ids_per_k[k]
+        self._start_search(k, allow_self_loops, counts_only)
 
         for id_ in sub_graph_searches:
             sub_graph_searches[id_](id_)
 
-        return SubGraphSearchResult(fsl=self.fsl, fsl_fully_mapped=self.fsl_fully_mapped)
+        return self._search_result()
+
+    def __add_occurrences(self, id_: int, nodes: list[np.ndarray]):
+        """
+        :param nodes: the node indices columns of the occurrences, in the role order of the motif id
+        """
+        if self.counts_only:
+            return
+        self.occurrence_sink.add_records(id_, np.stack(nodes, axis=1).astype(np.int32))
 
     def __count_self_loops(self, id_: int):
         """
@@ -56,151 +70,83 @@ class SpecificSubGraphs(SubGraphsABC):
         O(n)
         """
         self.logger.debug('--- self loops (x -> x) debugging: --- ')
-        self.fsl_fully_mapped[id_] = []
-
-        count = 0
-        for node in list(self.network.nodes):
-            if self.network.has_edge(node, node):
-                self.logger.debug(f'{node} -> {node}')
-                self.fsl_fully_mapped[id_].append(((node, node), ))
-                count += 1
-
-        self.fsl[id_] = count
+        self.fsl[id_] = int(self.graph.self_loops.sum())
+        self.__add_occurrences(id_, [np.flatnonzero(self.graph.self_loops)])
 
     def __count_mutual_regulation(self, id_: int):
         """
         Counts the number of mutual regulation (x -> y, y -> x)
-        O(n^2). (with list representation: o(n*e))
+        nnz(A * A.T) / 2
         """
         self.logger.debug('--- mutual regulation (x -> y, y -> x) debugging: --- ')
-        self.fsl_fully_mapped[id_] = []
-
-        count = 0
-        for x in list(self.network.nodes):
-            for y in list(self.network.nodes):
-                if x == y:
-                    continue
-                if self.network.has_edge(x, y) and self.network.has_edge(y, x):
-                    self.logger.debug(f'{x} <-> {y}')
-                    self.fsl_fully_mapped[id_].append(((x, y),))
-                    count += 1
+        mutual = sp.triu(self.adj.multiply(self.adj.T), k=1).tocoo()
+        self.fsl[id_] = mutual.nnz
+        self.__add_occurrences(id_, [mutual.row, mutual.col])
 
-        self.fsl[id_] = count
+    def __get_paths(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: (x, y, z) arrays of the paths x -> y -> z, x != z
+        """
+        adj = self.adj
+        x = np.repeat(np.arange(adj.shape[0]), np.diff(adj.indptr))
+        # every edge (x, y) is followed by the out edges of y
+        owners, z = get_neighbours(adj.indptr, adj.indices, adj.indices)
+        x, y = x[owners], adj.indices[owners]
+        not_cycle = x != z
+        return x[not_cycle], y[not_cycle], z[not_cycle]
 
     def __count_cascades(self, id_: int):
         """
         Counts the number of cascades (x -> y, y -> z) in the given network.
-        O(n_i * degree_i^2) using list representation. (with adj matrix: o(n^3))
+        sum(A @ A) - trace(A @ A)
         """
         self.logger.debug('--- cascades (x -> y, y -> z) debugging: --- ')
-        self.fsl_fully_mapped[id_] = []
-
-        count = 0
-
-        for x in list(self.network.nodes):
-            x_neighbors = list(self.network.adj[x])
-            for y in x_neighbors:
-                if x == y:
-                    continue
-                y_neighbors = list(self.network.adj[y])
-                for z in y_neighbors:
-                    if z == y or z == x:
-                        continue
-
-                    self.logger.debug(f'{x} -> {y} -> {z}')
-                    self.fsl_fully_mapped[id_].append(((x, y), (y, z)))
-                    count += 1
-
-        self.fsl[id_] = count
+        paths = self.adj @ self.adj
+        self.fsl[id_] = int(paths.sum() - paths.diagonal().sum())
+        if not self.counts_only:
+            x, y, z = self.__get_paths()
+            self.__add_occurrences(id_, [y, x, z])
 
     def __count_fan_outs(self, id_: int):
         """
         Counts the number of fan outs (x -> y, x -> z) in the given network.
-        O(n)
+        sum(C(out degree, 2))
         """
         self.logger.debug('--- fan outs (x -> y, x -> z) debugging: --- ')
-        self.fsl_fully_mapped[id_] = []
-
-        count = 0
-        for x in list(self.network.nodes):
-            x_neighbors = list(self.network.adj[x])
-            without_self_neighbors = [n for n in x_neighbors if n != x]
-            n = len(without_self_neighbors)
-            if n < 2:
-                continue
-            count += (n * (n - 1)) / 2
-
-            comb = list(combinations(without_self_neighbors, 2))
-            for y, z in comb:
-                self.logger.debug(f'{x} -> {y}, {x} -> {z}')
-                self.fsl_fully_mapped[id_].append(((x, y), (x, z)))
-
-        self.fsl[id_] = int(count)
+        out_degree = np.diff(self.adj.indptr)
+        self.fsl[id_] = int((out_degree * (out_degree - 1) // 2).sum())
+        if not self.counts_only:
+            self.__add_occurrences(id_, list(get_row_pairs(self.adj.indptr, self.adj.indices)))
 
     def __count_feed_forward(self, id_: int):
         """
         Counts the number of feed forward (x -> y, x -> z, y -> z) in the given network.
-        O(n * degree^3)
+        sum((A @ A) * A)
         """
         self.logger.debug('--- feed forwards (x -> y, x -> z, y -> z) debugging: --- ')
-        self.fsl_fully_mapped[id_] = []
-
-        count = 0
-        for x in list(self.network.nodes):
-            x_neighbors = list(self.network.adj[x])
-            for y in x_neighbors:
-                if x == y:
-                    continue
-                y_neighbors = list(self.network.adj[y])
-                for z in y_neighbors:
-                    if z == y or z == x:
-                        continue
-                    if z not in x_neighbors:
-                        continue
-                    self.logger.debug(f'{x} -> {y}, {x} -> {z}, {y} -> {z}')
-                    self.fsl_fully_mapped[id_].append(((x, y), (x, z), (y, z)))
-                    count += 1
-
-        self.fsl[id_] = count
+        self.fsl[id_] = int((self.adj @ self.adj).multiply(self.adj).sum())
+        if not self.counts_only:
+            x, y, z = self.__get_paths()
+            closed = self.graph.has_edges(x, z)
+            self.__add_occurrences(id_, [x[closed], y[closed], z[closed]])
 
     def __count_bi_fan(self, id_: int):
         """
         Counts the number of bi fan (k=4) (x -> w, x -> z, y -> w, y -> z) in the given network.
-        O(n^2 * degree^2)
+        sum over the pairs x < y of C(co targets, 2), where the co targets are A @ A.T
         """
         self.logger.debug('--- bi fan (x -> w, x -> z, y -> w, y -> z) debugging: --- ')
-        self.fsl_fully_mapped[id_] = []
-
-        count = 0
-        nodes = list(self.network.nodes)
-        nodes.sort()
-        N = len(nodes)
-        hash_ = set()
-        for i in range(N - 1):
-            x = nodes[i]
-            x_neighbors = list(self.network.adj[x])
-            x_without_self_neighbors = [n for n in x_neighbors if n != x]
-            x_without_self_neighbors.sort()
-            for j in range(1, N):
-                y = nodes[j]
-                if x == y:
-                    continue
-                y_neighbors = list(self.network.adj[y])
-                y_without_self_neighbors = [n for n in y_neighbors if n != y]
-                y_without_self_neighbors.sort()
-                y_comb = list(combinations(y_without_self_neighbors, 2))
-                x_comb = list(combinations(x_without_self_neighbors, 2))
-
-                for x_wz in x_comb:
-                    if x_wz in y_comb:
-                        w, z = x_wz
-                        sub_graph = ((x, w), (x, z), (y, w), (y, z))
-                        sub_graph = HashedGraph(sub_graph)
-                        if sub_graph in hash_:
-                            continue
-                        hash_.add(sub_graph)
-                        self.logger.debug(f'{x} -> {w}, {x} -> {z}, {y} -> {w}, {y} -> {z}')
-                        self.fsl_fully_mapped[id_].append(sub_graph)
-                        count += 1
-
-        self.fsl[id_] = count
+        co_targets = sp.triu(self.adj @ self.adj.T, k=1).tocoo()
+        self.fsl[id_] = int((co_targets.data * (co_targets.data - 1) // 2).sum())
+        if self.counts_only:
+            return
+
+        # (x, y, w): the pairs of sources x < y of each target w, grouped by (x, y)
+        in_adj = self.adj.T.tocsr()
+        w, x, y = get_row_pairs(in_adj.indptr, in_adj.indices)
+        n = self.graph.n
+        order = np.lexsort((w, x * n + y))
+        sources, starts = np.unique((x * n + y)[order], return_index=True)
+        indptr = np.append(starts, len(order))
+        rows, w_, z_ = get_row_pairs(indptr, w[order])
+        self.__add_occurrences(id_, [sources[rows] // n, sources[rows] % n, w_, z_])
@@ -1,85 +1,182 @@
 from abc import ABCMeta, abstractmethod
 from collections import defaultdict
 
+from typing import Optional
+
+import numpy as np
 from networkx import DiGraph
-import networkx as nx
 
-from utils.sub_graphs import get_id, get_sub_graph_from_id
+from isomorphic.canonical_labeling import get_canonical_labeling
+from isomorphic.isomorphic import get_isomorphic_lookup
+from networks.compact_graph import CompactGraph
+from utils.occurrence_sink import OccurrenceSink, MemoryOccurrenceSink
+from utils.occurrences import EdgePolarity
+from utils.sub_graphs import get_id_from_nodes, get_self_loops_mask
 from utils.simple_logger import Logger
 from utils.types import SubGraphSearchResult
 
 
 class SubGraphsABC(metaclass=ABCMeta):
-    def __init__(self, network: DiGraph, isomorphic_mapping: dict):
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, compact_graph: Optional[CompactGraph] = None):
+        """
+        :param compact_graph: the CompactGraph of the network, when it is already built (it is built otherwise)
+        """
         self.network = network
-        s, t = list(network.edges)[0]
+        # integer indexed CSR view of the network, shared by all the enumeration steps
+        self.graph = compact_graph if compact_graph is not None else CompactGraph(network)
+        s, t = next(iter(network.edges))
         self.use_polarity = 'polarity' in network[s][t] and network[s][t]['polarity'] is not None
 
         self.isomorphic_mapping = isomorphic_mapping
+        # dense (int32) version of the isomorphic mapping, built per k in _start_search
+        self.isomorphic_lookup: Optional[np.ndarray] = None
         self.logger = Logger()
 
         self.k = -1  # motif size
         self.allow_self_loops = False
+        self.counts_only = False
 
         self.fsl = defaultdict(int)
-        self.fsl_fully_mapped = defaultdict(list)
+        self.fsl_fully_mapped = {}
+        # where the occurrences (fsl_fully_mapped) are kept, e.g.: a DiskOccurrenceSink for large searches
+        self.occurrence_sink: OccurrenceSink = MemoryOccurrenceSink()
+        self.__edge_polarity: Optional[EdgePolarity] = None
+
+        # sub graphs waiting to be resolved by the isomorphic lookup in a single batch
+        self.batch_size = 4096
+        self.__pending_nodes: list = []
+        self.__pending_ids: list[int] = []
 
         self.inc_canonical_label_foo = self.__inc_count_w_canonical_label_using_iso_mapping if isomorphic_mapping else \
             self.__inc_count_w_canonical_label_self_iso
 
     @abstractmethod
-    def search_sub_graphs(self, k: int, allow_self_loops: bool) -> SubGraphSearchResult:
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
         """
         :param k: motif size
         :param allow_self_loops: allow or not. effects the self isomorphic version of canonical labeling
+        :param counts_only: count the sub graphs only (fsl), without building their occurrences (fsl_fully_mapped)
         :return: SubGraphSearchResult
         """
         pass
 
-    def _inc_count_w_canonical_label(self, sub_graph: DiGraph):
-        self.inc_canonical_label_foo(sub_graph)
+    def _start_search(self, k: int, allow_self_loops: bool, counts_only: bool = False):
+        self.fsl = defaultdict(int)
+        self.fsl_fully_mapped = {}
+        self.k = k
+        self.allow_self_loops = allow_self_loops
+        self.counts_only = counts_only
+        if not counts_only:
+            self.occurrence_sink.reset(k, self.graph.nodes, self.__get_edge_polarity())
+        self.__pending_nodes = []
+        self.__pending_ids = []
+
+        if self.isomorphic_mapping and (self.isomorphic_lookup is None or len(self.isomorphic_lookup) != 1 << (k * k)):
+            self.isomorphic_lookup = get_isomorphic_lookup(self.isomorphic_mapping, k)
+
+    def _search_result(self) -> SubGraphSearchResult:
+        self.__flush_pending_sub_graphs()
+        self.fsl = dict(sorted(self.fsl.items()))
+        if not self.counts_only:
+            self.occurrence_sink.flush()
+            self.fsl_fully_mapped = self.occurrence_sink.views()
+        return SubGraphSearchResult(fsl=self.fsl, fsl_fully_mapped=self.fsl_fully_mapped)
+
+    def __get_edge_polarity(self) -> Optional[EdgePolarity]:
+        if self.use_polarity and self.__edge_polarity is None:
+            self.__edge_polarity = EdgePolarity.from_network(self.graph, self.network)
+        return self.__edge_polarity
+
+    def _resolve_isomorphic_ids(self, sub_ids: np.ndarray) -> np.ndarray:
+        """
+        :param sub_ids: array of sub graph ids
+        :return: the isomorphic representative of each id (a single gather), -1 for ids that are not counted
+        """
+        return self.isomorphic_lookup.take(sub_ids)
 
-    def __inc_count_w_canonical_label_self_iso(self, sub_graph: DiGraph):
-        if list(nx.selfloop_edges(sub_graph)) and not self.allow_self_loops:
-            return
+    def _inc_count_w_canonical_label(self, nodes: list[int], sub_id: int):
+        """
+        :param nodes: the sorted node indices (of the compact graph) of the sub graph
+        :param sub_id: the sub graph id w.r.t the sorted nodes
+        """
+        self.inc_canonical_label_foo(nodes, sub_id)
 
-        sub_id = get_id(sub_graph)
-        if len(self.fsl) == 0:
-            self.fsl[sub_id] = 1
-            self.__append_to_fully_mapped_fsl(sub_id, sub_graph)
-            return
+    def _inc_count_w_canonical_label_induced(self, nodes: list[int]):
+        """
+        :param nodes: the sorted node indices (of the compact graph) of an induced sub graph
+        """
+        self.inc_canonical_label_foo(nodes, get_id_from_nodes(self.graph, nodes))
 
-        if sub_id in self.fsl:
-            self.fsl[sub_id] += 1
-            self.__append_to_fully_mapped_fsl(sub_id, sub_graph)
+    def __inc_count_w_canonical_label_self_iso(self, nodes: list[int], sub_id: int):
+        if sub_id & get_self_loops_mask(self.k) and not self.allow_self_loops:
             return
 
-        found = False
-        for id_ in self.fsl:
-            other_graph = get_sub_graph_from_id(id_, k=self.k)
-            if nx.is_isomorphic(sub_graph, other_graph):
-                self.fsl[id_] += 1
-                self.__append_to_fully_mapped_fsl(id_, sub_graph)
-                found = True
-                break
-
-        if not found:
-            self.fsl[sub_id] = 1
-            self.__append_to_fully_mapped_fsl(sub_id, sub_graph)
-
-    def __append_to_fully_mapped_fsl(self, sub_id_isomorphic_representative: int, sub_graph: DiGraph):
-        if not self.use_polarity:
-            self.fsl_fully_mapped[sub_id_isomorphic_representative].append(tuple(list(sub_graph.edges)))
-        else:
-            polarities = nx.get_edge_attributes(sub_graph, 'polarity')
-            pol_edges = tuple([(*e, {'polarity': polarities[e]}) for e in list(sub_graph.edges)])
-            self.fsl_fully_mapped[sub_id_isomorphic_representative].append(pol_edges)
-
-    def __inc_count_w_canonical_label_using_iso_mapping(self, sub_graph: DiGraph):
-        sub_id = get_id(sub_graph)
-        if sub_id not in self.isomorphic_mapping:
+        canonical_labeling = get_canonical_labeling(self.k)
+        canonical_id = canonical_labeling.get_canonical_id(sub_id)
+        self.fsl[canonical_id] += 1
+        if not self.counts_only:
+            role_order = canonical_labeling.get_role_order(sub_id, canonical_id)
+            self.occurrence_sink.add(canonical_id, [nodes[i] for i in role_order])
+
+    def __inc_count_w_canonical_label_using_iso_mapping(self, nodes: list[int], sub_id: int):
+        if not self.counts_only:
+            self.__pending_nodes.append(nodes)
+        self.__pending_ids.append(sub_id)
+        if len(self.__pending_ids) >= self.batch_size:
+            self.__flush_pending_sub_graphs()
+
+    def __flush_pending_sub_graphs(self):
+        if not self.__pending_ids:
             return
 
-        sub_id_isomorphic_representative = self.isomorphic_mapping[sub_id]
-        self.fsl[sub_id_isomorphic_representative] += 1
-        self.__append_to_fully_mapped_fsl(sub_id_isomorphic_representative, sub_graph)
+        sub_ids = np.array(self.__pending_ids, dtype=np.int64)
+        nodes = None if self.counts_only else np.array(self.__pending_nodes, dtype=np.int32)
+        self.__pending_nodes = []
+        self.__pending_ids = []
+        self._inc_count_w_canonical_labels(nodes, sub_ids, self._resolve_isomorphic_ids(sub_ids))
+
+    def _inc_count_w_canonical_labels(self, nodes: Optional[np.ndarray], sub_ids: np.ndarray,
+                                      representatives: Optional[np.ndarray] = None):
+        """
+        batch version of _inc_count_w_canonical_label
+        :param nodes: (n, k) array of the sorted node indices (of the compact graph), may be None if counts_only
+        :param sub_ids: (n,) array of the sub graph ids w.r.t the sorted nodes
+        :param representatives: (n,) the isomorphic representatives (-1 for sub graphs that are not counted).
+        resolved by the isomorphic mapping / canonical labeling if not given
+        """
+        if representatives is None:
+            if self.isomorphic_mapping:
+                representatives = self._resolve_isomorphic_ids(sub_ids)
+            else:
+                canonical_labeling = get_canonical_labeling(self.k)
+                self_loops_mask = 0 if self.allow_self_loops else get_self_loops_mask(self.k)
+                representatives = np.array([-1 if sub_id & self_loops_mask else
+                                            canonical_labeling.get_canonical_id(sub_id)
+                                            for sub_id in sub_ids.tolist()], dtype=np.int64)
+        counted = representatives >= 0
+
+        unique_representatives, counts = np.unique(representatives[counted], return_counts=True)
+        for sub_id_isomorphic_representative, count in zip(unique_representatives.tolist(), counts.tolist()):
+            self.fsl[sub_id_isomorphic_representative] += count
+
+        if not self.counts_only and counted.any():
+            self.__append_to_fully_mapped_fsl(nodes[counted], sub_ids[counted], representatives[counted])
+
+    def __append_to_fully_mapped_fsl(self, nodes: np.ndarray, sub_ids: np.ndarray, representatives: np.ndarray):
+        """
+        reorder the nodes of each sub graph to the role order of its isomorphic representative (the motif id)
+        and add them to the occurrence sink, grouped by representative
+        :param nodes: (n, k) array of the sorted node indices
+        :param sub_ids: (n,) the sub graph ids w.r.t the sorted nodes
+        :param representatives: (n,) their isomorphic representatives
+        """
+        canonical_labeling = get_canonical_labeling(self.k)
+        pairs, pair_index = np.unique(np.stack([sub_ids, representatives], axis=1), axis=0, return_inverse=True)
+        role_orders = np.array([canonical_labeling.get_role_order(sub_id, representative)
+                                for sub_id, representative in pairs.tolist()], dtype=np.int64).reshape(-1, self.k)
+        role_nodes = np.take_along_axis(nodes, role_orders[pair_index.reshape(-1)], axis=1)
+
+        order = np.argsort(representatives, kind='stable')
+        unique_representatives, starts = np.unique(representatives[order], return_index=True)
+        for representative, rows in zip(unique_representatives.tolist(), np.split(order, starts[1:])):
+            self.occurrence_sink.add_records(representative, role_nodes[rows])
@@ -0,0 +1,105 @@
+import itertools
+from typing import Iterator, Optional
+
+import numpy as np
+from networkx import DiGraph
+
+from networks.compact_graph import CompactGraph, get_neighbours, get_row_chunks, get_row_pairs, get_row_triples
+from subgraphs.sub_graphs_abc import SubGraphsABC
+
+from utils.sub_graphs import get_ids_from_nodes
+from utils.types import SubGraphSearchResult
+
+
+class TetradCensus(SubGraphsABC):
+    """
+    k=4 census (induced) of all the connected sub graphs (199 classes without self loops).
+    every connected set of 4 nodes is generated exactly once, vectorized, from the shape of its undirected
+    (induced) graph - in chunks of pivot nodes:
+    - a center (a node connected to the 3 others: star, paw, diamond, clique): as a star of its smallest center
+    - no center, 3 edges (path a - b - c - d): from its middle edge b < c
+    - no center, 4 edges (cycle a - b - c - d - a): from its smallest node a, with b < d
+    the sub graphs ids are resolved in batches by the isomorphic mapping (or the canonical labeling), and the
+    occurrences are kept only when requested.
+    graphlets (undirected) reference: T. Hočevar and J. Demšar, "A combinatorial approach to graphlet counting",
+    Bioinformatics, vol. 30, no. 4, pp. 559–565, 2014.
+    """
+
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, compact_graph: Optional[CompactGraph] = None):
+        super().__init__(network, isomorphic_mapping, compact_graph)
+        # the max number of candidates in a chunk of the enumeration
+        self.chunk_size = 1 << 18
+
+        graph = self.graph
+        self.indptr, self.indices = graph.und_indptr, graph.und_indices
+        self.degree = np.diff(self.indptr)
+        # the undirected edge keys (u * n + v), sorted
+        self.und_keys = np.repeat(np.arange(graph.n, dtype=np.int64), self.degree) * graph.n + self.indices
+
+    def __adjacent(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        keys = u.astype(np.int64) * self.graph.n + v
+        if not len(self.und_keys):
+            return np.zeros(keys.shape, dtype=bool)
+        pos = np.minimum(np.searchsorted(self.und_keys, keys), len(self.und_keys) - 1)
+        return self.und_keys[pos] == keys
+
+    def iter_tetrads(self) -> Iterator[np.ndarray]:
+        """
+        enumerate the connected sets of 4 nodes
+        :return: generator of (n, 4) arrays of the sorted node indices
+        """
+        for nodes in itertools.chain(self.__iter_stars(), self.__iter_paths(), self.__iter_cycles()):
+            if len(nodes):
+                yield np.sort(nodes, axis=1).astype(np.int32)
+
+    def __iter_stars(self) -> Iterator[np.ndarray]:
+        # center c with the leaves a < b < d, kept for the smallest center of the set only
+        for start, end in get_row_chunks(self.degree * (self.degree - 1) * (self.degree - 2) // 6, self.chunk_size):
+            c, a, b, d = get_row_triples(self.indptr, self.indices, start, end)
+            ab, ad, bd = self.__adjacent(a, b), self.__adjacent(a, d), self.__adjacent(b, d)
+            smaller_center = ((a < c) & ab & ad) | ((b < c) & ab & bd) | ((d < c) & ad & bd)
+            keep = ~smaller_center
+            yield np.stack([c[keep], a[keep], b[keep], d[keep]], axis=1)
+
+    def __iter_paths(self) -> Iterator[np.ndarray]:
+        # the induced path a - b - c - d, from its middle edge b < c
+        b = np.repeat(np.arange(self.graph.n), self.degree)
+        c = self.indices
+        middle = b < c
+        work = np.bincount(b[middle], weights=(self.degree[b[middle]] - 1) * (self.degree[c[middle]] - 1),
+                           minlength=self.graph.n)
+        for start, end in get_row_chunks(work, self.chunk_size):
+            rows = middle & (b >= start) & (b < end)
+            b_, c_ = b[rows], c[rows]
+            owners, a = get_neighbours(self.indptr, self.indices, b_)
+            b_, c_ = b_[owners], c_[owners]
+            keep = (a != c_) & ~self.__adjacent(a, c_)
+            a, b_, c_ = a[keep], b_[keep], c_[keep]
+            owners, d = get_neighbours(self.indptr, self.indices, c_)
+            a, b_, c_ = a[owners], b_[owners], c_[owners]
+            keep = (d != b_) & (d != a) & ~self.__adjacent(b_, d) & ~self.__adjacent(a, d)
+            yield np.stack([a[keep], b_[keep], c_[keep], d[keep]], axis=1)
+
+    def __iter_cycles(self) -> Iterator[np.ndarray]:
+        # the induced cycle a - b - c - d - a, from its smallest node a, with b < d
+        positions = np.arange(len(self.indices))
+        rows = np.repeat(np.arange(self.graph.n), self.degree)
+        followers = self.indptr[rows + 1] - positions - 1
+        work = np.bincount(rows, weights=self.degree[self.indices] * followers, minlength=self.graph.n)
+        for start, end in get_row_chunks(work, self.chunk_size):
+            a, b, d = get_row_pairs(self.indptr, self.indices, start, end)
+            keep = (a < b) & ~self.__adjacent(b, d)
+            a, b, d = a[keep], b[keep], d[keep]
+            owners, c = get_neighbours(self.indptr, self.indices, b)
+            a, b, d = a[owners], b[owners], d[owners]
+            keep = (c > a) & (c != d) & self.__adjacent(c, d) & ~self.__adjacent(a, c)
+            yield np.stack([a[keep], b[keep], c[keep], d[keep]], axis=1)
+
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
+        if k != 4:
+            raise Exception('Tetrad Census support k=4 only')
+
+        self._start_search(k, allow_self_loops, counts_only)
+        for nodes in self.iter_tetrads():
+            self._inc_count_w_canonical_labels(nodes, get_ids_from_nodes(self.graph, nodes))
+        return self._search_result()
@@ -1,8 +1,14 @@
+from typing import Iterator, Optional
+
+import numpy as np
+import scipy.sparse as sp
 from networkx import DiGraph
 
+from isomorphic.canonical_labeling import get_canonical_labeling
+from networks.compact_graph import CompactGraph, get_row_chunks, get_row_pairs
 from subgraphs.sub_graphs_abc import SubGraphsABC
-import networkx as nx
 
+from utils.sub_graphs import get_ids_from_nodes, get_self_loops_mask
 from utils.types import SubGraphSearchResult
 
 
@@ -10,10 +16,17 @@ class TriadicCensus(SubGraphsABC):
     """
     triadic_census
     Vladimir Batagelj and Andrej Mrvar, A subquadratic triad census algorithm for large sparse networks with small maximum degree, University of Ljubljana
+    the network is split to its mutual (M) and asymmetric (A: i -> j without j -> i) parts.
+    - counts: the closed triads are counted by sparse products, e.g.: 030C = sum((A @ A) * A.T) / 3, and the open
+      triads by the dyads degrees of their center, minus the pairs of neighbours that close a triangle.
+    - occurrences: every connected triad is enumerated once, as a wedge (center, u, w) of the undirected graph:
+      open wedges once, and closed ones (triangles) from their smallest node only - in chunks of centers.
+    self loops are ignored (as in networkx), unless allow_self_loops is set: then the triads are classified by
+    their full id (2^9 classes), using the isomorphic mapping given (k3_w_self_loops) or the canonical labeling.
     """
 
-    def __init__(self, network: DiGraph, isomorphic_mapping: dict):
-        super().__init__(network, isomorphic_mapping)
+    def __init__(self, network: DiGraph, isomorphic_mapping: dict, compact_graph: Optional[CompactGraph] = None):
+        super().__init__(network, isomorphic_mapping, compact_graph)
         self.triadic_key_to_motif_id = {
             '021D': 6,
             '021U': 36,
@@ -29,15 +42,109 @@ class TriadicCensus(SubGraphsABC):
             '210': 110,
             '300': 238
         }
+        # the max number of wedges in a chunk of the occurrences enumeration
+        self.chunk_size = 1 << 18
+
+        graph = self.graph
+        not_loop = graph.src != graph.dst
+        adj = sp.csr_matrix((np.ones(not_loop.sum(), dtype=np.int64), (graph.src[not_loop], graph.dst[not_loop])),
+                            shape=(graph.n, graph.n))
+        self.mutual = adj.multiply(adj.T).tocsr()
+        self.asymmetric = (adj - self.mutual).tocsr()
+        self.undirected = ((adj + adj.T) > 0).astype(np.int64).tocsr()
+
+        # triad id (without self loops) -> its motif id
+        self.triad_lookup = self.__get_triad_lookup()
+
+    def __get_triad_lookup(self) -> np.ndarray:
+        canonical_labeling = get_canonical_labeling(3)
+        motif_ids = {canonical_labeling.get_canonical_id(motif_id): motif_id
+                     for motif_id in self.triadic_key_to_motif_id.values()}
+        lookup = np.full(1 << 9, -1, dtype=np.int64)
+        for sub_id in range(1 << 9):
+            if sub_id & get_self_loops_mask(3):
+                continue
+            lookup[sub_id] = motif_ids.get(canonical_labeling.get_canonical_id(sub_id), -1)
+        return lookup
+
+    def count_triads(self) -> dict[str, int]:
+        """
+        :return: the census of the 13 connected triads (self loops are ignored)
+        """
+        m, a, u = self.mutual, self.asymmetric, self.undirected
+        at = a.T.tocsr()
+
+        def total(product: sp.spmatrix, mask: sp.spmatrix) -> int:
+            return int(product.multiply(mask).sum())
+
+        out_degree = np.asarray(a.sum(axis=1)).ravel()
+        in_degree = np.asarray(a.sum(axis=0)).ravel()
+        mutual_degree = np.asarray(m.sum(axis=1)).ravel()
+
+        def pairs(degree: np.ndarray) -> int:
+            return int((degree * (degree - 1) // 2).sum())
+
+        aa, ata, aat = a @ a, at @ a, a @ at
+        mm, ma, mat = m @ m, m @ a, m @ at
+        return {
+            '021D': pairs(out_degree) - total(ata, u) // 2,
+            '021U': pairs(in_degree) - total(aat, u) // 2,
+            '021C': int((out_degree * in_degree).sum()) - total(aa, u),
+            '111D': int((mutual_degree * in_degree).sum()) - total(mat, u),
+            '111U': int((mutual_degree * out_degree).sum()) - total(ma, u),
+            '030T': total(aa, a),
+            '030C': total(aa, at) // 3,
+            '201': pairs(mutual_degree) - total(mm, u) // 2,
+            '120D': total(ata, m) // 2,
+            '120U': total(aat, m) // 2,
+            '120C': total(aa, m),
+            '210': total(mm, a),
+            '300': total(mm, m) // 6
+        }
+
+    def iter_triads(self) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        enumerate the connected triads, in chunks of centers
+        :return: generator of (nodes, sub_ids): (n, 3) arrays of the sorted node indices, and their triad ids
+        (with the self loops bits)
+        """
+        indptr, indices = self.undirected.indptr, self.undirected.indices
+        degree = np.diff(indptr)
+        for start, end in get_row_chunks(degree * (degree - 1) // 2, self.chunk_size):
+            nodes = self.__get_chunk_triads(indptr, indices, start, end)
+            if len(nodes):
+                yield nodes, get_ids_from_nodes(self.graph, nodes)
 
-    def search_sub_graphs(self, k: int,  allow_self_loops: bool) -> SubGraphSearchResult:
+    def __get_chunk_triads(self, indptr: np.ndarray, indices: np.ndarray, start: int, end: int) -> np.ndarray:
+        # the wedges (center, u, w) are the pairs of neighbours of each center
+        center, u, w = get_row_pairs(indptr, indices, start, end)
+        # u < w (sorted neighbours), a closed wedge is kept for the smallest node of the triangle only
+        closed = self.__has_undirected_edges(u, w)
+        keep = ~closed | (center < u)
+        return np.sort(np.stack([center[keep], u[keep], w[keep]], axis=1), axis=1).astype(np.int32)
+
+    def __has_undirected_edges(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        return self.graph.has_edges(u, v) | self.graph.has_edges(v, u)
+
+    def search_sub_graphs(self, k: int, allow_self_loops: bool, counts_only: bool = False) -> SubGraphSearchResult:
         if k != 3:
             raise Exception('Triadic Census support k=3 only')
 
-        triadic_census = nx.triadic_census(self.network)
-        del triadic_census['003']
-        del triadic_census['012']
-        del triadic_census['102']
+        if counts_only and not allow_self_loops:
+            triadic_census = self.count_triads()
+            fsl = dict((self.triadic_key_to_motif_id[key], value) for (key, value) in triadic_census.items())
+            return SubGraphSearchResult(fsl=fsl, fsl_fully_mapped={})
+
+        self._start_search(k, allow_self_loops, counts_only)
+        self_loops_mask = get_self_loops_mask(k)
+        for nodes, sub_ids in self.iter_triads():
+            if allow_self_loops:
+                self._inc_count_w_canonical_labels(nodes, sub_ids)
+            else:
+                sub_ids &= ~self_loops_mask
+                self._inc_count_w_canonical_labels(nodes, sub_ids, self.triad_lookup[sub_ids])
+        result = self._search_result()
 
-        fsl = dict((self.triadic_key_to_motif_id[key], value) for (key, value) in triadic_census.items())
-        return SubGraphSearchResult(fsl=fsl, fsl_fully_mapped={})
+        if not allow_self_loops:
+            result.fsl = {motif_id: result.fsl.get(motif_id, 0) for motif_id in self.triadic_key_to_motif_id.values()}
+        return result
@@ -1,12 +1,25 @@
 import networkx as nx
+import numpy as np
+import pandas as pd
 
+from isomorphic.isomorphic import IsomorphicMotifMatch
 from networks.loaders.network_loader import NetworkLoader
+from random_networks.batched_markov_chain_switching import BatchedMarkovChainSwitching
+from random_networks.ensemble_pipeline import EnsemblePipeline
 from random_networks.markov_chain_switching import MarkovChainSwitching
-from utils.types import NetworkLoaderArgs, NetworkInputType
+from random_networks.nerve_ring_markov_chain_switching import NerveRingMarkovChainSwitching
+from subgraphs.esu import ESU
+from subgraphs.incremental_triadic_census import IncrementalTriadicCensus
+from utils.types import NetworkLoaderArgs, NetworkInputType, RandomNetworkSearchResult
 
 network_file = "networks/data/Cook_2019/SI 2 Synapse adjacency matrices.xlsx"
 
 
+def _search_triads(random_network: nx.DiGraph, census_fsl: dict) -> RandomNetworkSearchResult:
+    return RandomNetworkSearchResult(fsl=ESU(random_network, {}).search_sub_graphs(k=3, allow_self_loops=False,
+                                                                                    counts_only=True).fsl)
+
+
 def test_markov_chain():
     """
     Test that the randomizer generated 10 networks and that the success rate is greater than 80%
@@ -22,3 +35,94 @@ def test_markov_chain():
     assert len(random_networks) == amount_of_networks
     success_rate = randomizer.success_switch / randomizer.markov_chain_num_iterations * amount_of_networks
     assert success_rate > 0.8
+
+
+def test_incremental_census():
+    """
+    Test that the census kept along the markov chain is the census of the generated networks
+    """
+    loader = NetworkLoader(NetworkLoaderArgs(synapse_threshold=5))
+    network = loader.load_graph(nx.gnm_random_graph(40, 150, seed=3, directed=True))
+    isomorphic_mapping = IsomorphicMotifMatch(k=3, polarity_options=[], allow_self_loops=False).isomorphic_mapping
+
+    incremental_census = IncrementalTriadicCensus(network.graph, isomorphic_mapping, allow_self_loops=False)
+    randomizer = MarkovChainSwitching(network, switch_factor=5, incremental_census=incremental_census)
+    random_networks = randomizer.generate(3)
+
+    assert len(randomizer.random_network_fsls) == len(random_networks)
+    for random_network, fsl in zip(random_networks, randomizer.random_network_fsls):
+        esu_fsl = ESU(random_network, isomorphic_mapping).search_sub_graphs(k=3, allow_self_loops=False,
+                                                                            counts_only=True).fsl
+        assert fsl == {sub_id: count for sub_id, count in esu_fsl.items() if count}
+
+
+def test_batched_markov_chain():
+    """
+    Test that the batched randomizer keeps the degrees, and that a random network depends only on the seed and its index
+    """
+    loader = NetworkLoader(NetworkLoaderArgs(synapse_threshold=5))
+    network = loader.load_graph(nx.gnm_random_graph(40, 150, seed=3, directed=True))
+
+    randomizer = BatchedMarkovChainSwitching(network, switch_factor=5, seed=7, batch_size=16)
+    random_networks = randomizer.generate(3)
+    for random_network in random_networks:
+        assert dict(random_network.in_degree) == dict(network.graph.in_degree)
+        assert dict(random_network.out_degree) == dict(network.graph.out_degree)
+
+    randomizer = BatchedMarkovChainSwitching(network, switch_factor=5, seed=7, batch_size=16)
+    assert set(randomizer.generate_network(2).edges) == set(random_networks[2].edges)
+    assert set(randomizer.generate_network(0).edges) == set(random_networks[0].edges)
+
+
+def test_ensemble_pipeline():
+    """
+    Test that the random networks ensemble is the same on a single process and on a process pool
+    """
+    loader = NetworkLoader(NetworkLoaderArgs(synapse_threshold=5))
+    network = loader.load_graph(nx.gnm_random_graph(40, 150, seed=3, directed=True))
+    randomizer = MarkovChainSwitching(network, switch_factor=5)
+
+    results = list(EnsemblePipeline(randomizer, _search_triads, seed=7).iter_results(5))
+    pool_results = list(EnsemblePipeline(randomizer, _search_triads, seed=7, workers=2).iter_results(5))
+
+    assert len(results) == 5
+    assert [result.fsl for result in results] == [result.fsl for result in pool_results]
+    assert len({tuple(sorted(result.fsl.items())) for result in results}) > 1
+
+
+def test_adaptive_switch_factor():
+    """
+    Test that the adaptive markov chain stops once mixed (before the maximal switch factor) and keeps the degrees
+    """
+    loader = NetworkLoader(NetworkLoaderArgs(synapse_threshold=5))
+    network = loader.load_graph(nx.gnm_random_graph(40, 150, seed=3, directed=True))
+
+    randomizer = MarkovChainSwitching(network, switch_factor=200, mixing_window=3, mixing_tolerance=0.02)
+    random_networks = randomizer.generate(3)
+
+    assert len(randomizer.random_network_switch_factors) == len(random_networks)
+    assert all(6 <= switch_factor < 200 for switch_factor in randomizer.random_network_switch_factors)
+    for random_network in random_networks:
+        assert dict(random_network.in_degree) == dict(network.graph.in_degree)
+        assert dict(random_network.out_degree) == dict(network.graph.out_degree)
+
+
+def test_distance_constrained_markov_chain():
+    """
+    Test that the switches of the distance constrained randomizer create only edges between close neurons
+    """
+    loader = NetworkLoader(NetworkLoaderArgs(synapse_threshold=5))
+    network = loader.load_graph(nx.gnm_random_graph(40, 150, seed=3, directed=True))
+    network.neuron_names = [f'n{node}' for node in range(40)]
+    # neurons 0-29 on a line, neurons 30-39 are not in the distance matrix (not constrained)
+    positions = np.arange(30)
+    names = network.neuron_names[:30]
+    distances = pd.DataFrame(np.abs(positions[:, None] - positions[None, :]) / 30, index=names, columns=names)
+
+    randomizer = NerveRingMarkovChainSwitching(network, switch_factor=10, distances=distances, distance_threshold=0.3)
+    random_networks = randomizer.generate(3)
+
+    assert randomizer.success_switch > 0
+    for random_network in random_networks:
+        for s, t in set(random_network.edges) - set(network.graph.edges):
+            assert s >= 30 or (t < 30 and abs(s - t) < 9)
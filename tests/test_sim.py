@@ -1,7 +1,14 @@
+import time
+from itertools import combinations
+from math import comb
+
+import networkx as nx
 import pytest
 
 from isomorphic.isomorphic import IsomorphicMotifMatch
-from large_subgraphs.single_input_moudle import SingleInputModule
+from large_subgraphs.dense_overlapping_regulons import DenseOverlappingRegulons
+from large_subgraphs.multi_output_feed_forward import MultiOutputFeedForward
+from large_subgraphs.single_input_moudle import SingleInputModule, get_independence_polynomial
 from networks.loaders.network_loader import NetworkLoader
 from subgraphs.mfinder_enum_induced import MFinderInduced
 from subgraphs.triadic_census import TriadicCensus
@@ -47,3 +54,65 @@ def test_sim3(network_file):
     sim = SingleInputModule(network.graph)
     sim_res = sim.search_sub_graphs(min_control_size=k - 1, max_control_size=5)
     assert sim_res.fsl['SIM_3'] == mfinder_sub_graphs.fsl.get(14, 0)
+
+
+def test_sim_conflicts():
+    # a hub with conflicts between its targets (edges, an edge back to the hub and a self loop)
+    graph = nx.DiGraph([(0, i) for i in range(1, 11)] + [(1, 2), (2, 3), (4, 5), (5, 4), (6, 0), (7, 7), (8, 9)])
+    expected = {}
+    for control_size in range(2, 7):
+        expected[f'SIM_{control_size}'] = sum(
+            1 for controlled in combinations(range(1, 11), control_size)
+            if not any(graph.has_edge(u, v) for u in controlled for v in controlled + (0,)))
+
+    sim = SingleInputModule(graph)
+    assert sim.search_sub_graphs(min_control_size=2, max_control_size=6, counts_only=True).fsl == expected
+    sim_res = sim.search_sub_graphs(min_control_size=2, max_control_size=6)
+    assert sim_res.fsl == expected
+    assert {sim_key: len(occurrences) for sim_key, occurrences in sim_res.fsl_fully_mapped.items()} == expected
+
+
+def test_sim_hub_conflicts():
+    # a hub with 160 targets and a sparse random conflicts graph between them: counted in bounded time
+    targets = 160
+    conflicts = nx.gnm_random_graph(targets, int(1.5 * targets), seed=1)
+
+    start_time = time.time()
+    counts = get_independence_polynomial({u: set(conflicts[u]) for u in conflicts}, max_degree=3)
+    assert time.time() - start_time < 5
+
+    edges = conflicts.number_of_edges()
+    paths = sum(comb(degree, 2) for _, degree in conflicts.degree)
+    triangles = sum(nx.triangles(conflicts).values()) // 3
+    # inclusion-exclusion over the conflicts within the pairs / triples
+    assert counts == [1, targets, comb(targets, 2) - edges,
+                      comb(targets, 3) - edges * (targets - 2) + paths - triangles]
+
+
+def test_dor():
+    # inputs 1, 2, 3 regulate the targets 4, 5, 6 (3 also regulates 7), input 8 regulates 4 and 5 only
+    graph = nx.DiGraph([(i, t) for i in [1, 2, 3] for t in [4, 5, 6]] + [(3, 7), (8, 4), (8, 5), (9, 9)])
+    dor = DenseOverlappingRegulons(graph)
+    dor_res = dor.search_sub_graphs(min_inputs=2, min_targets=2)
+    assert dor_res.fsl == {'DOR_3_3': 1, 'DOR_4_2': 1}
+    assert dor_res.fsl_fully_mapped['DOR_3_3'].nodes.tolist() == [[0, 1, 2, 3, 4, 5]]
+    assert dor.search_sub_graphs(min_inputs=2, min_targets=2, counts_only=True).fsl == dor_res.fsl
+
+    # 3 -> 7 is outside of the DORs: a density of 9 / 10 and 8 / 12
+    assert dor.search_sub_graphs(min_inputs=2, min_targets=2, min_density=0.8).fsl == {'DOR_3_3': 1}
+    assert dor.search_sub_graphs(min_inputs=4, min_targets=2).fsl == {'DOR_4_2': 1}
+
+
+def test_multi_output_ffl():
+    # 1 -> 2 regulate the outputs 3, 4, 5 (5 -> 1 breaks its FFL), 6 -> 7 regulate the outputs 8, 9
+    graph = nx.DiGraph([(1, 2), (1, 3), (2, 3), (1, 4), (2, 4), (1, 5), (2, 5), (5, 1),
+                        (6, 7), (6, 8), (7, 8), (6, 9), (7, 9), (10, 11), (10, 12), (11, 12)])
+    multi_output_ffl = MultiOutputFeedForward(graph)
+    assert len(multi_output_ffl.get_feed_forward_loops()) == 5
+
+    mffl_res = multi_output_ffl.search_sub_graphs(min_outputs=2)
+    assert mffl_res.fsl == {'MFFL_2': 2}
+    assert mffl_res.fsl_fully_mapped['MFFL_2'].nodes.tolist() == [[0, 1, 2, 3], [5, 6, 7, 8]]
+    assert multi_output_ffl.search_sub_graphs(min_outputs=2, counts_only=True).fsl == mffl_res.fsl
+    assert multi_output_ffl.search_sub_graphs(min_outputs=1).fsl == {'MFFL_1': 1, 'MFFL_2': 2}
+    assert multi_output_ffl.search_sub_graphs(min_outputs=1, max_outputs=1).fsl == {'MFFL_1': 1}
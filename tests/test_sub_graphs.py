@@ -1,14 +1,26 @@
+import pickle
+
 import networkx as nx
 import pytest
 
+from large_subgraphs.single_input_moudle import SingleInputModule
+from networks.compact_graph import CompactGraph
 from networks.loaders.network_loader import NetworkLoader
+from subgraphs.esu import ESU
 from subgraphs.fanmod_esu import FanmodESU
+from subgraphs.parallel_esu import ParallelESU
+from subgraphs.rand_esu import RandESU
 from subgraphs.mfinder_enum_induced import MFinderInduced
 from subgraphs.mfinder_enum_none_induced import MFinderNoneInduced
+from isomorphic.canonical_labeling import get_canonical_form
 from isomorphic.isomorphic import match_two_fsl_id_lists, IsomorphicMotifMatch
 from subgraphs.netsci_wrapper import NetsciWrapper
-from utils.sub_graphs import get_sub_id_name, MotifName
+from utils.occurrence_sink import DiskOccurrenceSink
+from utils.occurrences import Occurrences
+from utils.sub_graphs import get_sub_id_name, MotifName, get_sub_graph_from_id, get_id, get_id_from_nodes
+from subgraphs.specific_subgraphs import SpecificSubGraphs
 from subgraphs.triadic_census import TriadicCensus
+from subgraphs.tetrad_census import TetradCensus
 from utils.types import SubGraphSearchResult, NetworkInputType, NetworkLoaderArgs
 
 simple_input_args = NetworkLoaderArgs(
@@ -59,6 +71,10 @@ def test_three_sub_graphs_induced(network_file, expected):
     fanmod_sub_graphs = fanmod.search_sub_graphs(k=k, allow_self_loops=False)
     __compare(k, expected, fanmod_sub_graphs)
 
+    esu = ESU(network.graph, isomorphic_mapping)
+    esu_sub_graphs = esu.search_sub_graphs(k=k, allow_self_loops=False)
+    __compare(k, expected, esu_sub_graphs)
+
     triadic_census = TriadicCensus(network.graph, isomorphic_mapping)
     triadic_census_sub_graphs = triadic_census.search_sub_graphs(k=k, allow_self_loops=False)
     __compare(k, expected, triadic_census_sub_graphs)
@@ -82,6 +98,10 @@ def test_three_sub_graphs_none_induced(network_file, expected):
     mfinder_sub_graphs = mfinder.search_sub_graphs(k=k, allow_self_loops=False)
     __compare(k, expected, mfinder_sub_graphs)
 
+    specific = SpecificSubGraphs(network.graph, isomorphic_mapping)
+    specific_sub_graphs = specific.search_sub_graphs(k=k, allow_self_loops=False)
+    __compare(k, expected, specific_sub_graphs)
+
 
 def test_k_2_with_self_loops():
     k = 2
@@ -120,3 +140,262 @@ def test_k_2_with_self_loops_wo_iso_mapping():
     for src_id in ids_iso_mapping:
         tar_id = ids_iso_mapping[src_id]
         assert fanmod_sub_graphs.fsl[src_id] == expected[tar_id]
+
+
+@pytest.mark.parametrize("k", [2, 3, 4])
+def test_sub_graph_id_round_trip(k):
+    for sub_id in range(0, 2 ** (k ** 2), 7):
+        sub_graph = get_sub_graph_from_id(sub_id, k=k)
+        assert get_id(sub_graph) == sub_id
+        assert get_id_from_nodes(CompactGraph(sub_graph), list(range(k))) == sub_id
+
+
+@pytest.mark.parametrize("k, allow_self_loops", [(3, False), (4, False), (3, True)])
+def test_canonical_form_agrees_with_iso_mapping(k, allow_self_loops):
+    iso_matcher = IsomorphicMotifMatch(k=k, polarity_options=[], allow_self_loops=allow_self_loops)
+    canonical_ids = {}
+    for sub_id, representative in iso_matcher.isomorphic_mapping.items():
+        canonical_id, _ = get_canonical_form(sub_id, k)
+        assert canonical_ids.setdefault(representative, canonical_id) == canonical_id
+    assert len(set(canonical_ids.values())) == len(canonical_ids)
+
+
+def test_parallel_esu():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    esu_sub_graphs = ESU(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    parallel_sub_graphs = ParallelESU(network.graph, isomorphic_mapping, workers=2).search_sub_graphs(
+        k=k, allow_self_loops=False)
+    assert parallel_sub_graphs.fsl == esu_sub_graphs.fsl
+    for sub_id, occurrences in esu_sub_graphs.fsl_fully_mapped.items():
+        assert sorted(parallel_sub_graphs.fsl_fully_mapped[sub_id]) == sorted(occurrences)
+
+
+def test_rand_esu_full_sampling():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    esu_sub_graphs = ESU(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    rand_esu = RandESU(network.graph, isomorphic_mapping, sampling_fraction=1.0)
+    rand_esu_sub_graphs = rand_esu.search_sub_graphs(k=k, allow_self_loops=False)
+    assert rand_esu_sub_graphs.fsl == esu_sub_graphs.fsl
+    assert rand_esu_sub_graphs.explored_fraction == 1.0
+    assert all(error == 0 for error in rand_esu_sub_graphs.standard_error.values())
+
+
+def test_rand_esu_default_rounds():
+    """
+    without a stopping criterion the sampling stops after the minimum number of rounds
+    """
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=3, polarity_options=[]).isomorphic_mapping
+
+    rand_esu = RandESU(network.graph, isomorphic_mapping)
+    assert rand_esu.search_sub_graphs(k=3, allow_self_loops=False).rounds == rand_esu.min_rounds
+
+
+def test_counts_only():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    for algo, mapping in [(ESU, isomorphic_mapping), (MFinderInduced, isomorphic_mapping), (ESU, {})]:
+        full = algo(network.graph, mapping).search_sub_graphs(k=k, allow_self_loops=False)
+        counts = algo(network.graph, mapping).search_sub_graphs(k=k, allow_self_loops=False, counts_only=True)
+        assert counts.fsl == full.fsl
+        assert not any(counts.fsl_fully_mapped.values())
+
+    sim = SingleInputModule(network.graph)
+    full = sim.search_sub_graphs(min_control_size=2, max_control_size=4)
+    counts = sim.search_sub_graphs(min_control_size=2, max_control_size=4, counts_only=True)
+    assert counts.fsl == full.fsl
+    assert [len(full.fsl_fully_mapped[sim_id]) for sim_id in full.fsl] == list(full.fsl.values())
+
+
+def test_triadic_census():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    triadic_census = nx.triadic_census(network.graph)
+    census = TriadicCensus(network.graph, isomorphic_mapping)
+    expected = {motif_id: triadic_census[key] for key, motif_id in census.triadic_key_to_motif_id.items()}
+    assert census.search_sub_graphs(k=k, allow_self_loops=False, counts_only=True).fsl == expected
+
+    full = census.search_sub_graphs(k=k, allow_self_loops=False)
+    assert full.fsl == expected
+    esu_sub_graphs = ESU(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    for sub_id, occurrences in esu_sub_graphs.fsl_fully_mapped.items():
+        assert sorted(full.fsl_fully_mapped[sub_id]) == sorted(occurrences)
+
+    graph = nx.DiGraph([(1, 2), (1, 1), (1, 3), (3, 2), (3, 4), (4, 4), (2, 3), (4, 1), (5, 4), (5, 5)])
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[], allow_self_loops=True).isomorphic_mapping
+    self_loops = TriadicCensus(graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=True)
+    assert self_loops.fsl == ESU(graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=True).fsl
+
+
+def test_tetrad_census():
+    k = 4
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    tetrad_census = TetradCensus(network.graph, isomorphic_mapping)
+    full = tetrad_census.search_sub_graphs(k=k, allow_self_loops=False)
+    assert tetrad_census.search_sub_graphs(k=k, allow_self_loops=False, counts_only=True).fsl == full.fsl
+    fanmod_sub_graphs = FanmodESU(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    assert full.fsl == fanmod_sub_graphs.fsl
+    for sub_id, occurrences in fanmod_sub_graphs.fsl_fully_mapped.items():
+        assert sorted(full.fsl_fully_mapped[sub_id]) == sorted(occurrences)
+
+    # every shape of a connected 4 nodes set: star, path, paw, cycle, diamond and clique
+    graph = nx.DiGraph([(1, 2), (2, 3), (3, 4), (4, 1), (1, 3), (5, 1), (6, 5), (7, 6), (7, 5), (8, 7), (2, 2)])
+    for allow_self_loops in [False, True]:
+        expected = ESU(graph, {}).search_sub_graphs(k=k, allow_self_loops=allow_self_loops)
+        actual = TetradCensus(graph, {}).search_sub_graphs(k=k, allow_self_loops=allow_self_loops)
+        assert actual.fsl == expected.fsl
+
+
+def test_netsci_wrapper():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    def edge_sets(occurrences):
+        return sorted(tuple(sorted(sub_graph)) for sub_graph in occurrences)
+
+    netsci = NetsciWrapper(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    census = TriadicCensus(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    assert netsci.fsl == census.fsl
+    for sub_id, occurrences in census.fsl_fully_mapped.items():
+        assert edge_sets(netsci.fsl_fully_mapped[sub_id]) == edge_sets(occurrences)
+
+    # the native (sparse) path keeps the motif keys order
+    native = NetsciWrapper(network.graph, isomorphic_mapping)
+    native.max_dense_nodes = 0
+    for counts_only in [True, False]:
+        native_sub_graphs = native.search_sub_graphs(k=k, allow_self_loops=False, counts_only=counts_only)
+        assert list(native_sub_graphs.fsl.items()) == list(netsci.fsl.items())
+    # the native path shares the wrapper's compact graph
+    assert native.triadic_census.graph is native.graph
+
+    # the self loops are ignored, or counted by the native path
+    graph = nx.DiGraph([(1, 2), (1, 1), (1, 3), (3, 2), (3, 4), (4, 4), (2, 3), (4, 1), (5, 4), (5, 5)])
+    netsci = NetsciWrapper(graph, {}).search_sub_graphs(k=k, allow_self_loops=False)
+    assert netsci.fsl == TriadicCensus(graph, {}).search_sub_graphs(k=k, allow_self_loops=False).fsl
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[], allow_self_loops=True).isomorphic_mapping
+    self_loops = NetsciWrapper(graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=True)
+    assert self_loops.fsl == ESU(graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=True).fsl
+
+
+def test_mfinder_memo():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    for algo in [MFinderInduced, MFinderNoneInduced]:
+        mfinder = algo(network.graph, isomorphic_mapping)
+        first = mfinder.search_sub_graphs(k=k, allow_self_loops=False)
+        # the memo is scoped to a single search: the same instance can be reused
+        assert mfinder.search_sub_graphs(k=k, allow_self_loops=False).fsl == first.fsl
+        assert not mfinder.hash_ and not mfinder.unique
+
+        bounded = algo(network.graph, isomorphic_mapping, memo_size=10).search_sub_graphs(k=k, allow_self_loops=False)
+        assert bounded.fsl == first.fsl
+
+
+def test_specific_sub_graphs():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_none_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    specific = SpecificSubGraphs(network.graph, isomorphic_mapping)
+    full = specific.search_sub_graphs(k=k, allow_self_loops=False)
+    assert specific.search_sub_graphs(k=k, allow_self_loops=False, counts_only=True).fsl == full.fsl
+    mfinder = MFinderNoneInduced(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    for sub_id in full.fsl:
+        assert sorted(full.fsl_fully_mapped[sub_id]) == sorted(mfinder.fsl_fully_mapped[sub_id])
+
+    graph = nx.DiGraph([(1, 2), (2, 1), (1, 3), (3, 1), (2, 3), (1, 4), (1, 5), (2, 4), (2, 5), (3, 4), (3, 5)])
+    assert SpecificSubGraphs(graph, {}).search_sub_graphs(k=2, allow_self_loops=False).fsl == {6: 2}
+    bi_fans = SpecificSubGraphs(graph, {}).search_sub_graphs(k=4, allow_self_loops=False)
+    assert bi_fans.fsl == {204: 7}
+    assert len(set(bi_fans.fsl_fully_mapped[204])) == 7
+
+
+def test_disk_occurrence_sink(tmp_path):
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    memory_sub_graphs = ESU(network.graph, isomorphic_mapping).search_sub_graphs(k=k, allow_self_loops=False)
+    esu = ESU(network.graph, isomorphic_mapping)
+    esu.occurrence_sink = DiskOccurrenceSink(str(tmp_path), chunk_size=100)
+    disk_sub_graphs = esu.search_sub_graphs(k=k, allow_self_loops=False)
+
+    assert disk_sub_graphs.fsl == memory_sub_graphs.fsl
+    for sub_id, occurrences in memory_sub_graphs.fsl_fully_mapped.items():
+        view = disk_sub_graphs.fsl_fully_mapped[sub_id]
+        assert len(view) == len(occurrences)
+        assert list(view) == list(occurrences)
+        # a pickled view reads the occurrences back from the files
+        assert list(pickle.loads(pickle.dumps(view))) == list(occurrences)
+
+
+def test_disk_occurrence_sink_directory(tmp_path):
+    """
+    a search replaces the files of the previous search in its directory, and refuses other occurrence files
+    """
+    graph = nx.DiGraph([(0, 1), (0, 2), (1, 2), (2, 3)])
+    (tmp_path / 'notes.txt').write_text('kept')
+    for _ in range(2):
+        esu = ESU(graph, {})
+        esu.occurrence_sink = DiskOccurrenceSink(str(tmp_path))
+        sub_graphs = esu.search_sub_graphs(k=3, allow_self_loops=False)
+        assert {sub_id: len(view) for sub_id, view in sub_graphs.fsl_fully_mapped.items()} == sub_graphs.fsl
+    assert (tmp_path / 'notes.txt').read_text() == 'kept'
+
+    other_directory = tmp_path / 'other'
+    other_directory.mkdir()
+    (other_directory / '6.occ').write_bytes(b'')
+    esu = ESU(graph, {})
+    esu.occurrence_sink = DiskOccurrenceSink(str(other_directory))
+    with pytest.raises(Exception):
+        esu.search_sub_graphs(k=3, allow_self_loops=False)
+    assert (other_directory / '6.occ').exists()
+
+
+def test_occurrences_role_order():
+    k = 3
+    loader = NetworkLoader(simple_input_args)
+    network = loader.load_network_file(file_path=paper_ecoli_induced[0], input_type=NetworkInputType.simple_adj_txt)
+    isomorphic_mapping = IsomorphicMotifMatch(k=k, polarity_options=[]).isomorphic_mapping
+
+    for mapping in [isomorphic_mapping, {}]:
+        sub_graphs = ESU(network.graph, mapping).search_sub_graphs(k=k, allow_self_loops=False)
+        for sub_id, occurrences in sub_graphs.fsl_fully_mapped.items():
+            assert isinstance(occurrences, Occurrences)
+            assert len(occurrences) == sub_graphs.fsl[sub_id]
+            assert occurrences.nbytes == len(occurrences) * k * 4
+            # each row is in the role order of the motif id: the induced sub graph edges are its role pattern
+            for row, sub_graph in zip(occurrences.nodes.tolist(), occurrences):
+                names = [occurrences.names[v] for v in row]
+                assert set(nx.induced_subgraph(network.graph, names).edges) == set(sub_graph)
+                assert sub_graph == tuple((names[s], names[t]) for s, t in occurrences.role_pattern)
+
+            half = len(occurrences) // 2
+            merged = Occurrences.concatenate([occurrences[:half], occurrences[half:]])
+            assert list(merged) == list(occurrences)
+            assert occurrences[-1] == list(occurrences)[-1]
@@ -1,6 +1,9 @@
 from argparse import Namespace
+from typing import Optional
+
 from utils.simple_logger import Logger
-from utils.types import Motif, MotifCriteriaResults, MotifCriteriaArgs, SubGraphAlgoName, RandomGeneratorAlgoName
+from utils.types import Motif, MotifCriteriaResults, MotifCriteriaArgs, SubGraphAlgoName, RandomGeneratorAlgoName, \
+    RandomNetworkSearchResult
 from tabulate import tabulate
 
 logger = Logger()
@@ -82,6 +85,11 @@ def log_sub_graph_args(args: Namespace):
         logger.info(f'Using isomorphic mapping: True')
 
     logger.info(f'SIM sub graph search using max-control size: {args.sim}')
+    if 'dor' in args and args.dor:
+        logger.info(f'DOR sub graph search using min inputs: {args.dor_min_inputs}, min targets: '
+                    f'{args.dor_min_targets}, min density: {args.dor_min_density}')
+    if 'multi_output_ffl' in args and args.multi_output_ffl:
+        logger.info(f'Multi-output FFL sub graph search using min outputs: {args.mffl_min_outputs}')
     logger.info(f'Allow self loops: {args.allow_self_loops}')
 
     if 'filter_nerve_ring_neurons' in args:
@@ -96,6 +104,44 @@ def log_randomizer_args(args: Namespace):
     random_generator_algo_choice = RandomGeneratorAlgoName(args.randomizer)
     logger.info(f'\nRandomizer: using {random_generator_algo_choice} algorithm')
     logger.info(f'Randomizer: generating {args.network_amount} random networks')
+    if 'ensemble_workers' in args and args.ensemble_workers > 1:
+        logger.info(f'Randomizer: generating and searching the random networks on {args.ensemble_workers} workers')
     if random_generator_algo_choice in [RandomGeneratorAlgoName.markov_chain_switching,
-                                        RandomGeneratorAlgoName.nerve_ring_markov_chain_switching]:
+                                        RandomGeneratorAlgoName.nerve_ring_markov_chain_switching,
+                                        RandomGeneratorAlgoName.batched_markov_chain_switching]:
         logger.info(f'Markov chain switch factor: {args.switch_factor}')
+        if random_generator_algo_choice == RandomGeneratorAlgoName.nerve_ring_markov_chain_switching and \
+                'distance_threshold' in args:
+            distance_matrix = args.distance_matrix or 'nerve ring distances'
+            logger.info(f'Markov chain: distance matrix: {distance_matrix}, threshold: {args.distance_threshold}')
+        if 'mixing_window' in args and args.mixing_window:
+            logger.info(f'Markov chain: adaptive switch factor, mixing window: {args.mixing_window}, '
+                        f'tolerance: {args.mixing_tolerance}')
+
+
+def log_incremental_census(disabled_reason: Optional[str]):
+    if disabled_reason is None:
+        logger.info('Markov chain: using an incremental k=3 census')
+    else:
+        logger.info(f'Markov chain: the incremental k=3 census is disabled: {disabled_reason}')
+
+
+def log_random_network_results(random_network_results: list[RandomNetworkSearchResult]):
+    """
+    the randomizer statistics, collected from the random networks (of any process of the ensemble pipeline)
+    """
+    if not random_network_results:
+        return
+    iterations = [res.iterations for res in random_network_results if res.iterations is not None]
+    if iterations:
+        success_switches = sum(res.success_switches for res in random_network_results if res.iterations is not None)
+        logger.info(f'Markov chain iterations: {round(sum(iterations) / len(iterations), 2)}')
+        logger.info(f'Markov chain success ratio: {round(success_switches / max(sum(iterations), 1), 5)}')
+
+    switch_factors = [res.switch_factor for res in random_network_results if res.switch_factor is not None]
+    if switch_factors:
+        logger.info(f'Markov chain effective switch factor: mean: {round(sum(switch_factors) / len(switch_factors), 2)} '
+                    f'min: {min(switch_factors)} max: {max(switch_factors)}')
+
+    avg_edges = sum(res.edges for res in random_network_results) / len(random_network_results)
+    logger.info(f'average # edges of all random networks: {round(avg_edges, 3)}')
@@ -5,11 +5,13 @@ from typing import Union
 import networkx as nx
 
 from utils.common import sort_dict_freq
+from utils.occurrence_sink import iter_occurrence_chunks, OccurrencesView
+from utils.occurrences import Occurrences, get_role_name
 from isomorphic.isomorphic import get_sub_graph_mapping_to_motif
 from utils.types import Motif
 
 
-def sort_node_appearances_in_sub_graph(appearances: list[tuple[tuple]],
+def sort_node_appearances_in_sub_graph(appearances: Union[list[tuple[tuple]], Occurrences, OccurrencesView],
                                        neuron_names: list) -> dict[Union[int, str], int]:
     """
     :param appearances: the sub graphs appearances of a given motif
@@ -17,12 +19,19 @@ def sort_node_appearances_in_sub_graph(appearances: list[tuple[tuple]],
     :return: a sorted dict - each key is a node and the value is it frequency
     """
     nodes_count = defaultdict(int)
-    for sub_graph in appearances:
-        graph = nx.DiGraph()
-        graph.add_edges_from(sub_graph)
-        for n in list(graph.nodes):
-            node = neuron_names[n] if neuron_names else n
-            nodes_count[node] += 1
+    for chunk in iter_occurrence_chunks(appearances):
+        if isinstance(chunk, Occurrences):
+            for n, count in chunk.count_nodes().items():
+                node = neuron_names[n] if neuron_names else n
+                nodes_count[node] += count
+            continue
+
+        for sub_graph in chunk:
+            graph = nx.DiGraph()
+            graph.add_edges_from(sub_graph)
+            for n in list(graph.nodes):
+                node = neuron_names[n] if neuron_names else n
+                nodes_count[node] += 1
 
     return sort_dict_freq(nodes_count)
 
@@ -30,7 +39,7 @@ def sort_node_appearances_in_sub_graph(appearances: list[tuple[tuple]],
 # TODO: Add new role function: generalization roles to nodes (uri alon 2004): E.g in the fan out, 2 nodes have the same
 #  role ‘a’
 
-def sort_node_roles_in_sub_graph(appearances: list[tuple[tuple]],
+def sort_node_roles_in_sub_graph(appearances: Union[list[tuple[tuple]], Occurrences, OccurrencesView],
                                  neuron_names: list,
                                  motif: Motif
                                  ) -> dict[str, dict]:
@@ -40,15 +49,24 @@ def sort_node_roles_in_sub_graph(appearances: list[tuple[tuple]],
     :param motif: motif object with roles: list of tuples with the pattern of roles of the motif
     :return: dict, where each key is role, and the value is a sorted dict based on appearances of that role
     """
-    node_roles = defaultdict(list)
-    for sub_graph in appearances:
-        nodes_in_sub_graph = get_sub_graph_mapping_to_motif(sub_graph, motif.role_pattern, motif.polarity)
-        for role, n in nodes_in_sub_graph.items():
-            node = neuron_names[n] if neuron_names else n
-            node_roles[role].append(node)
+    node_roles = defaultdict(collections.Counter)
+    for chunk in iter_occurrence_chunks(appearances):
+        if isinstance(chunk, Occurrences):
+            # the columns are already in the role order
+            for role in range(chunk.k):
+                for n, count in chunk.count_nodes(role).items():
+                    node = neuron_names[n] if neuron_names else n
+                    node_roles[get_role_name(role)][node] += count
+            continue
+
+        for sub_graph in chunk:
+            nodes_in_sub_graph = get_sub_graph_mapping_to_motif(sub_graph, motif.role_pattern, motif.polarity)
+            for role, n in nodes_in_sub_graph.items():
+                node = neuron_names[n] if neuron_names else n
+                node_roles[role][node] += 1
 
     freq_node_roles = {}
     for role in node_roles:
-        freq_node_roles[str(role)] = sort_dict_freq(dict(collections.Counter(node_roles[role])))
+        freq_node_roles[str(role)] = sort_dict_freq(dict(node_roles[role]))
 
     return freq_node_roles
@@ -0,0 +1,346 @@
+import os
+import pickle
+from abc import ABCMeta, abstractmethod
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from utils.common import get_edges_from_id
+from utils.occurrences import EdgePolarity, Occurrences
+
+OCCURRENCES_CHUNK_SIZE = 1 << 16
+
+
+def get_record_dtype(k: int) -> np.dtype:
+    """
+    a fixed width occurrence record: the node indices of the sub graph, in the role order of its motif id
+    """
+    return np.dtype([('nodes', '<i4', (k,))])
+
+
+class OccurrenceSink(metaclass=ABCMeta):
+    """
+    Stores the occurrences (sub graphs) found by an enumerator, per motif id (isomorphic representative).
+    An occurrence is kept as a record of node indices (of the compact graph) in the role order of the motif id,
+    and is read back as an Occurrences container, chunk by chunk.
+    """
+
+    def __init__(self):
+        self.k = -1
+        self.nodes: list = []  # node index -> node name
+        self.polarity: Optional[EdgePolarity] = None  # edges polarity, for polarity networks
+
+    def reset(self, k: int, nodes: list, polarity: Optional[EdgePolarity] = None):
+        """
+        start a new search
+        :param k: motif size
+        :param nodes: the node names, by their index
+        :param polarity: the edges polarity for polarity networks, None otherwise
+        """
+        self.k = k
+        self.nodes = nodes
+        self.polarity = polarity
+
+    @abstractmethod
+    def add(self, sub_id: int, nodes: list[int]):
+        """
+        :param sub_id: the motif id (isomorphic representative)
+        :param nodes: the node indices of the occurrence, in the role order of sub_id
+        """
+        pass
+
+    @abstractmethod
+    def add_records(self, sub_id: int, nodes: np.ndarray):
+        """
+        :param nodes: (n, k) array of node indices, in the role order of sub_id
+        """
+        pass
+
+    def flush(self):
+        pass
+
+    @abstractmethod
+    def count(self, sub_id: int) -> int:
+        pass
+
+    @abstractmethod
+    def sub_ids(self) -> list[int]:
+        pass
+
+    @abstractmethod
+    def iter_records(self, sub_id: int, chunk_size: int = OCCURRENCES_CHUNK_SIZE) -> Iterator[np.ndarray]:
+        """
+        :return: generator of (n, k) node arrays chunks
+        """
+        pass
+
+    def decode(self, sub_id: int, nodes: np.ndarray) -> Occurrences:
+        """
+        :return: the occurrences container of the records
+        """
+        role_pattern = get_edges_from_id(sub_id, self.k)
+        if self.polarity is None:
+            return Occurrences(nodes, role_pattern, self.nodes)
+
+        polarity = np.empty((len(nodes), len(role_pattern)), dtype=np.int8)
+        for i, (s, t) in enumerate(role_pattern):
+            polarity[:, i] = self.polarity.get_codes(nodes[:, s], nodes[:, t])
+        return Occurrences(nodes, role_pattern, self.nodes, polarity, self.polarity.values)
+
+    def iter_chunks(self, sub_id: int, chunk_size: int = OCCURRENCES_CHUNK_SIZE) -> Iterator[Occurrences]:
+        for nodes in self.iter_records(sub_id, chunk_size):
+            yield self.decode(sub_id, nodes)
+
+    def get_occurrences(self, sub_id: int) -> Occurrences:
+        """
+        :return: all the occurrences of sub_id in a single (in memory) container
+        """
+        chunks = list(self.iter_chunks(sub_id))
+        if not chunks:
+            return self.decode(sub_id, np.empty((0, self.k), dtype=np.int32))
+        return Occurrences.concatenate(chunks)
+
+    def view(self, sub_id: int) -> Union[Occurrences, 'OccurrencesView']:
+        return OccurrencesView(self, sub_id)
+
+    def views(self) -> dict[int, Union[Occurrences, 'OccurrencesView']]:
+        return {sub_id: self.view(sub_id) for sub_id in self.sub_ids()}
+
+
+class MemoryOccurrenceSink(OccurrenceSink):
+    """
+    Keeps the records in memory, the views are (compact) Occurrences containers
+    """
+
+    def __init__(self):
+        super().__init__()
+        # motif id -> (pending rows, node arrays)
+        self.records: dict[int, tuple[list, list]] = {}
+
+    def reset(self, k: int, nodes: list, polarity: Optional[EdgePolarity] = None):
+        super().reset(k, nodes, polarity)
+        self.records = defaultdict(lambda: ([], []))
+
+    def add(self, sub_id: int, nodes: list[int]):
+        self.records[sub_id][0].append(nodes)
+
+    def add_records(self, sub_id: int, nodes: np.ndarray):
+        self.__consolidate(sub_id)
+        self.records[sub_id][1].append(np.asarray(nodes, dtype=np.int32))
+
+    def __consolidate(self, sub_id: int):
+        rows, arrays = self.records[sub_id]
+        if rows:
+            arrays.append(np.array(rows, dtype=np.int32).reshape(-1, self.k))
+            rows.clear()
+
+    def count(self, sub_id: int) -> int:
+        if sub_id not in self.records:
+            return 0
+        rows, arrays = self.records[sub_id]
+        return len(rows) + sum(len(nodes) for nodes in arrays)
+
+    def sub_ids(self) -> list[int]:
+        return list(self.records)
+
+    def iter_records(self, sub_id: int, chunk_size: int = OCCURRENCES_CHUNK_SIZE) -> Iterator[np.ndarray]:
+        if sub_id not in self.records:
+            return
+        self.__consolidate(sub_id)
+        for nodes in self.records[sub_id][1]:
+            for start in range(0, len(nodes), chunk_size):
+                yield nodes[start:start + chunk_size]
+
+    def get_occurrences(self, sub_id: int) -> Occurrences:
+        occurrences = super().get_occurrences(sub_id)
+        if sub_id in self.records:
+            # keep a single array, shared with the returned container
+            self.records[sub_id] = ([], [occurrences.nodes])
+        return occurrences
+
+    def view(self, sub_id: int) -> Occurrences:
+        return self.get_occurrences(sub_id)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['records'] = dict(self.records)
+        return state
+
+
+class DiskOccurrenceSink(OccurrenceSink):
+    """
+    Appends the occurrence records of each motif id to its own binary file: {directory}/{motif id}.occ
+    file format: a header (magic, version, k, record size) followed by fixed width records (see get_record_dtype),
+    written in chunks. the node names, the edges polarity and the motif ids written are kept in {directory}/meta.pkl
+    a new search removes only the files of the previous search (listed in the meta), and refuses a directory that
+    holds other occurrence files.
+    pickling the sink (e.g.: as a part of the exported results) keeps a reference to the directory only.
+    """
+    magic = b'NMOCCS'
+    version = 2
+    header_dtype = np.dtype([('magic', 'S6'), ('version', '<u2'), ('k', '<u4'), ('record_size', '<u4')])
+    meta_file_name = 'meta.pkl'
+
+    def __init__(self, directory: str, chunk_size: int = OCCURRENCES_CHUNK_SIZE):
+        super().__init__()
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.counts: dict[int, int] = {}
+        self.buffers: dict[int, list] = {}
+        self.meta_loaded = True
+        # the motif ids with a file in the directory
+        self.files: list[int] = []
+
+    def __file_path(self, sub_id: int) -> str:
+        return os.path.join(self.directory, f'{sub_id}.occ')
+
+    def reset(self, k: int, nodes: list, polarity: Optional[EdgePolarity] = None):
+        super().reset(k, nodes, polarity)
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, self.meta_file_name)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'rb') as f:
+                previous_files = pickle.load(f).get('files', [])
+            for sub_id in previous_files:
+                if os.path.exists(self.__file_path(sub_id)):
+                    os.remove(self.__file_path(sub_id))
+        other_files = [file_name for file_name in os.listdir(self.directory) if file_name.endswith('.occ')]
+        if other_files:
+            raise Exception(f'The occurrences directory {self.directory} holds occurrence files that were not '
+                            f'written by its last search (e.g.: {other_files[0]}), use another directory')
+
+        self.files = []
+        self.__write_meta()
+        self.counts = defaultdict(int)
+        self.buffers = defaultdict(list)
+
+    def __write_meta(self):
+        with open(os.path.join(self.directory, self.meta_file_name), 'wb') as f:
+            pickle.dump({'k': self.k, 'nodes': self.nodes, 'polarity': self.polarity, 'files': self.files}, f)
+
+    def __write(self, sub_id: int, nodes: np.ndarray):
+        records = np.empty(len(nodes), dtype=get_record_dtype(self.k))
+        records['nodes'] = nodes
+        file_path = self.__file_path(sub_id)
+        is_new = not os.path.exists(file_path)
+        if is_new:
+            # listed before it is written: a failed search leaves no unlisted files
+            self.files.append(sub_id)
+            self.__write_meta()
+        with open(file_path, 'ab') as f:
+            if is_new:
+                header = np.array([(self.magic, self.version, self.k, records.dtype.itemsize)], dtype=self.header_dtype)
+                header.tofile(f)
+            records.tofile(f)
+
+    def __flush_buffer(self, sub_id: int):
+        rows = self.buffers.pop(sub_id, [])
+        if rows:
+            self.__write(sub_id, np.array(rows, dtype=np.int32).reshape(-1, self.k))
+
+    def add(self, sub_id: int, nodes: list[int]):
+        rows = self.buffers[sub_id]
+        rows.append(nodes)
+        self.counts[sub_id] += 1
+        if len(rows) >= self.chunk_size:
+            self.__flush_buffer(sub_id)
+
+    def add_records(self, sub_id: int, nodes: np.ndarray):
+        self.__flush_buffer(sub_id)
+        self.__write(sub_id, nodes)
+        self.counts[sub_id] += len(nodes)
+
+    def flush(self):
+        for sub_id in list(self.buffers):
+            self.__flush_buffer(sub_id)
+
+    def count(self, sub_id: int) -> int:
+        return self.counts.get(sub_id, 0)
+
+    def sub_ids(self) -> list[int]:
+        return list(self.counts)
+
+    def __load_meta(self):
+        if self.meta_loaded:
+            return
+        with open(os.path.join(self.directory, self.meta_file_name), 'rb') as f:
+            meta = pickle.load(f)
+        self.k, self.nodes, self.polarity = meta['k'], meta['nodes'], meta['polarity']
+        self.meta_loaded = True
+
+    def iter_records(self, sub_id: int, chunk_size: int = OCCURRENCES_CHUNK_SIZE) -> Iterator[np.ndarray]:
+        self.flush()
+        self.__load_meta()
+        if not self.count(sub_id):
+            return
+
+        with open(self.__file_path(sub_id), 'rb') as f:
+            header = np.fromfile(f, dtype=self.header_dtype, count=1)[0]
+            if header['magic'] != self.magic or header['version'] != self.version:
+                raise Exception(f'Invalid occurrences file: {self.__file_path(sub_id)}')
+            dtype = get_record_dtype(int(header['k']))
+            while True:
+                records = np.fromfile(f, dtype=dtype, count=chunk_size)
+                if not len(records):
+                    break
+                yield records['nodes']
+
+    def decode(self, sub_id: int, nodes: np.ndarray) -> Occurrences:
+        self.__load_meta()
+        return super().decode(sub_id, nodes)
+
+    def __getstate__(self):
+        self.flush()
+        return {'directory': self.directory, 'chunk_size': self.chunk_size, 'counts': dict(self.counts),
+                'k': self.k, 'nodes': [], 'polarity': None, 'buffers': {}, 'meta_loaded': False,
+                'files': list(self.files)}
+
+
+class OccurrencesView:
+    """
+    A read only, lazy sequence of the occurrences of a single motif id in a sink.
+    iterating it decodes the occurrences chunk by chunk.
+    """
+
+    def __init__(self, sink: OccurrenceSink, sub_id: int):
+        self.sink = sink
+        self.sub_id = sub_id
+
+    def __len__(self) -> int:
+        return self.sink.count(self.sub_id)
+
+    def __iter__(self) -> Iterator[tuple]:
+        for chunk in self.chunks():
+            yield from chunk
+
+    def chunks(self, chunk_size: int = OCCURRENCES_CHUNK_SIZE) -> Iterator[Occurrences]:
+        return self.sink.iter_chunks(self.sub_id, chunk_size)
+
+    def load(self) -> Occurrences:
+        """
+        :return: all the occurrences in a single (in memory) container
+        """
+        return self.sink.get_occurrences(self.sub_id)
+
+
+def iter_occurrence_chunks(appearances: Union[Iterable[tuple], Occurrences, OccurrencesView],
+                           chunk_size: int = OCCURRENCES_CHUNK_SIZE) -> Iterator[Union[list[tuple], Occurrences]]:
+    """
+    :param appearances: the sub graphs appearances: a list, an occurrences container or a view of an occurrence sink
+    :return: generator of chunks: occurrences containers, or lists of sub graphs (in the edges tuple format)
+    """
+    if isinstance(appearances, OccurrencesView):
+        yield from appearances.chunks(chunk_size)
+    elif isinstance(appearances, (list, Occurrences)):
+        for start in range(0, len(appearances), chunk_size):
+            yield appearances[start:start + chunk_size]
+    else:
+        chunk = []
+        for sub_graph in appearances:
+            chunk.append(sub_graph)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
@@ -0,0 +1,192 @@
+from typing import Iterator, Optional, Sequence, Union
+
+import numpy as np
+from networkx import DiGraph
+
+from networks.compact_graph import CompactGraph
+
+ASCII_START = 97
+DECODE_CHUNK_SIZE = 1 << 14
+
+
+class EdgePolarity:
+    """
+    The polarity of the network edges as int8 codes (indices of values),
+    kept sorted by the compact graph edge key: u * n + v
+    """
+
+    def __init__(self, n: int, edge_keys: np.ndarray, codes: np.ndarray, values: list[str]):
+        self.n = n
+        self.edge_keys = edge_keys
+        self.codes = codes
+        self.values = values
+
+    @staticmethod
+    def from_network(graph: CompactGraph, network: DiGraph) -> 'EdgePolarity':
+        """
+        :param graph: the compact graph of the network (the node indices)
+        :param network: the network, each edge has a polarity attribute
+        """
+        polarity = [pol for _, _, pol in network.edges(data='polarity')]
+        values = sorted(set(polarity))
+        value_code = {value: i for i, value in enumerate(values)}
+        # the compact graph edges (src, dst) are in the order of network.edges
+        keys = graph.src * graph.n + graph.dst
+        order = np.argsort(keys)
+        codes = np.array([value_code[pol] for pol in polarity], dtype=np.int8)
+        return EdgePolarity(graph.n, keys[order], codes[order], values)
+
+    def get_codes(self, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        """
+        :param src: array of source node indices
+        :param dst: array of target node indices (same shape as src), all (src, dst) must be edges of the network
+        :return: int8 array of the polarity codes
+        """
+        keys = np.asarray(src, dtype=np.int64) * self.n + np.asarray(dst, dtype=np.int64)
+        return self.codes[np.searchsorted(self.edge_keys, keys)]
+
+
+class Occurrences:
+    """
+    Columnar container of the occurrences (sub graphs) of a single motif:
+    - nodes: int32 (n_occurrences, k) node indices in the motif's role order, i.e.: column i plays role chr(97 + i)
+    - polarity: optional int8 (n_occurrences, n_edges) codes (indices of polarity_values) of the edges polarity,
+      in the role pattern order
+    - names: node index -> node name (shared by all the containers of a search)
+    - role_pattern: the motif edges in role positions: e.g.: [(0, 1), (0, 2)]
+
+    for backward compatibility, iterating / indexing (by an int) gives the occurrences in the edges tuple format:
+    ((s, t), ...) or ((s, t, {'polarity': p}), ...), decoded lazily. slicing returns a container.
+    """
+
+    def __init__(self,
+                 nodes: np.ndarray,
+                 role_pattern: Sequence[tuple[int, int]],
+                 names: list,
+                 polarity: Optional[np.ndarray] = None,
+                 polarity_values: Optional[list[str]] = None):
+        self.role_pattern = tuple(tuple(edge) for edge in role_pattern)
+        self.nodes = np.asarray(nodes, dtype=np.int32)
+        self.names = names
+        self.polarity = None if polarity is None else np.asarray(polarity, dtype=np.int8)
+        self.polarity_values = polarity_values
+
+    @staticmethod
+    def empty(k: int,
+              role_pattern: Sequence[tuple[int, int]],
+              names: list,
+              polarity_values: Optional[list[str]] = None) -> 'Occurrences':
+        polarity = None if polarity_values is None else np.empty((0, len(role_pattern)), dtype=np.int8)
+        return Occurrences(np.empty((0, k), dtype=np.int32), role_pattern, names, polarity, polarity_values)
+
+    @staticmethod
+    def concatenate(occurrences: Sequence['Occurrences']) -> 'Occurrences':
+        """
+        :param occurrences: non empty list of containers of the same motif (role pattern) and nodes names
+        """
+        first = occurrences[0]
+        if any(occ.role_pattern != first.role_pattern for occ in occurrences):
+            raise Exception('Cannot concatenate occurrences of different role patterns')
+        if len(occurrences) == 1:
+            return first
+
+        polarity = None
+        if first.polarity is not None:
+            polarity = np.concatenate([occ.polarity for occ in occurrences])
+        return Occurrences(np.concatenate([occ.nodes for occ in occurrences]), first.role_pattern, first.names,
+                           polarity, first.polarity_values)
+
+    @property
+    def k(self) -> int:
+        return self.nodes.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.nodes.nbytes + (0 if self.polarity is None else self.polarity.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __getitem__(self, index: Union[int, slice, np.ndarray]) -> Union[tuple, 'Occurrences']:
+        if isinstance(index, (int, np.integer)):
+            return self.__decode(self.nodes[index:index + 1 or None],
+                                 None if self.polarity is None else self.polarity[index:index + 1 or None])[0]
+
+        polarity = None if self.polarity is None else self.polarity[index]
+        return Occurrences(self.nodes[index], self.role_pattern, self.names, polarity, self.polarity_values)
+
+    def __iter__(self) -> Iterator[tuple]:
+        for start in range(0, len(self), DECODE_CHUNK_SIZE):
+            end = start + DECODE_CHUNK_SIZE
+            yield from self.__decode(self.nodes[start:end], None if self.polarity is None else self.polarity[start:end])
+
+    def __repr__(self) -> str:
+        return f'Occurrences(n={len(self)}, k={self.k}, role_pattern={self.role_pattern})'
+
+    def __decode(self, nodes: np.ndarray, polarity: Optional[np.ndarray]) -> list[tuple]:
+        names = self.names
+        rows = nodes.tolist()
+        if polarity is None:
+            return [tuple((names[row[s]], names[row[t]]) for s, t in self.role_pattern) for row in rows]
+
+        values = self.polarity_values
+        return [tuple((names[row[s]], names[row[t]], {'polarity': values[code]})
+                      for (s, t), code in zip(self.role_pattern, codes))
+                for row, codes in zip(rows, polarity.tolist())]
+
+    def with_roles(self, role_order: Sequence[int]) -> 'Occurrences':
+        """
+        :param role_order: an automorphism of the role pattern: role i of the result is played by role
+        role_order[i] of this container
+        :return: the occurrences with permuted roles (columns)
+        """
+        edge_index = {edge: i for i, edge in enumerate(self.role_pattern)}
+        try:
+            edge_order = [edge_index[(role_order[s], role_order[t])] for s, t in self.role_pattern]
+        except KeyError:
+            raise Exception(f'The role order {role_order} is not an automorphism of the role pattern')
+
+        polarity = None if self.polarity is None else self.polarity[:, edge_order]
+        return Occurrences(self.nodes[:, list(role_order)], self.role_pattern, self.names, polarity,
+                           self.polarity_values)
+
+    def get_polarity_ids(self, polarity_options: list[str]) -> np.ndarray:
+        """
+        :param polarity_options: list of polarity options: can be from [+, -, complex]
+        :return: the index of each occurrence polarity vector in product(polarity_options, repeat=n_edges)
+        """
+        if self.polarity is None:
+            raise Exception('The occurrences have no polarity')
+        option_index = {option: i for i, option in enumerate(polarity_options)}
+        codes_lookup = np.array([option_index.get(value, -1) for value in self.polarity_values], dtype=np.int64)
+        options = codes_lookup[self.polarity]
+        if (options < 0).any():
+            raise Exception(f'Polarity is not one of the options: {polarity_options}')
+
+        weights = len(polarity_options) ** np.arange(len(self.role_pattern) - 1, -1, -1, dtype=np.int64)
+        return options @ weights
+
+    def count_nodes(self, role: Optional[int] = None) -> dict[Union[int, str], int]:
+        """
+        :param role: count the nodes of a single role (column), or all the nodes if None
+        :return: dict where the keys are node names and the values are their number of occurrences
+        """
+        nodes = self.nodes if role is None else self.nodes[:, role]
+        indices, counts = np.unique(nodes, return_counts=True)
+        return {self.names[i]: count for i, count in zip(indices.tolist(), counts.tolist())}
+
+    def get_spanning_edges(self) -> list[tuple]:
+        """
+        :return: the distinct edges (node names) connecting the first role to each of the other roles.
+        the occurrences are connected, thus these edges (undirected) keep the connectivity of their union.
+        """
+        if self.k == 1:
+            return [(self.names[v], self.names[v]) for v in np.unique(self.nodes).tolist()]
+        n = len(self.names)
+        src = np.repeat(self.nodes[:, :1], self.k - 1, axis=1).ravel().astype(np.int64)
+        keys = np.unique(src * n + self.nodes[:, 1:].ravel())
+        return [(self.names[s], self.names[t]) for s, t in zip((keys // n).tolist(), (keys % n).tolist())]
+
+
+def get_role_name(role: int) -> str:
+    return chr(role + ASCII_START)
@@ -1,7 +1,11 @@
 import collections
-from typing import Union
+from typing import Optional, Union
+
+import numpy as np
 
 from isomorphic.isomorphic import get_sub_graph_mapping_to_motif, IsomorphicMotifMatch
+from utils.occurrence_sink import iter_occurrence_chunks, OccurrencesView
+from utils.occurrences import Occurrences
 from utils.types import PolarityFrequencies
 from collections import defaultdict
 from itertools import product
@@ -16,7 +20,7 @@ def count_network_polarity_ratio(polarity: list[str]) -> collections.Counter:
     return polarity_frequencies
 
 
-def get_polarity_frequencies(appearances: list[tuple[tuple]],
+def get_polarity_frequencies(appearances: Union[list[tuple[tuple]], Occurrences, OccurrencesView],
                              roles: list[tuple],
                              polarity_options: list[str],
                              motif_id: Union[int, str],
@@ -34,26 +38,40 @@ def get_polarity_frequencies(appearances: list[tuple[tuple]],
     edges = len(roles)
     products = list(product(polarity_options, repeat=edges))
     fsl = defaultdict(list)
+    # for occurrences containers: an empty container of the same motif
+    empty: Optional[Occurrences] = None
+
+    for chunk in iter_occurrence_chunks(appearances):
+        if isinstance(chunk, Occurrences):
+            empty = Occurrences.empty(chunk.k, chunk.role_pattern, chunk.names, chunk.polarity_values)
+            polarity_ids = chunk.get_polarity_ids(polarity_options)
+            order = np.argsort(polarity_ids, kind='stable')
+            unique_ids, starts = np.unique(polarity_ids[order], return_index=True)
+            for polarity_id, rows in zip(unique_ids.tolist(), np.split(order, starts[1:])):
+                fsl[polarity_id].append(chunk[rows])
+            continue
 
-    for sub_graph in appearances:
-        nodes_in_sub_graph = get_sub_graph_mapping_to_motif(sub_graph, roles, [])
-        nodes_in_sub_graph_reverse = {v: k for k, v in nodes_in_sub_graph.items()}
+        for sub_graph in chunk:
+            nodes_in_sub_graph = get_sub_graph_mapping_to_motif(sub_graph, roles, [])
+            nodes_in_sub_graph_reverse = {v: k for k, v in nodes_in_sub_graph.items()}
 
-        sub_graph_polarity = {}
+            sub_graph_polarity = {}
 
-        for s, t, polarity_attr in sub_graph:
-            polarity = polarity_attr['polarity']
-            role_edge = (nodes_in_sub_graph_reverse[s], nodes_in_sub_graph_reverse[t])
-            edge_idx = roles.index(role_edge)
-            sub_graph_polarity[edge_idx] = polarity
+            for s, t, polarity_attr in sub_graph:
+                polarity = polarity_attr['polarity']
+                role_edge = (nodes_in_sub_graph_reverse[s], nodes_in_sub_graph_reverse[t])
+                edge_idx = roles.index(role_edge)
+                sub_graph_polarity[edge_idx] = polarity
 
-        polarity_vec = tuple([sub_graph_polarity[k] for k in sorted(sub_graph_polarity.keys())])
-        polarity_id = products.index(polarity_vec)
-        fsl[polarity_id].append(sub_graph)
+            polarity_vec = tuple([sub_graph_polarity[k] for k in sorted(sub_graph_polarity.keys())])
+            polarity_id = products.index(polarity_vec)
+            fsl[polarity_id].append(sub_graph)
 
     polarity_frequencies = []
     for decimal, polarity_vec in enumerate(products):
         sub_graphs = fsl.get(decimal, [])
+        if empty is not None:
+            sub_graphs = Occurrences.concatenate(sub_graphs) if sub_graphs else empty
         freq = len(sub_graphs)
         polarity_frequencies.append(PolarityFrequencies(frequency=freq, polarity=polarity_vec, sub_graphs=sub_graphs))
 
@@ -23,6 +23,10 @@ class Logger:
             self.file.close()
         self.file = open(file, "w", encoding="utf-8")
 
+    def __reduce__(self):
+        # the logger of the unpickling process (e.g.: a worker of a process pool)
+        return _get_logger, ()
+
     def toggle(self, on: bool):
         self.on = on
 
@@ -43,3 +47,7 @@ class Logger:
         if self.lvl < LogLvl.info:
             return
         self.__print(msg)
+
+
+def _get_logger() -> Logger:
+    return Logger()
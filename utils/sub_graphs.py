@@ -1,27 +1,15 @@
+from functools import cache
+from typing import Union
+
 import networkx as nx
 import numpy as np
 from networkx import DiGraph
-from utils.common import get_decimal_from_bin_vec, get_bin_vec_from_decimal
-from utils.types import MotifName, Motif
-
-
-class HashedGraph:
-    def __init__(self, graph: tuple):
-        self.graph = graph
-
-    def __eq__(self, other):
-        return sorted(self.graph) == sorted(other.graph)
-
-    def __hash__(self):
-        return hash(tuple(sorted(self.graph)))
-
-    def __str__(self):
-        return str(self.graph)
 
-
-def graph_to_hashed_graph(g: DiGraph) -> HashedGraph:
-    graph_tuple = tuple(list(g.edges))
-    return HashedGraph(graph_tuple)
+from networks.compact_graph import CompactGraph
+from utils.common import get_edges_from_id
+from utils.occurrence_sink import iter_occurrence_chunks, OccurrencesView
+from utils.occurrences import Occurrences
+from utils.types import MotifName, Motif
 
 
 two_sub_graphs_ids = {
@@ -64,27 +52,103 @@ def get_adjacency_matrix(graph: DiGraph) -> np.ndarray:
     return nx.adjacency_matrix(graph, nodelist=nodes).todense()
 
 
+# Sub graph ids:
+# the id of a sub graph with k nodes is the decimal value of its flattened (row major) adjacency matrix,
+# where the nodes are sorted and the i-th entry of the flattened matrix is the i-th bit.
+# i.e.: the edge between the i-th and the j-th sorted nodes (i -> j) is the bit: i * k + j
+
+@cache
+def get_id_bit_table(k: int) -> tuple[tuple[int, ...], ...]:
+    """
+    :return: position table, table[i][j] is the id bit of the edge i -> j of the sorted nodes
+    """
+    return tuple(tuple(1 << (i * k + j) for j in range(k)) for i in range(k))
+
+
+@cache
+def get_self_loops_mask(k: int) -> int:
+    table = get_id_bit_table(k)
+    return sum(table[i][i] for i in range(k))
+
+
 def get_id(graph: DiGraph) -> int:
-    adj_mat = get_adjacency_matrix(graph)
-    vec = adj_mat.flatten()
-    return get_decimal_from_bin_vec(list(vec))
+    nodes = sorted(graph.nodes)
+    table = get_id_bit_table(len(nodes))
+    position = {node: i for i, node in enumerate(nodes)}
+    sub_id = 0
+    for s, t in graph.edges:
+        sub_id |= table[position[s]][position[t]]
+    return sub_id
+
+
+def get_id_from_nodes(graph: CompactGraph, nodes: list[int]) -> int:
+    """
+    the id of the induced sub graph
+    :param graph: the compact graph of the network
+    :param nodes: sorted node indices of the sub graph
+    """
+    table = get_id_bit_table(len(nodes))
+    edge_keys = graph.edge_keys
+    n = graph.n
+    sub_id = 0
+    for i, u in enumerate(nodes):
+        base = u * n
+        row = table[i]
+        for j, v in enumerate(nodes):
+            if base + v in edge_keys:
+                sub_id |= row[j]
+    return sub_id
+
+
+def get_ids_from_nodes(graph: CompactGraph, nodes: np.ndarray) -> np.ndarray:
+    """
+    vectorized get_id_from_nodes
+    :param graph: the compact graph of the network
+    :param nodes: (n, k) array of node indices, each row is a sub graph (the rows are not required to be sorted)
+    :return: the id of each (induced) sub graph w.r.t the order of its row
+    """
+    k = nodes.shape[1]
+    table = get_id_bit_table(k)
+    sub_ids = np.zeros(len(nodes), dtype=np.int64)
+    for i in range(k):
+        for j in range(k):
+            sub_ids |= graph.has_edges(nodes[:, i], nodes[:, j]) * table[i][j]
+    return sub_ids
+
+
+def get_id_from_edges(edges: tuple[tuple[int, int], ...], nodes: list[int]) -> int:
+    """
+    the id of a (none induced) sub graph given by its edges
+    :param edges: the edges of the sub graph (node indices)
+    :param nodes: sorted node indices of the sub graph
+    """
+    table = get_id_bit_table(len(nodes))
+    position = {node: i for i, node in enumerate(nodes)}
+    sub_id = 0
+    for s, t in edges:
+        sub_id |= table[position[s]][position[t]]
+    return sub_id
 
 
 def get_sub_graph_from_id(decimal: int, k: int) -> DiGraph:
-    bin_digits = get_bin_vec_from_decimal(decimal=decimal, pad_to=k ** 2)
-    bin_digits.reverse()
-    adj_mat = np.array(bin_digits).reshape(k, k)
-    return nx.DiGraph(adj_mat)
+    graph = nx.DiGraph()
+    graph.add_nodes_from(range(k))
+    graph.add_edges_from(get_edges_from_id(decimal, k))
+    return graph
 
 
-def get_number_of_disjoint_group_nodes(sub_graphs: list[tuple[tuple]]) -> int:
+def get_number_of_disjoint_group_nodes(sub_graphs: Union[list[tuple[tuple]], Occurrences, OccurrencesView]) -> int:
     """
     :param sub_graphs: all the sub graphs (list of edges) participating in a candidate motif sub graph
     :return: the number of completely disjoint groups of nodes
     """
     graph = nx.DiGraph()
-    for sub_graph in sub_graphs:
-        graph.add_edges_from(sub_graph)
+    for chunk in iter_occurrence_chunks(sub_graphs):
+        if isinstance(chunk, Occurrences):
+            graph.add_edges_from(chunk.get_spanning_edges())
+            continue
+        for sub_graph in chunk:
+            graph.add_edges_from(sub_graph)
 
     return nx.number_weakly_connected_components(graph)
 
@@ -6,6 +6,9 @@ import numpy as np
 from networkx import DiGraph
 from pydantic import BaseModel, ConfigDict
 
+from utils.occurrence_sink import OccurrencesView
+from utils.occurrences import Occurrences
+
 
 class NetworkInputType(str, Enum):
     simple_adj_txt = 'simple_adj_txt'
@@ -34,13 +37,18 @@ class SubGraphAlgoName(str, Enum):
     mfinder_induced = 'mfinder_i'
     mfinder_none_induced = 'mfinder_ni'
     fanmod_esu = 'fanmod'
+    esu = 'esu'
+    parallel_esu = 'parallel_esu'
+    rand_esu = 'rand_esu'
     triadic_census = 'triadic_census'
+    tetrad_census = 'tetrad_census'
     netsci_wrapper = 'netsci_wrapper'
 
 
 class RandomGeneratorAlgoName(str, Enum):
     markov_chain_switching = 'markov_chain'
     nerve_ring_markov_chain_switching = 'nerve_ring_markov_chain'
+    batched_markov_chain_switching = 'batched_markov_chain'
     erdos_renyi = 'erdos_renyi'
     barabasi = 'barabasi'
 
@@ -86,9 +94,10 @@ class MotifCriteriaResults(BaseModel):
 
 
 class PolarityFrequencies(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     frequency: int
     polarity: list[str]
-    sub_graphs: list
+    sub_graphs: Union[list, Occurrences]
 
 
 class Motif(BaseModel):
@@ -101,8 +110,9 @@ class Motif(BaseModel):
     motif_criteria: Optional[MotifCriteriaResults] = None
     random_network_samples: Optional[list[int]] = []  # number of appearances of this motif id in the random networks
 
-    # all the isomorphic sub graphs appearances - in a tuple-edge format: (s,t,polarity)
-    sub_graphs: Optional[list[tuple[tuple]]] = []
+    # all the isomorphic sub graphs appearances - in a tuple-edge format: (s,t,polarity),
+    # a columnar occurrences container (nodes in role order) or a (lazy) view of an occurrence sink
+    sub_graphs: Optional[Union[list[tuple[tuple]], Occurrences, OccurrencesView]] = []
     # dict of dicts, key=role. value = dict where keys are node name and value are their freq.
     node_roles: Optional[dict] = {}
 
@@ -115,17 +125,43 @@ class Motif(BaseModel):
 
 
 class SubGraphSearchResult(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     # frequent sub graph list: key=motif id, value is the frequency
     fsl: dict[Union[str, int], int]
-    # same fsl, the value is the list of sub graphs
-    fsl_fully_mapped: dict[Union[str, int], list[tuple]]
+    # same fsl, the value is the list of sub graphs, an occurrences container, or a view of the occurrence sink
+    fsl_fully_mapped: dict[Union[str, int], Union[list[tuple], Occurrences, OccurrencesView]]
+
+
+class SampledSubGraphSearchResult(SubGraphSearchResult):
+    # fsl holds the (rounded) estimated frequencies, fsl_fully_mapped the sampled sub graphs of the first round
+    estimated_fsl: dict[Union[str, int], float]
+    # standard error of each estimated frequency
+    standard_error: dict[Union[str, int], float]
+    # estimated concentration of each motif id: estimated frequency / total estimated frequency
+    concentrations: dict[Union[str, int], float]
+    # the expected fraction of the enumeration tree leaves explored in each round
+    explored_fraction: float
+    rounds: int
 
 
 class LargeSubGraphSearchResult(SubGraphSearchResult):
-    model_config = ConfigDict(arbitrary_types_allowed=True)
     adj_mat: dict[str, np.ndarray]
 
 
+class RandomNetworkSearchResult(BaseModel):
+    # the search result of a random network, reduced to its counts: key=motif id, value is the frequency
+    fsl: dict[Union[str, int], int]
+    # key=motif id, value is the frequency of each of its polarity motifs (used by the polarity motif search)
+    polarity_fsl: dict[Union[str, int], dict[tuple, int]] = {}
+    # the number of edges of the random network
+    edges: int = 0
+    # the effective switch factor of the (adaptive) markov chain that generated the random network
+    switch_factor: Optional[int] = None
+    # the successful switches / iterations of the markov chain that generated the random network
+    success_switches: Optional[int] = None
+    iterations: Optional[int] = None
+
+
 class SearchResultBinaryFile(TypedDict):
     args: Namespace
     motifs: dict[Union[str, int], Motif]